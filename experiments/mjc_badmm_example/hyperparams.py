@@ -147,6 +147,9 @@ config = {
     'num_samples': 5,
     'verbose_trials': 1,
     'verbose_policy_trials': 1,
+    # Take the policy samples of each iteration in a worker process,
+    # while the next iteration samples. Needs a duplicable agent.
+    'pipeline_policy_samples': False,
     'common': common,
     'agent': agent,
     'gui_on': True,
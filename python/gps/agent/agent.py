@@ -2,6 +2,7 @@
 import abc
 import copy
 
+from gps.agent.agent_utils import NoiseBank
 from gps.agent.config import AGENT
 from gps.proto.gps_pb2 import ACTION
 from gps.sample.sample_list import SampleList
@@ -14,6 +15,16 @@ class Agent(object):
     """
     __metaclass__ = abc.ABCMeta
 
+    # Whether sample_conditions collects samples in parallel, as the
+    # user asked for. GPSMain then samples through sample_conditions
+    # even with the GUI on, giving up failing and redoing samples.
+    batch_sampling = False
+
+    # Whether an identical agent can be constructed from the
+    # hyperparams and sampled in a worker process (see ParallelSampler).
+    # Agents driving real hardware or a GUI must not be duplicated.
+    duplicable = False
+
     def __init__(self, hyperparams):
         config = copy.deepcopy(AGENT)
         config.update(hyperparams)
@@ -23,6 +34,10 @@ class Agent(object):
         self._samples = [[] for _ in range(self._hyperparams['conditions'])]
         self.T = self._hyperparams['T']
         self.dU = self._hyperparams['sensor_dims'][ACTION]
+        self.noise_bank = None
+        if self._hyperparams['noise_seed'] is not None:
+            self.noise_bank = NoiseBank(self.T, self.dU, self._hyperparams,
+                                        self._hyperparams['noise_seed'])
 
         self.x_data_types = self._hyperparams['state_include']
         self.obs_data_types = self._hyperparams['obs_include']
@@ -48,13 +63,63 @@ class Agent(object):
                                                    self._obs_idx)}
 
     @abc.abstractmethod
-    def sample(self, policy, condition, verbose=True, save=True):
+    def sample(self, policy, condition, verbose=True, save=True, noise=None):
         """
         Draw a sample from the environment, using the specified policy
-        and under the specified condition.
+        and under the specified condition. If noise is None, T x dU
+        action noise is generated by the agent.
         """
         raise NotImplementedError("Must be implemented in subclass.")
 
+    def sample_batch(self, policy, condition, N, verbose=False, save=True,
+                     noise=None):
+        """
+        Draw N samples from the environment under the same condition.
+        Samples are taken one after another; subclasses may override
+        this to run the trials in lockstep.
+        Args:
+            policy: Policy to to used in the trials.
+            condition: Which condition setup to run.
+            N: Number of samples.
+            verbose: Whether or not to plot the trials.
+            save: Whether or not to store the trials into the samples.
+            noise: N x T x dU action noise. Generated if not specified.
+        Returns:
+            A list of N samples.
+        """
+        return [
+            self.sample(policy, condition, verbose=verbose, save=save,
+                        noise=None if noise is None else noise[i])
+            for i in range(N)
+        ]
+
+    def sample_conditions(self, policies, N, verbose_trials=0, save=True,
+                          noise=None):
+        """
+        Draw N samples for every condition. Samples are taken one after
+        another; subclasses may override this to sample in parallel.
+        Args:
+            policies: A list with the policy to use for each condition.
+            N: Number of samples per condition.
+            verbose_trials: Number of samples per condition to plot.
+            save: Whether or not to store the trials into the samples.
+            noise: A list with the N x T x dU action noise of each
+                condition. Generated if not specified.
+        Returns:
+            A list with a list of N samples for each condition.
+        """
+        return [
+            [self.sample(policies[cond], cond, verbose=(i < verbose_trials),
+                         save=save,
+                         noise=None if noise is None else noise[cond][i])
+             for i in range(N)]
+            for cond in range(len(policies))
+        ]
+
+    def close(self):
+        """ Release resources held by the agent, such as worker processes. """
+        pass
+
     def reset(self, condition):
         """ Reset environment to the specified condition. """
         pass  # May be overridden in subclass.
@@ -18,20 +18,63 @@ def generate_noise(T, dU, hyperparams):
         renorm : If smooth=True, renormalizes data to have variance 1
             after smoothing.
     """
+    return smooth_noise(np.random.randn(T, dU), hyperparams)
+
+
+def smooth_noise(noise, hyperparams):
+    """
+    Smooth noise along the time axis, which is the second to last axis,
+    as configured by the smooth_noise hyperparams (see generate_noise).
+    Each action dimension of each trajectory is filtered and
+    renormalized independently.
+    Args:
+        noise: ... x T x dU array of noise.
+    """
     smooth, var = hyperparams['smooth_noise'], hyperparams['smooth_noise_var']
     renorm = hyperparams['smooth_noise_renormalize']
-    noise = np.random.randn(T, dU)
     if smooth:
         # Smooth noise. This violates the controller assumption, but
         # might produce smoother motions.
-        for i in range(dU):
-            noise[:, i] = sp_ndimage.filters.gaussian_filter(noise[:, i], var)
+        noise = sp_ndimage.filters.gaussian_filter1d(noise, var, axis=-2)
         if renorm:
-            variance = np.var(noise, axis=0)
+            variance = np.var(noise, axis=-2, keepdims=True)
             noise = noise / np.sqrt(variance)
     return noise
 
 
+class NoiseBank(object):
+    """
+    Generates the action noise of whole iterations up front. The noise
+    of each (iteration, condition, sample) is drawn from its own random
+    stream, so it does not depend on the order in which samples are
+    taken or on the global numpy random state.
+    Args:
+        T: Number of time steps.
+        dU: Dimensionality of actions.
+        hyperparams: Agent hyperparams with the smoothing settings, see
+            generate_noise.
+        seed: Seed that all streams are derived from.
+    """
+    def __init__(self, T, dU, hyperparams, seed):
+        self.T = T
+        self.dU = dU
+        self._hyperparams = hyperparams
+        self._seed = seed
+
+    def noise(self, itr, condition, N):
+        """
+        Returns:
+            An N x T x dU array with the noise of samples 0 to N-1 of a
+            condition at an iteration.
+        """
+        noise = np.array([
+            np.random.RandomState([self._seed, itr, condition, i]).randn(
+                self.T, self.dU)
+            for i in range(N)
+        ])
+        return smooth_noise(noise, self._hyperparams)
+
+
 def setup(value, n):
     """ Go through various types of hyperparameters. """
     if not isinstance(value, list):
@@ -3,6 +3,7 @@ from copy import deepcopy
 import numpy as np
 from gps.agent.agent import Agent
 from gps.agent.agent_utils import generate_noise, setup
+from gps.agent.box2d.batch_world import BatchWorld
 from gps.agent.config import AGENT_BOX2D
 from gps.proto.gps_pb2 import ACTION
 from gps.sample.sample import Sample
@@ -17,6 +18,7 @@ class AgentBox2D(Agent):
         config = deepcopy(AGENT_BOX2D)
         config.update(hyperparams)
         Agent.__init__(self, config)
+        self.batch_sampling = self._hyperparams['batch_worlds']
 
         self._setup_conditions()
         self._setup_world(hyperparams["world"], hyperparams["target_state"])
@@ -36,11 +38,14 @@ class AgentBox2D(Agent):
         Helper method for handling setup of the Box2D world.
         """
         self.x0 = self._hyperparams["x0"]
+        self._world_type, self._target = world, target
         self._worlds = [world(self.x0[i], target)
                         for i in range(self._hyperparams['conditions'])]
+        # The last batch of worlds, with the condition of each world.
+        self._batch = None
 
 
-    def sample(self, policy, condition, verbose=False, save=True):
+    def sample(self, policy, condition, verbose=False, save=True, noise=None):
         """
         Runs a trial and constructs a new sample containing information
         about the trial.
@@ -49,13 +54,16 @@ class AgentBox2D(Agent):
             policy: policy to to used in the trial
             condition (int): Which condition setup to run.
             verbose (boolean): whether or not to plot the trial (not used here)
+            save (boolean): whether or not to store the trial into the samples
+            noise: T x dU action noise, generated if not specified
         """
         self._worlds[condition].run()
         self._worlds[condition].reset_world()
         b2d_X = self._worlds[condition].get_state()
         new_sample = self._init_sample(b2d_X)
         U = np.zeros([self.T, self.dU])
-        noise = generate_noise(self.T, self.dU, self._hyperparams)
+        if noise is None:
+            noise = generate_noise(self.T, self.dU, self._hyperparams)
         for t in range(self.T):
             X_t = new_sample.get_X(t=t)
             obs_t = new_sample.get_obs(t=t)
@@ -68,6 +76,148 @@ class AgentBox2D(Agent):
         new_sample.set(ACTION, U)
         if save:
             self._samples[condition].append(new_sample)
+        return new_sample
+
+    def sample_batch(self, policy, condition, N, verbose=False, save=True,
+                     noise=None):
+        """
+        Runs N trials of a condition. With batch_worlds set, the trials
+        run in lockstep, each in its own world, except for the first one
+        if verbose, which runs on the world of the condition.
+
+        Args:
+            policy: policy to to used in the trials
+            condition (int): Which condition setup to run.
+            N (int): Number of trials.
+            verbose (boolean): whether or not to plot the first trial
+            save (boolean): whether or not to store the trials into the samples
+            noise: N x T x dU action noise, generated if not specified
+        """
+        if not self._hyperparams['batch_worlds']:
+            return Agent.sample_batch(self, policy, condition, N,
+                                      verbose=verbose, save=save, noise=noise)
+        samples = self._sample_lockstep(
+            {condition: policy}, [condition], N, int(verbose),
+            None if noise is None else {condition: noise}
+        )[0]
+        if save:
+            self._samples[condition].extend(samples)
+        return samples
+
+    def sample_conditions(self, policies, N, verbose_trials=0, save=True,
+                          noise=None):
+        """
+        Runs N trials of every condition. With batch_worlds set, the
+        first verbose_trials trials of each condition run on the world of
+        the condition, and the others run in lockstep, each in its own
+        world.
+        """
+        if not self._hyperparams['batch_worlds']:
+            return Agent.sample_conditions(self, policies, N,
+                                           verbose_trials=verbose_trials,
+                                           save=save, noise=noise)
+        sample_lists = self._sample_lockstep(
+            policies, range(len(policies)), N, verbose_trials, noise
+        )
+        if save:
+            for cond, cond_samples in enumerate(sample_lists):
+                self._samples[cond].extend(cond_samples)
+        return sample_lists
+
+    def _sample_lockstep(self, policies, conditions, N, verbose_trials,
+                         noise=None):
+        """
+        Runs N trials of each condition. The first verbose_trials trials
+        run one after another on the world of the condition, the others
+        in lockstep on a batch of worlds.
+
+        Args:
+            policies: policy to use for each condition, indexed by condition
+            conditions: list of the conditions to run
+            N (int): Number of trials per condition.
+            verbose_trials (int): Number of trials to run on the world of
+                each condition.
+            noise: N x T x dU action noise of each condition, indexed by
+                condition, generated if not specified
+        Returns:
+            A list with a list of N samples for each condition.
+        """
+        num_verbose = min(verbose_trials, N)
+        sample_lists, batch_trials = [], []
+        for cond in conditions:
+            sample_lists.append([
+                self.sample(policies[cond], cond, verbose=True, save=False,
+                            noise=None if noise is None else noise[cond][i])
+                for i in range(num_verbose)
+            ])
+            batch_trials.extend((cond, i) for i in range(num_verbose, N))
+        if not batch_trials:
+            return sample_lists
+        batch_noise = None
+        if noise is not None:
+            batch_noise = np.array([noise[cond][i]
+                                    for cond, i in batch_trials])
+        samples = self._run_batch(
+            policies, [cond for cond, _ in batch_trials], batch_noise
+        )
+        num_batch = N - num_verbose
+        for j in range(len(sample_lists)):
+            sample_lists[j].extend(samples[j*num_batch:(j+1)*num_batch])
+        return sample_lists
+
+    def close(self):
+        """ Release the batch of worlds. """
+        self._batch = None
+
+    def _run_batch(self, policies, conditions, noise=None):
+        """
+        Runs one trial per entry of conditions on a batch of worlds,
+        evaluating the policy of each condition once per time step.
+
+        Args:
+            policies: policy to use for each condition, indexed by condition
+            conditions: list with the condition of each trial
+            noise: N x T x dU action noise, generated if not specified
+        Returns:
+            A list with a sample for each trial.
+        """
+        # Only the last batch is kept, as sampling usually repeats it.
+        if self._batch is None or self._batch[0] != conditions:
+            self._batch = (list(conditions), BatchWorld(
+                self._world_type, [self.x0[cond] for cond in conditions],
+                self._target
+            ))
+        batch = self._batch[1]
+        N = len(conditions)
+        if noise is None:
+            noise = np.array([generate_noise(self.T, self.dU,
+                                             self._hyperparams)
+                              for _ in range(N)])
+        trials = {}
+        for n, cond in enumerate(conditions):
+            trials.setdefault(cond, []).append(n)
+
+        b2d_X = batch.reset()
+        samples = [self._init_sample({sensor: b2d_X[sensor][n]
+                                      for sensor in b2d_X})
+                   for n in range(N)]
+        U = np.zeros([N, self.T, self.dU])
+        for t in range(self.T):
+            X_t = np.array([sample.get_X(t=t) for sample in samples])
+            obs_t = np.array([sample.get_obs(t=t) for sample in samples])
+            for cond, idx in trials.items():
+                U[idx, t, :] = policies[cond].act_batch(
+                    X_t[idx], obs_t[idx], t, noise[idx, t, :]
+                )
+            if (t+1) < self.T:
+                b2d_X = batch.step(U[:, t, :], self._hyperparams['substeps'])
+                for n in range(N):
+                    self._set_sample(samples[n],
+                                     {sensor: b2d_X[sensor][n]
+                                      for sensor in b2d_X}, t)
+        for n in range(N):
+            samples[n].set(ACTION, U[n])
+        return samples
 
     def _init_sample(self, b2d_X):
         """
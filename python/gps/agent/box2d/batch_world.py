@@ -0,0 +1,55 @@
+""" This file defines a container that steps many Box2D worlds together. """
+import numpy as np
+
+
+class BatchWorld(object):
+    """
+    A batch of independent Box2D worlds that are reset and stepped
+    together, with their states gathered into stacked arrays. Each world
+    renders itself unless the null backend is used, so large batches
+    should be run headless.
+    Args:
+        world: World class, e.g. ArmWorld or PointMassWorld.
+        x0s: List with the initial state of each world.
+        target: Target state, shared by all worlds.
+    """
+    def __init__(self, world, x0s, target):
+        self.worlds = [world(x0, target) for x0 in x0s]
+
+    def __len__(self):
+        return len(self.worlds)
+
+    def reset(self):
+        """
+        Returns all worlds to their initial states.
+        Returns:
+            The stacked states, see get_state.
+        """
+        for world in self.worlds:
+            world.run()
+            world.reset_world()
+        return self.get_state()
+
+    def step(self, actions, substeps=1):
+        """
+        Steps all worlds.
+        Args:
+            actions: N x dU array with one action per world.
+            substeps: Number of physics steps to take with each action.
+        Returns:
+            The stacked states, see get_state.
+        """
+        for world, action in zip(self.worlds, actions):
+            for _ in range(substeps):
+                world.run_next(action)
+        return self.get_state()
+
+    def get_state(self):
+        """
+        Returns:
+            A dictionary from sensor to an N x d array with the state of
+            every world.
+        """
+        states = [world.get_state() for world in self.worlds]
+        return {sensor: np.array([state[sensor] for state in states])
+                for sensor in states[0]}
@@ -0,0 +1,42 @@
+""" This file defines a headless framework for Box2D worlds. """
+from gps.agent.box2d.framework import FrameworkBase
+
+
+class NullFramework(FrameworkBase):
+    """
+    Framework that steps the Box2D world directly, without a renderer,
+    text output or per-step timing. Select it by setting the
+    GPS_BOX2D_BACKEND environment variable to 'null'.
+    """
+    def __init__(self):
+        super(NullFramework, self).__init__()
+
+    def run(self):
+        """ Takes one step with zero action, like the rendered frameworks. """
+        self.Step(self.settings, [0, 0, 0])
+
+    def run_next(self, action):
+        """ Takes one step with the given action. """
+        self.Step(self.settings, action)
+
+    def Step(self, settings):
+        """ Steps the physics only. """
+        self.stepCount += 1
+        if settings.hz > 0.0:
+            timeStep = 1.0 / settings.hz
+        else:
+            timeStep = 0.0
+
+        self.world.warmStarting = settings.enableWarmStarting
+        self.world.continuousPhysics = settings.enableContinuous
+        self.world.subStepping = settings.enableSubStepping
+
+        # Contact points are still collected if a world uses them.
+        self.points = []
+
+        self.world.Step(timeStep, settings.velocityIterations,
+                        settings.positionIterations)
+
+    def Print(self, s, color=None):
+        """ There is nowhere to print to. """
+        pass
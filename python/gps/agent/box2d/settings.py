@@ -22,9 +22,13 @@
 # misrepresented as being the original software.
 # 3. This notice may not be removed or altered from any source distribution.
 
+import os
+
+
 class fwSettings(object):
     """ This class contains the settings for Box2D's framwork. """
-    backend = 'pygame'
+    # 'pygame' renders the worlds, 'null' runs them headless.
+    backend = os.environ.get('GPS_BOX2D_BACKEND', 'pygame')
 
     # Physics options
     hz = 20.0
@@ -18,6 +18,9 @@ AGENT = {
     'smooth_noise': True,
     'smooth_noise_var': 2.0,
     'smooth_noise_renormalize': True,
+    # If set, GPSMain draws the action noise of each sample from a
+    # NoiseBank with this seed.
+    'noise_seed': None,
 }
 
 
@@ -37,10 +40,22 @@ try:
         'relax_command_topic': 'gps_controller_relax_command',
         'data_request_topic': 'gps_controller_data_request',
         'sample_result_topic': 'gps_controller_report',
+        'tf_obs_topic': '/gps_obs_tf',
+        'tf_action_topic': '/gps_controller_sent_robot_action_tf',
+        # Seconds from receiving an observation to publishing its action
+        # for TF policies, after which the step counts as a deadline
+        # miss. Defaults to one controller step.
+        'action_deadline': None,
         'trial_timeout': 20,  # Give this many seconds for a trial.
         'reset_conditions': [],  # Defines reset modes + positions for
                                  # trial and auxiliary arms.
         'frequency': 20,
+        # Send controller gains and sample data as raw bytes instead of
+        # float64 lists. Requires a robot plugin built with the same msgs.
+        'binary_transport': False,
+        # Only accept responses echoing the id of the command. Requires a
+        # robot plugin that sets the id of its SampleResult messages.
+        'check_id': False,
         'end_effector_points': np.array([]),
         #TODO: Actually pass in low gains and high gains and use both
         #      for the position controller.
@@ -65,7 +80,12 @@ except rospkg.common.ResourceNotFound as e:
 # AgentMuJoCo
 AGENT_MUJOCO = {
     'substeps': 1,
+    'num_workers': 0,  # Number of sampling processes, 0 samples serially.
 }
 
 AGENT_BOX2D = {
+    # Run the samples of sample_batch and sample_conditions in lockstep
+    # on a batch of worlds, evaluating each policy once per time step.
+    # The worlds themselves are still stepped one after another.
+    'batch_worlds': False,
 }
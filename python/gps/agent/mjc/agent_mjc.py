@@ -8,23 +8,35 @@ import mjcpy
 from gps.agent.agent import Agent
 from gps.agent.agent_utils import generate_noise, setup
 from gps.agent.config import AGENT_MUJOCO
+from gps.agent.parallel_sampler import ParallelSampler
+from gps.algorithm.policy.lin_gauss_policy import LinearGaussianPolicy
 from gps.proto.gps_pb2 import JOINT_ANGLES, JOINT_VELOCITIES, \
         END_EFFECTOR_POINTS, END_EFFECTOR_POINT_VELOCITIES, \
         END_EFFECTOR_POINT_JACOBIANS, ACTION
 from gps.sample.sample import Sample
 
 
+# State sensors that rollout_lingauss computes.
+NATIVE_STATE_SENSORS = (JOINT_ANGLES, JOINT_VELOCITIES, END_EFFECTOR_POINTS,
+                        END_EFFECTOR_POINT_VELOCITIES)
+
+
 class AgentMuJoCo(Agent):
     """
     All communication between the algorithms and MuJoCo is done through
     this class.
     """
+    duplicable = True
+
     def __init__(self, hyperparams):
         config = copy.deepcopy(AGENT_MUJOCO)
         config.update(hyperparams)
         Agent.__init__(self, config)
         self._setup_conditions()
         self._setup_world(hyperparams['filename'])
+        self._worlds = [self._world]
+        self._sampler = None
+        self.batch_sampling = self._hyperparams['num_workers'] > 0
 
     def _setup_conditions(self):
         """
@@ -76,7 +88,7 @@ class AgentMuJoCo(Agent):
             else:
                 self.x0.append(x0)
 
-    def sample(self, policy, condition, verbose=True, save=True):
+    def sample(self, policy, condition, verbose=True, save=True, noise=None):
         """
         Runs a trial and constructs a new sample containing information
         about the trial.
@@ -85,24 +97,35 @@ class AgentMuJoCo(Agent):
             condition: Which condition setup to run.
             verbose: Whether or not to plot the trial.
             save: Whether or not to store the trial into the samples.
+            noise: T x dU action noise. Generated if not specified.
+        """
+        if noise is None:
+            noise = generate_noise(self.T, self.dU, self._hyperparams)
+        mj_X = self._setup_trial(condition, self._world)
+        if not verbose and self._can_rollout_natively(policy):
+            new_sample = self._rollout_lingauss(policy, mj_X, noise)
+        else:
+            new_sample = self._rollout(policy, condition, mj_X, noise,
+                                       verbose)
+        if save:
+            self._samples[condition].append(new_sample)
+        return new_sample
+
+    def _rollout(self, policy, condition, mj_X, noise, verbose):
+        """
+        Runs a trial one step at a time from Python.
+        Args:
+            policy: Policy to to used in the trial.
+            condition: Which condition setup to run.
+            mj_X: Initial state of the trial.
+            noise: T x dU action noise.
+            verbose: Whether or not to plot the trial.
+        Returns:
+            The new sample.
         """
         # Create new sample, populate first time step.
         new_sample = self._init_sample(condition)
-        mj_X = self._hyperparams['x0'][condition]
         U = np.zeros([self.T, self.dU])
-        noise = generate_noise(self.T, self.dU, self._hyperparams)
-        if np.any(self._hyperparams['x0var'][condition] > 0):
-            x0n = self._hyperparams['x0var'] * \
-                    np.random.randn(self._hyperparams['x0var'].shape)
-            mj_X += x0n
-        noisy_body_idx = self._hyperparams['noisy_body_idx'][condition]
-        if noisy_body_idx.size > 0:
-            for i in range(len(noisy_body_idx)):
-                idx = noisy_body_idx[i]
-                var = self._hyperparams['noisy_body_var'][condition][i]
-                self._model[condition]['body_pos'][idx, :] += \
-                        var * np.random.randn(1, 3)
-        self._world.set_model(self._model[condition])
         for t in range(self.T):
             X_t = new_sample.get_X(t=t)
             obs_t = new_sample.get_obs(t=t)
@@ -117,33 +140,239 @@ class AgentMuJoCo(Agent):
                 self._data = self._world.get_data()
                 self._set_sample(new_sample, mj_X, t, condition)
         new_sample.set(ACTION, U)
-        if save:
-            self._samples[condition].append(new_sample)
         return new_sample
 
-    def _init_sample(self, condition):
+    def _can_rollout_natively(self, policy):
+        """
+        Whether a trial of the policy can be run entirely inside mjcpy.
+        This requires a linear Gaussian policy, a state made up only of
+        the sensors computed by rollout_lingauss, and an mjcpy build
+        that has it.
+        """
+        return (isinstance(policy, LinearGaussianPolicy) and
+                hasattr(self._world, 'rollout_lingauss') and
+                all(sensor in NATIVE_STATE_SENSORS
+                    for sensor in self.x_data_types))
+
+    def _rollout_lingauss(self, policy, mj_X, noise):
+        """
+        Runs a trial of a linear Gaussian policy with a single call into
+        mjcpy. The world must already be set up for the trial.
+        Args:
+            policy: LinearGaussianPolicy to to used in the trial.
+            mj_X: Initial state of the trial.
+            noise: T x dU action noise.
+        Returns:
+            The new sample.
+        """
+        # rollout_lingauss computes actions from the features
+        # [qpos, qvel, site_xpos, site_xvel], so rearrange the columns
+        # of K to act on those.
+        nx, dEE = len(mj_X), self._data['site_xpos'].size
+        feature_idx = {
+            JOINT_ANGLES: self._joint_idx,
+            JOINT_VELOCITIES: self._vel_idx,
+            END_EFFECTOR_POINTS: list(range(nx, nx + dEE)),
+            END_EFFECTOR_POINT_VELOCITIES: list(range(nx + dEE, nx + 2*dEE)),
+        }
+        K = np.zeros([self.T, self.dU, nx + 2*dEE])
+        for sensor in self.x_data_types:
+            K[:, :, feature_idx[sensor]] = \
+                    policy.K[:, :, self._x_data_idx[sensor]]
+        X, U, eepts, jac = self._world.rollout_lingauss(
+            np.ascontiguousarray(mj_X, dtype=np.float64), K,
+            policy.fold_k(noise), self._hyperparams['substeps'],
+            float(self._hyperparams['dt'])
+        )
+        self._data = self._world.get_data()
+
+        eept_vels = np.zeros_like(eepts)
+        eept_vels[1:] = np.diff(eepts, axis=0) / self._hyperparams['dt']
+        new_sample = Sample(self)
+        new_sample.set(JOINT_ANGLES, X[:, self._joint_idx])
+        new_sample.set(JOINT_VELOCITIES, X[:, self._vel_idx])
+        new_sample.set(END_EFFECTOR_POINTS, eepts)
+        new_sample.set(END_EFFECTOR_POINT_VELOCITIES, eept_vels)
+        new_sample.set(END_EFFECTOR_POINT_JACOBIANS, jac)
+        new_sample.set(ACTION, U)
+        return new_sample
+
+    def sample_batch(self, policy, condition, N, verbose=False, save=True,
+                     noise=None):
+        """
+        Runs N trials in lockstep, each in its own MuJoCo world, and
+        evaluates the policy once per time step on the stacked states.
+        Policies that can be rolled out inside mjcpy are sampled one
+        trial at a time instead.
+        Args:
+            policy: Policy to to used in the trials.
+            condition: Which condition setup to run.
+            N: Number of trials.
+            verbose: Whether or not to plot the first trial.
+            save: Whether or not to store the trials into the samples.
+            noise: N x T x dU action noise. Generated if not specified.
+        Returns:
+            A list of N samples.
+        """
+        if not verbose and self._can_rollout_natively(policy):
+            return Agent.sample_batch(self, policy, condition, N,
+                                      verbose=verbose, save=save, noise=noise)
+        worlds = self._get_worlds(N)
+        if noise is None:
+            noise = np.array([generate_noise(self.T, self.dU,
+                                             self._hyperparams)
+                              for _ in range(N)])
+        samples, mj_X = [], []
+        for n in range(N):
+            mj_X.append(self._setup_trial(condition, worlds[n]))
+            samples.append(self._init_sample(condition, worlds[n]))
+
+        U = np.zeros([N, self.T, self.dU])
+        for t in range(self.T):
+            X_t = np.array([sample.get_X(t=t) for sample in samples])
+            obs_t = np.array([sample.get_obs(t=t) for sample in samples])
+            U[:, t, :] = policy.act_batch(X_t, obs_t, t, noise[:, t, :])
+            if verbose:
+                worlds[0].plot(mj_X[0])
+            if (t + 1) < self.T:
+                for n in range(N):
+                    for _ in range(self._hyperparams['substeps']):
+                        mj_X[n], _ = worlds[n].step(mj_X[n], U[n, t, :])
+                    self._data = worlds[n].get_data()
+                    self._set_sample(samples[n], mj_X[n], t, condition,
+                                     worlds[n])
+        for n in range(N):
+            samples[n].set(ACTION, U[n])
+        if save:
+            self._samples[condition].extend(samples)
+        return samples
+
+    def _get_worlds(self, N):
+        """
+        Returns a list of N MuJoCo worlds, creating additional worlds
+        from the model file as needed. The first one is self._world.
+        """
+        while len(self._worlds) < N:
+            self._worlds.append(mjcpy.MJCWorld(self._hyperparams['filename']))
+        return self._worlds[:N]
+
+    def _setup_trial(self, condition, world):
+        """
+        Perturb the initial state and the body positions of a condition,
+        load its model into a world and set the world to the initial
+        state.
+        Args:
+            condition: Which condition setup to run.
+            world: The MuJoCo world to run the trial in.
+        Returns:
+            The initial state of the trial.
+        """
+        mj_X = self._hyperparams['x0'][condition]
+        if np.any(self._hyperparams['x0var'][condition] > 0):
+            x0n = self._hyperparams['x0var'][condition] * \
+                    np.random.randn(*mj_X.shape)
+            mj_X = mj_X + x0n
+        noisy_body_idx = self._hyperparams['noisy_body_idx'][condition]
+        if noisy_body_idx.size > 0:
+            for i in range(len(noisy_body_idx)):
+                idx = noisy_body_idx[i]
+                var = self._hyperparams['noisy_body_var'][condition][i]
+                self._model[condition]['body_pos'][idx, :] += \
+                        var * np.random.randn(1, 3)
+        world.set_model(self._model[condition])
+        idx = len(mj_X) // 2
+        world.set_data({'qpos': mj_X[:idx], 'qvel': mj_X[idx:]})
+        world.kinematics()
+        return mj_X
+
+    def sample_conditions(self, policies, N, verbose_trials=0, save=True,
+                          noise=None):
+        """
+        Draw N samples for every condition. If num_workers is set and
+        all policies are linear Gaussian, the samples are collected by a
+        pool of worker processes, and verbose_trials is ignored.
+        Otherwise the samples of each condition are run in lockstep, and
+        only the first one is plotted if verbose_trials is nonzero.
+        """
+        num_workers = self._hyperparams['num_workers']
+        if num_workers <= 0 or not all(
+                isinstance(pol, LinearGaussianPolicy) for pol in policies):
+            return [self.sample_batch(policies[cond], cond, N,
+                                      verbose=(verbose_trials > 0), save=save,
+                                      noise=None if noise is None
+                                      else noise[cond])
+                    for cond in range(len(policies))]
+        if self._sampler is None:
+            capacity = int(np.ceil(float(len(policies) * N) / num_workers))
+            self._sampler = ParallelSampler(self, num_workers, capacity)
+
+        # Draw the noise and seeds here, in serial order, so that the
+        # samples do not depend on how tasks are spread over workers.
+        tasks = []
+        for cond in range(len(policies)):
+            for i in range(N):
+                if noise is None:
+                    task_noise = generate_noise(self.T, self.dU,
+                                                self._hyperparams)
+                else:
+                    task_noise = noise[cond][i]
+                tasks.append((cond, task_noise, np.random.randint(2 ** 31)))
+        samples = self._sampler.sample(dict(enumerate(policies)), tasks)
+
+        sample_lists = [samples[cond*N:(cond+1)*N]
+                        for cond in range(len(policies))]
+        if save:
+            for cond, cond_samples in enumerate(sample_lists):
+                self._samples[cond].extend(cond_samples)
+        return sample_lists
+
+    def close(self):
+        """ Shut down the sampling worker processes, if any. """
+        if self._sampler is not None:
+            self._sampler.close()
+            self._sampler = None
+
+    def sample_layout(self):
+        """
+        Returns:
+            A list of (sensor, shape) pairs of the data set by sample.
+        """
+        dEE = self._data['site_xpos'].size
+        return [
+            (JOINT_ANGLES, (self.T, len(self._joint_idx))),
+            (JOINT_VELOCITIES, (self.T, len(self._vel_idx))),
+            (END_EFFECTOR_POINTS, (self.T, dEE)),
+            (END_EFFECTOR_POINT_VELOCITIES, (self.T, dEE)),
+            (END_EFFECTOR_POINT_JACOBIANS,
+             (self.T, dEE, self._model[0]['nq'])),
+            (ACTION, (self.T, self.dU)),
+        ]
+
+    def _init_sample(self, condition, world=None):
         """
         Construct a new sample and fill in the first time step.
         Args:
             condition: Which condition to initialize.
+            world: The MuJoCo world to read from. Defaults to self._world.
         """
+        world = self._world if world is None else world
         sample = Sample(self)
         sample.set(JOINT_ANGLES,
                    self._hyperparams['x0'][condition][self._joint_idx], t=0)
         sample.set(JOINT_VELOCITIES,
                    self._hyperparams['x0'][condition][self._vel_idx], t=0)
-        self._data = self._world.get_data()
+        self._data = world.get_data()
         eepts = self._data['site_xpos'].flatten()
         sample.set(END_EFFECTOR_POINTS, eepts, t=0)
         sample.set(END_EFFECTOR_POINT_VELOCITIES, np.zeros_like(eepts), t=0)
-        jac = np.zeros([eepts.shape[0], self._model[condition]['nq']])
-        for site in range(eepts.shape[0] // 3):
-            idx = site * 3
-            jac[idx:(idx+3), :] = self._world.get_jac_site(site)
-        sample.set(END_EFFECTOR_POINT_JACOBIANS, jac, t=0)
+        # Preallocate the Jacobians of the whole trial, so that each time
+        # step can be filled in place.
+        jac = np.zeros([self.T, eepts.shape[0], self._model[condition]['nq']])
+        self._get_jac_sites(world, jac[0])
+        sample.set(END_EFFECTOR_POINT_JACOBIANS, jac)
         return sample
 
-    def _set_sample(self, sample, mj_X, t, condition):
+    def _set_sample(self, sample, mj_X, t, condition, world=None):
         """
         Set the data for a sample for one time step.
         Args:
@@ -151,7 +380,9 @@ class AgentMuJoCo(Agent):
             mj_X: Data to set for sample.
             t: Time step to set for sample.
             condition: Which condition to set.
+            world: The MuJoCo world to read from. Defaults to self._world.
         """
+        world = self._world if world is None else world
         sample.set(JOINT_ANGLES, np.array(mj_X[self._joint_idx]), t=t+1)
         sample.set(JOINT_VELOCITIES, np.array(mj_X[self._vel_idx]), t=t+1)
         curr_eepts = self._data['site_xpos'].flatten()
@@ -159,8 +390,20 @@ class AgentMuJoCo(Agent):
         prev_eepts = sample.get(END_EFFECTOR_POINTS, t=t)
         eept_vels = (curr_eepts - prev_eepts) / self._hyperparams['dt']
         sample.set(END_EFFECTOR_POINT_VELOCITIES, eept_vels, t=t+1)
-        jac = np.zeros([curr_eepts.shape[0], self._model[condition]['nq']])
-        for site in range(curr_eepts.shape[0] // 3):
-            idx = site * 3
-            jac[idx:(idx+3), :] = self._world.get_jac_site(site)
-        sample.set(END_EFFECTOR_POINT_JACOBIANS, jac, t=t+1)
+        self._get_jac_sites(
+            world, sample.get(END_EFFECTOR_POINT_JACOBIANS, t=t+1)
+        )
+
+    def _get_jac_sites(self, world, jac):
+        """
+        Fill in the Jacobians of all sites.
+        Args:
+            world: The MuJoCo world to read from.
+            jac: C-contiguous (3 * nsites) x nq array to write to.
+        """
+        if hasattr(world, 'get_jac_sites'):
+            world.get_jac_sites(jac)
+        else:
+            for site in range(jac.shape[0] // 3):
+                idx = site * 3
+                jac[idx:(idx+3), :] = world.get_jac_site(site)
@@ -0,0 +1,217 @@
+""" This file defines a process pool for collecting samples in parallel. """
+import ctypes
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+import traceback
+
+import numpy as np
+
+from gps.agent.policy_broadcast import PolicyPublisher, PolicySubscriber
+from gps.algorithm.policy.lin_gauss_policy import LinearGaussianPolicy
+from gps.sample.sample import Sample
+
+
+class ParallelSampler(object):
+    """
+    Pool of worker processes that each construct their own copy of an
+    agent (and therefore their own simulator) and run rollouts on it.
+    Sample data is returned through a block of shared memory, so only
+    small control messages go through the pipes.
+
+    Tasks are assigned to workers round-robin and results are put back
+    in task order, so for a fixed number of workers the returned samples
+    do not depend on process scheduling.
+
+    Linear Gaussian policies are broadcast to the workers through shared
+    memory, one slot per condition, and are only copied when they
+    change. Other policies are pickled to the workers with each batch.
+
+    Args:
+        agent: The agent in the main process. Must implement
+            sample_layout(), and its hyperparams must be sufficient to
+            construct an identical agent in each worker.
+        num_workers: Number of worker processes.
+        capacity: Number of samples each worker can hold in shared
+            memory at once. Larger batches are run in several rounds.
+    """
+    def __init__(self, agent, num_workers, capacity):
+        self._agent = agent
+        self._num_workers = num_workers
+        self._capacity = capacity
+        self._layout = agent.sample_layout()
+        self._slot_size = sum(int(np.prod(shape)) for _, shape in self._layout)
+
+        buf = RawArray(ctypes.c_double,
+                       num_workers * capacity * self._slot_size)
+        self._buf = np.frombuffer(buf, dtype=np.float64).reshape(
+            num_workers, capacity, self._slot_size
+        )
+
+        self._publisher = PolicyPublisher(agent._hyperparams['conditions'],
+                                          agent.T, agent.dU, agent.dX)
+
+        hyperparams = dict(agent._hyperparams)
+        hyperparams['num_workers'] = 0
+        self._conns, self._workers = [], []
+        self._pending = None  # Workers and task count of a sent round.
+        for i in range(num_workers):
+            conn, worker_conn = multiprocessing.Pipe()
+            worker = multiprocessing.Process(
+                target=_worker_loop,
+                args=(hyperparams, worker_conn, self._buf[i], self._layout,
+                      self._publisher.slots)
+            )
+            worker.daemon = True
+            worker.start()
+            self._conns.append(conn)
+            self._workers.append(worker)
+
+    def sample(self, policies, tasks):
+        """
+        Run tasks on the workers.
+        Args:
+            policies: Dictionary from condition to the policy to sample.
+                Linear Gaussian policies must not be modified in place
+                after they have been sampled, as they are only copied to
+                the workers again if a different object is passed.
+                Other policies must be picklable.
+            tasks: List of (condition, noise, seed) tuples. noise is a
+                T x dU array, or None to generate it in the worker, and
+                seed is used to seed the global numpy random state of
+                the worker before the rollout.
+        Returns:
+            A list of Sample objects, in the same order as tasks.
+        """
+        policies = self._publish(policies)
+        samples = []
+        per_round = self._num_workers * self._capacity
+        for start in range(0, len(tasks), per_round):
+            self._send_round(policies, tasks[start:start+per_round])
+            samples.extend(self._recv_round())
+        return samples
+
+    def start(self, policies, tasks):
+        """
+        Start running tasks on the workers without waiting for them. The
+        samples are returned by finish, which must be called before the
+        workers are used again.
+        Args:
+            policies: As in sample.
+            tasks: As in sample, at most num_workers * capacity of them.
+        Returns: None
+        """
+        if len(tasks) > self._num_workers * self._capacity:
+            raise ValueError('Cannot start %d tasks on %d workers with '
+                             'capacity %d.' % (len(tasks), self._num_workers,
+                                               self._capacity))
+        self._send_round(self._publish(policies), tasks)
+
+    def finish(self):
+        """
+        Wait for the tasks started by start.
+        Returns:
+            A list of Sample objects, in the same order as the tasks.
+        """
+        return self._recv_round()
+
+    def _publish(self, policies):
+        """
+        Broadcast linear Gaussian policies. Returns the policies to pickle
+        to the workers, or None if they read them from shared memory.
+        """
+        if self._pending is not None:
+            raise RuntimeError('Tasks started on the sampling workers have '
+                               'not been finished.')
+        if all(isinstance(pol, LinearGaussianPolicy)
+               for pol in policies.values()):
+            for cond, pol in policies.items():
+                self._publisher.publish(cond, pol)
+            return None
+        return policies
+
+    def _send_round(self, policies, tasks):
+        """
+        Send at most num_workers * capacity tasks to the workers. If
+        policies is None, the workers read them from shared memory.
+        """
+        assignments = [tasks[i::self._num_workers]
+                       for i in range(self._num_workers)]
+        active = [i for i in range(self._num_workers) if assignments[i]]
+        for i in active:
+            worker_policies = None
+            if policies is not None:
+                conds = set(task[0] for task in assignments[i])
+                worker_policies = {c: policies[c] for c in conds}
+            self._conns[i].send((worker_policies, assignments[i]))
+        self._pending = (active, len(tasks))
+
+    def _recv_round(self):
+        """ Wait for the tasks sent by _send_round and read the samples. """
+        active, num_tasks = self._pending
+        self._pending = None
+        # Read the reply of every worker before raising, so that no reply
+        # is left in a pipe to be read by the next round.
+        errors = []
+        for i in active:
+            status, message = self._conns[i].recv()
+            if status != 'done':
+                errors.append('Sampling worker %d failed:\n%s' % (i, message))
+        if errors:
+            raise RuntimeError('\n'.join(errors))
+
+        samples = []
+        for j in range(num_tasks):
+            worker, slot = j % self._num_workers, j // self._num_workers
+            sample = Sample(self._agent)
+            offset = 0
+            for sensor, shape in self._layout:
+                size = int(np.prod(shape))
+                data = self._buf[worker, slot, offset:offset+size]
+                sample.set(sensor, data.reshape(shape).copy())
+                offset += size
+            samples.append(sample)
+        return samples
+
+    def close(self):
+        """ Shut down the worker processes. """
+        if self._pending is not None:
+            # Results of unfinished tasks are discarded.
+            try:
+                self._recv_round()
+            except RuntimeError:
+                pass
+        for conn in self._conns:
+            conn.send(None)
+        for worker in self._workers:
+            worker.join()
+        self._conns, self._workers = [], []
+
+
+def _worker_loop(hyperparams, conn, buf, layout, policy_slots):
+    """ Main loop of a sampling worker process. """
+    agent = hyperparams['type'](hyperparams)
+    subscriber = PolicySubscriber(policy_slots)
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        policies, tasks = message
+        try:
+            for slot, (cond, noise, seed) in enumerate(tasks):
+                if policies is None:
+                    policy = subscriber.get(cond)
+                else:
+                    policy = policies[cond]
+                np.random.seed(seed)
+                sample = agent.sample(policy, cond, verbose=False,
+                                      save=False, noise=noise)
+                offset = 0
+                for sensor, shape in layout:
+                    size = int(np.prod(shape))
+                    buf[slot, offset:offset+size] = sample.get(sensor).ravel()
+                    offset += size
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+        else:
+            conn.send(('done', None))
+    conn.close()
@@ -0,0 +1,117 @@
+""" This file defines shared-memory broadcasting of policies to workers. """
+import ctypes
+from multiprocessing.sharedctypes import RawArray, RawValue
+
+import numpy as np
+
+from gps.algorithm.policy.lin_gauss_policy import LinearGaussianPolicy
+
+
+# Parameters of a LinearGaussianPolicy, in constructor order.
+LIN_GAUSS_FIELDS = ('K', 'k', 'pol_covar', 'chol_pol_covar', 'inv_pol_covar')
+
+
+def lin_gauss_shapes(T, dU, dX):
+    """ Returns the shapes of the parameters of a LinearGaussianPolicy. """
+    return {
+        'K': (T, dU, dX),
+        'k': (T, dU),
+        'pol_covar': (T, dU, dU),
+        'chol_pol_covar': (T, dU, dU),
+        'inv_pol_covar': (T, dU, dU),
+    }
+
+
+class SharedArrays(object):
+    """
+    A set of named float64 arrays in shared memory, together with a
+    version counter that is incremented on every publish. Must be
+    created before the processes that read it are started.
+    Args:
+        shapes: Dictionary from array name to shape.
+    """
+    def __init__(self, shapes):
+        self._shapes = dict(shapes)
+        self._blocks = {
+            name: RawArray(ctypes.c_double, int(np.prod(shape)))
+            for name, shape in self._shapes.items()
+        }
+        self._version = RawValue(ctypes.c_long, 0)
+
+    @property
+    def version(self):
+        """ Number of times arrays have been published. """
+        return self._version.value
+
+    def arrays(self):
+        """
+        Returns:
+            A dictionary from name to a numpy view of the shared memory.
+        """
+        return {
+            name: np.frombuffer(block, dtype=np.float64).reshape(
+                self._shapes[name])
+            for name, block in self._blocks.items()
+        }
+
+    def publish(self, arrays):
+        """
+        Copy arrays into shared memory and bump the version. Readers
+        must not be running while this is called.
+        Args:
+            arrays: Dictionary from name to array, with the same names
+                and shapes as the shared arrays.
+        """
+        views = self.arrays()
+        for name in self._shapes:
+            views[name][...] = arrays[name]
+        self._version.value += 1
+
+
+class PolicyPublisher(object):
+    """
+    Publishes one LinearGaussianPolicy per slot (e.g. per condition)
+    into shared memory. A policy is only copied again if it is a
+    different object than the one last published in its slot.
+    Args:
+        num_slots: Number of policies that can be published at once.
+        T, dU, dX: Dimensions of the policies.
+    """
+    def __init__(self, num_slots, T, dU, dX):
+        self.slots = [SharedArrays(lin_gauss_shapes(T, dU, dX))
+                      for _ in range(num_slots)]
+        self._published = [None] * num_slots
+
+    def publish(self, slot, policy):
+        """ Publish a LinearGaussianPolicy into a slot. """
+        if self._published[slot] is policy:
+            return
+        self.slots[slot].publish(
+            {name: getattr(policy, name) for name in LIN_GAUSS_FIELDS}
+        )
+        self._published[slot] = policy
+
+
+class PolicySubscriber(object):
+    """
+    Reads the policies of a PolicyPublisher in another process. The
+    policies wrap the shared memory directly, and are only rebuilt when
+    the version of their slot changes.
+    Args:
+        slots: The slots attribute of the publisher.
+    """
+    def __init__(self, slots):
+        self._slots = slots
+        self._versions = [None] * len(slots)
+        self._policies = [None] * len(slots)
+
+    def get(self, slot):
+        """ Returns the latest policy published into a slot. """
+        version = self._slots[slot].version
+        if version != self._versions[slot]:
+            arrays = self._slots[slot].arrays()
+            self._policies[slot] = LinearGaussianPolicy(
+                *[arrays[name] for name in LIN_GAUSS_FIELDS]
+            )
+            self._versions[slot] = version
+        return self._policies[slot]
@@ -0,0 +1,146 @@
+""" This file defines an event driven action loop for asynchronous policies. """
+import logging
+import threading
+import time
+
+import numpy as np
+
+
+LOGGER = logging.getLogger(__name__)
+
+# Clock for latencies, unaffected by changes to the system time.
+_clock = getattr(time, 'monotonic', time.time)
+
+# Upper edges, in seconds, of the observation-to-action latency histogram.
+LATENCY_BINS = np.array([0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1,
+                         np.inf])
+
+
+class ActionServer(object):
+    """
+    Computes and publishes an action for each observation as soon as it
+    arrives. Observations are handed over from the subscriber callback
+    to a dedicated thread, so a slow policy never blocks the callback
+    queue. If observations arrive faster than actions are computed, only
+    the latest one is acted on and the others are counted as dropped.
+    Args:
+        publish: Function publishing an action, called as
+            publish(action, action_id). Action ids start at 1 for each
+            trial.
+        deadline: Seconds from receiving an observation to publishing
+            its action, after which the step counts as a deadline miss.
+        obs_to_numpy: Function converting an observation message into
+            the observation vector. Runs on the action thread.
+    """
+    def __init__(self, publish, deadline, obs_to_numpy=np.asarray):
+        self._publish = publish
+        self._deadline = deadline
+        self._obs_to_numpy = obs_to_numpy
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._act = None
+        self._pending = None
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._latencies = []
+        self._dropped = 0
+        self._errors = 0
+
+    def start(self, act, warmup_obs=None):
+        """
+        Start serving actions for a trial.
+        Args:
+            act: Function from an observation vector to an action.
+            warmup_obs: If given, act is run once on this observation
+                before the trial, so that lazily initialized parts of the
+                inference path are set up before the first deadline.
+        """
+        if self._thread is not None:
+            raise RuntimeError('Action server is already running.')
+        if warmup_obs is not None:
+            act(warmup_obs)
+        with self._cond:
+            self._act = act
+            self._pending = None
+            self._reset_stats()
+            self._running = True
+        self._thread = threading.Thread(target=self._loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop serving actions, and return the timing statistics of the
+        trial (see timing()).
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return self.timing()
+
+    def observe(self, obs_msg):
+        """ Subscriber callback for observation messages. """
+        received = _clock()
+        with self._cond:
+            if not self._running:
+                return
+            if self._pending is not None:
+                self._dropped += 1
+            self._pending = (obs_msg, received)
+            self._cond.notify_all()
+
+    def _loop(self):
+        action_id = 1
+        while True:
+            with self._cond:
+                while self._running and self._pending is None:
+                    self._cond.wait()
+                if not self._running:
+                    break
+                obs_msg, received = self._pending
+                self._pending = None
+            try:
+                action = self._act(self._obs_to_numpy(obs_msg))
+                self._publish(action, action_id)
+            except Exception:
+                LOGGER.exception('Failed to compute action %d.', action_id)
+                with self._cond:
+                    self._errors += 1
+                continue
+            latency = _clock() - received
+            with self._cond:
+                self._latencies.append(latency)
+            action_id += 1
+
+    def timing(self):
+        """
+        Return the timing statistics of the current or last trial, as a
+        dictionary with:
+            latencies: Observation-to-action latency of each step.
+            histogram: Number of steps with a latency of at most each
+                edge in bins, and more than the previous one.
+            bins: The latency histogram edges, LATENCY_BINS.
+            deadline: The deadline in seconds.
+            deadline_misses: Number of steps that missed the deadline.
+            dropped: Number of observations that were not acted on.
+            errors: Number of observations the policy failed on.
+        """
+        with self._cond:
+            latencies = np.array(self._latencies)
+            dropped, errors = self._dropped, self._errors
+        histogram = np.bincount(np.searchsorted(LATENCY_BINS, latencies),
+                                minlength=len(LATENCY_BINS))
+        return {
+            'latencies': latencies,
+            'histogram': histogram,
+            'bins': LATENCY_BINS,
+            'deadline': self._deadline,
+            'deadline_misses': int(np.sum(latencies > self._deadline)),
+            'dropped': dropped,
+            'errors': errors,
+        }
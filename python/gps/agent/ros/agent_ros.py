@@ -1,5 +1,6 @@
 """ This file defines an agent for the PR2 ROS environment. """
 import copy
+import logging
 import time
 import numpy as np
 
@@ -8,6 +9,7 @@ import rospy
 from gps.agent.agent import Agent
 from gps.agent.agent_utils import generate_noise, setup
 from gps.agent.config import AGENT_ROS
+from gps.agent.ros.action_server import ActionServer
 from gps.agent.ros.ros_utils import ServiceEmulator, msg_to_sample, \
         policy_to_msg, tf_policy_to_action_msg, tf_obs_msg_to_numpy
 from gps.proto.gps_pb2 import TRIAL_ARM, AUXILIARY_ARM
@@ -19,23 +21,28 @@ except ImportError:  # user does not have tf installed.
     TfPolicy = None
 
 
+LOGGER = logging.getLogger(__name__)
+
 
 class AgentROS(Agent):
     """
     All communication between the algorithms and ROS is done through
     this class.
     """
-    def __init__(self, hyperparams, init_node=True):
+    def __init__(self, hyperparams, init_node=True, bus=None):
         """
         Initialize agent.
         Args:
             hyperparams: Dictionary of hyperparameters.
             init_node: Whether or not to initialize a new ROS node.
+            bus: If given, a LoopbackBus to communicate on instead of
+                ROS topics, e.g. with a FakeRobot. No ROS node is needed.
         """
         config = copy.deepcopy(AGENT_ROS)
         config.update(hyperparams)
         Agent.__init__(self, config)
-        if init_node:
+        self._bus = bus
+        if init_node and bus is None:
             rospy.init_node('gps_agent_ros_node')
         self._init_pubs_and_subs()
         self._seq_id = 0  # Used for setting seq in ROS commands.
@@ -48,30 +55,48 @@ class AgentROS(Agent):
                                              conditions)
         self.x0 = self._hyperparams['x0']
 
-        r = rospy.Rate(1)
-        r.sleep()
+        if bus is None:
+            r = rospy.Rate(1)
+            r.sleep()
 
         self.use_tf = False
-        self.observations_stale = True
 
     def _init_pubs_and_subs(self):
+        if self._bus is None:
+            self._publisher, self._subscriber = \
+                    rospy.Publisher, rospy.Subscriber
+        else:
+            self._publisher, self._subscriber = \
+                    self._bus.Publisher, self._bus.Subscriber
+        factories = {'publisher': self._publisher,
+                     'subscriber': self._subscriber}
         self._trial_service = ServiceEmulator(
             self._hyperparams['trial_command_topic'], TrialCommand,
-            self._hyperparams['sample_result_topic'], SampleResult
+            self._hyperparams['sample_result_topic'], SampleResult,
+            **factories
         )
         self._reset_service = ServiceEmulator(
             self._hyperparams['reset_command_topic'], PositionCommand,
-            self._hyperparams['sample_result_topic'], SampleResult
+            self._hyperparams['sample_result_topic'], SampleResult,
+            **factories
         )
         self._relax_service = ServiceEmulator(
             self._hyperparams['relax_command_topic'], RelaxCommand,
-            self._hyperparams['sample_result_topic'], SampleResult
+            self._hyperparams['sample_result_topic'], SampleResult,
+            **factories
         )
         self._data_service = ServiceEmulator(
             self._hyperparams['data_request_topic'], DataRequest,
-            self._hyperparams['sample_result_topic'], SampleResult
+            self._hyperparams['sample_result_topic'], SampleResult,
+            **factories
         )
 
+    def _get_stamp(self):
+        """ Return the current time for message stamps. """
+        if self._bus is None:
+            return rospy.get_rostime()
+        return rospy.Time.from_sec(time.time())
+
     def _get_next_seq_id(self):
         self._seq_id = (self._seq_id + 1) % (2 ** 32)
         return self._seq_id
@@ -86,9 +111,10 @@ class AgentROS(Agent):
         request = DataRequest()
         request.id = self._get_next_seq_id()
         request.arm = arm
-        request.stamp = rospy.get_rostime()
-        result_msg = self._data_service.publish_and_wait(request)
-        # TODO - Make IDs match, assert that they match elsewhere here.
+        request.stamp = self._get_stamp()
+        result_msg = self._data_service.publish_and_wait(
+            request, check_id=self._hyperparams['check_id']
+        )
         sample = msg_to_sample(result_msg, self)
         return sample
 
@@ -102,9 +128,11 @@ class AgentROS(Agent):
         """
         relax_command = RelaxCommand()
         relax_command.id = self._get_next_seq_id()
-        relax_command.stamp = rospy.get_rostime()
+        relax_command.stamp = self._get_stamp()
         relax_command.arm = arm
-        self._relax_service.publish_and_wait(relax_command)
+        self._relax_service.publish_and_wait(
+            relax_command, check_id=self._hyperparams['check_id']
+        )
 
     def reset_arm(self, arm, mode, data):
         """
@@ -121,7 +149,10 @@ class AgentROS(Agent):
         reset_command.arm = arm
         timeout = self._hyperparams['trial_timeout']
         reset_command.id = self._get_next_seq_id()
-        self._reset_service.publish_and_wait(reset_command, timeout=timeout)
+        self._reset_service.publish_and_wait(
+            reset_command, timeout=timeout,
+            check_id=self._hyperparams['check_id']
+        )
         #TODO: Maybe verify that you reset to the correct position.
 
     def reset(self, condition):
@@ -136,7 +167,7 @@ class AgentROS(Agent):
         self.reset_arm(AUXILIARY_ARM, condition_data[AUXILIARY_ARM]['mode'],
                        condition_data[AUXILIARY_ARM]['data'])
 
-    def sample(self, policy, condition, verbose=True, save=True):
+    def sample(self, policy, condition, verbose=True, save=True, noise=None):
         """
         Reset and execute a policy and collect a sample.
         Args:
@@ -144,8 +175,11 @@ class AgentROS(Agent):
             condition: Which condition setup to run.
             verbose: Unused for this agent.
             save: Whether or not to store the trial into the samples.
+            noise: T x dU action noise. Generated if not specified.
         Returns:
-            sample: A Sample object.
+            sample: A Sample object. Samples of TF policies have an
+                action_timing attribute with the timing statistics of
+                the action server (see ActionServer.timing).
         """
         if TfPolicy is not None:  # user has tf installed.
             if isinstance(policy, TfPolicy):
@@ -153,12 +187,16 @@ class AgentROS(Agent):
 
         self.reset(condition)
         # Generate noise.
-        noise = generate_noise(self.T, self.dU, self._hyperparams)
+        if noise is None:
+            noise = generate_noise(self.T, self.dU, self._hyperparams)
 
         # Execute trial.
         trial_command = TrialCommand()
         trial_command.id = self._get_next_seq_id()
-        trial_command.controller = policy_to_msg(policy, noise)
+        trial_command.controller = policy_to_msg(
+            policy, noise, binary=self._hyperparams['binary_transport']
+        )
+        trial_command.binary_reports = self._hyperparams['binary_transport']
         trial_command.T = self.T
         trial_command.id = self._get_next_seq_id()
         trial_command.frequency = self._hyperparams['frequency']
@@ -171,66 +209,78 @@ class AgentROS(Agent):
 
         if self.use_tf is False:
             sample_msg = self._trial_service.publish_and_wait(
-                trial_command, timeout=self._hyperparams['trial_timeout']
+                trial_command, timeout=self._hyperparams['trial_timeout'],
+                check_id=self._hyperparams['check_id']
             )
             sample = msg_to_sample(sample_msg, self)
             if save:
                 self._samples[condition].append(sample)
             return sample
         else:
-            self._trial_service.publish(trial_command)
-            sample_msg = self.run_trial_tf(policy, time_to_run=self._hyperparams['trial_timeout'])
+            sample_msg, timing = self.run_trial_tf(
+                policy, trial_command,
+                time_to_run=self._hyperparams['trial_timeout']
+            )
             sample = msg_to_sample(sample_msg, self)
+            sample.action_timing = timing
             if save:
                 self._samples[condition].append(sample)
             return sample
 
-    def run_trial_tf(self, policy, time_to_run=5):
-        """ Run an async controller from a policy. The async controller receives observations from ROS subscribers
-         and then uses them to publish actions."""
-        should_stop = False
-        consecutive_failures = 0
-        start_time = time.time()
-        while should_stop is False:
-            if self.observations_stale is False:
-                consecutive_failures = 0
-                last_obs = tf_obs_msg_to_numpy(self._tf_subscriber_msg)
-                action_msg = tf_policy_to_action_msg(self.dU,
-                                                     self._get_new_action(policy, last_obs),
-                                                     self.current_action_id)
-                self._tf_publish(action_msg)
-                self.observations_stale = True
-                self.current_action_id += 1
-            else:
-                rospy.sleep(0.01)
-                consecutive_failures += 1
-                if time.time() - start_time > time_to_run and consecutive_failures > 5:
-                    # we only stop when we have run for the trial time and are no longer receiving obs.
-                    should_stop = True
-        rospy.sleep(0.25)  # wait for finished trial to come in.
-        result = self._trial_service._subscriber_msg
-        return result  # the trial has completed. Here is its message.
+    def run_trial_tf(self, policy, trial_command, time_to_run=5):
+        """
+        Run a trial with an asynchronous controller. The action server
+        computes and publishes an action for every observation the
+        robot sends, until the result of the trial comes in.
+        Args:
+            policy: The policy to compute actions with.
+            trial_command: TrialCommand starting the trial.
+            time_to_run: Timeout in seconds for the trial.
+        Returns:
+            The SampleResult message of the trial, and the timing
+            statistics of the action server.
+        """
+        warmup_obs = None
+        if getattr(policy, 'scale', None) is not None:
+            warmup_obs = np.zeros(policy.scale.shape[0])
+        self._action_server.start(
+            lambda obs: self._get_new_action(policy, obs), warmup_obs
+        )
+        try:
+            result = self._trial_service.publish_and_wait(
+                trial_command, timeout=time_to_run,
+                check_id=self._hyperparams['check_id']
+            )
+        finally:
+            timing = self._action_server.stop()
+        latencies = timing['latencies']
+        LOGGER.debug('Served %d actions, %d deadline misses, %d dropped '
+                     'observations, max latency %.2f ms.', len(latencies),
+                     timing['deadline_misses'], timing['dropped'],
+                     1000 * latencies.max() if len(latencies) else 0.0)
+        return result, timing
 
     def _get_new_action(self, policy, obs):
         return policy.act(None, obs, None, None)
 
-    def _tf_callback(self, message):
-        self._tf_subscriber_msg = message
-        self.observations_stale = False
-
-    def _tf_publish(self, pub_msg):
-        """ Publish a message without waiting for response. """
-        self._pub.publish(pub_msg)
+    def _tf_publish(self, action, action_id):
+        """ Publish an action without waiting for response. """
+        self._pub.publish(tf_policy_to_action_msg(self.dU, action, action_id))
 
     def _init_tf(self, dU):
-        self._tf_subscriber_msg = None
-        self.observations_stale = True
-        self.current_action_id = 1
         self.dU = dU
         if self.use_tf is False:  # init pub and sub if this init has not been called before.
-            self._pub = rospy.Publisher('/gps_controller_sent_robot_action_tf', TfActionCommand)
-            self._sub = rospy.Subscriber('/gps_obs_tf', TfObsData, self._tf_callback)
-            r = rospy.Rate(0.5)  # wait for publisher/subscriber to kick on.
-            r.sleep()
+            deadline = self._hyperparams['action_deadline']
+            if deadline is None:
+                deadline = 1.0 / self._hyperparams['frequency']
+            self._action_server = ActionServer(
+                self._tf_publish, deadline, obs_to_numpy=tf_obs_msg_to_numpy
+            )
+            self._pub = self._publisher(self._hyperparams['tf_action_topic'],
+                                        TfActionCommand)
+            self._sub = self._subscriber(self._hyperparams['tf_obs_topic'],
+                                         TfObsData, self._action_server.observe)
+            if self._bus is None:
+                r = rospy.Rate(0.5)  # wait for publisher/subscriber to kick on.
+                r.sleep()
         self.use_tf = True
-        self.observations_stale = True
@@ -0,0 +1,33 @@
+"""
+This file defines the binary layout used to send arrays in ROS messages.
+An array is sent as the raw bytes of its data in a uint8[] field,
+together with its numpy dtype string and shape, and is decoded without
+copying with np.frombuffer.
+"""
+import numpy as np
+
+
+def array_to_blob(array, dtype='<f8'):
+    """
+    Return the raw bytes of an array, in C order.
+    Args:
+        array: Array to encode.
+        dtype: Numpy dtype string to encode the data as. Should have an
+            explicit byte order.
+    """
+    return np.ascontiguousarray(array, dtype=np.dtype(dtype)).tobytes()
+
+
+def blob_to_array(blob, dtype, shape=None):
+    """
+    Return an array viewing the raw bytes of a blob. The array is read
+    only, as it shares memory with the message.
+    Args:
+        blob: Bytes of the data, as received in a uint8[] field.
+        dtype: Numpy dtype string of the data.
+        shape: Shape of the array. Defaults to a flat array.
+    """
+    array = np.frombuffer(blob, dtype=np.dtype(dtype))
+    if shape is not None:
+        array = array.reshape(tuple(shape))
+    return array
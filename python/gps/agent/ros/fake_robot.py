@@ -0,0 +1,195 @@
+""" This file defines an in-process stand-in for the robot plugin. """
+import logging
+import threading
+import time
+
+import numpy as np
+
+from gps.agent.ros.binary_transport import array_to_blob, blob_to_array
+from gps.proto.gps_pb2 import ACTION, LIN_GAUSS_CONTROLLER, TF_CONTROLLER, \
+        TRIAL_ARM
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class FakeRobot(object):
+    """
+    Pure Python stand-in for the robot plugin. It runs trials on the
+    linear system x' = A x + B u and talks to the agent over a
+    LoopbackBus, on the topics of the plugin, so AgentROS can be run and
+    benchmarked without a robot or simulator.
+
+    Every command is answered with a SampleResult echoing its id, with
+    the state split into the state_include sensors (and the actions, for
+    trials). Position commands to the trial arm set the first entries of
+    the state to the commanded data and zero the others; relax commands
+    and data requests report the current state.
+
+    Linear Gaussian trials run the commanded gains as fast as possible.
+    TF trials behave like the TF controller of the plugin: an
+    observation (the current state) is published every controller step,
+    and the latest action received is applied. Steps without a new
+    action reuse the previous one and are counted in stale_steps.
+    Args:
+        bus: LoopbackBus to communicate on.
+        hyperparams: Dictionary with the topic names of AGENT_ROS and
+            the sensor_dims and state_include of the agent.
+        A: dX x dX dynamics matrix.
+        B: dX x dU control matrix.
+        x0: Initial state. Defaults to zeros.
+        msgs: Module with the message classes of gps_agent_pkg.msg.
+            Defaults to gps_agent_pkg.msg.
+        rate: Controller steps per second in TF trials. Defaults to the
+            frequency of the trial command.
+    """
+    def __init__(self, bus, hyperparams, A, B, x0=None, msgs=None,
+                 rate=None):
+        if msgs is None:
+            import gps_agent_pkg.msg as msgs
+        self._msgs = msgs
+        self._hyperparams = hyperparams
+        self._A, self._B = A, B
+        self._x = np.zeros(A.shape[0]) if x0 is None else np.array(x0)
+        self._rate = rate
+
+        self._binary = False
+
+        self._lock = threading.Lock()
+        self._action = (0, np.zeros(B.shape[1]))
+        self.stale_steps = 0
+
+        self._report_pub = bus.Publisher(hyperparams['sample_result_topic'],
+                                         msgs.SampleResult)
+        self._obs_pub = bus.Publisher(hyperparams['tf_obs_topic'],
+                                      msgs.TfObsData)
+        bus.Subscriber(hyperparams['trial_command_topic'],
+                       msgs.TrialCommand, self._trial_callback)
+        bus.Subscriber(hyperparams['reset_command_topic'],
+                       msgs.PositionCommand, self._position_callback)
+        bus.Subscriber(hyperparams['relax_command_topic'],
+                       msgs.RelaxCommand, self._report_callback)
+        bus.Subscriber(hyperparams['data_request_topic'],
+                       msgs.DataRequest, self._report_callback)
+        bus.Subscriber(hyperparams['tf_action_topic'],
+                       msgs.TfActionCommand, self._action_callback)
+
+    def _trial_callback(self, msg):
+        # Like the plugin, keep the report layout of the last trial.
+        self._binary = msg.binary_reports
+        controller = msg.controller.controller_to_execute
+        if controller == LIN_GAUSS_CONTROLLER:
+            self._run_lin_gauss_trial(msg)
+        elif controller == TF_CONTROLLER:
+            # Run the trial outside of the callback, as it waits for
+            # actions that are delivered by callbacks.
+            thread = threading.Thread(target=self._run_tf_trial, args=(msg,))
+            thread.daemon = True
+            thread.start()
+        else:
+            LOGGER.error('Unsupported controller %d.', controller)
+
+    def _position_callback(self, msg):
+        if msg.arm == TRIAL_ARM:
+            data = np.asarray(msg.data, dtype=float)
+            self._x = np.zeros_like(self._x)
+            self._x[:data.size] = data
+        self._report_callback(msg)
+
+    def _report_callback(self, msg):
+        self._report_pub.publish(
+            self._sample_result(msg.id, self._x[np.newaxis], None)
+        )
+
+    def _action_callback(self, msg):
+        with self._lock:
+            self._action = (msg.id, np.array(msg.action))
+
+    def _run_lin_gauss_trial(self, msg):
+        lingauss = msg.controller.lingauss
+        T, dX, dU = msg.T, lingauss.dX, lingauss.dU
+        binary = len(lingauss.K_blob) > 0 or len(lingauss.k_blob) > 0
+        if binary:
+            sizes = (len(lingauss.K_blob), len(lingauss.k_blob))
+            expected = (T * dU * dX * 8, T * dU * 8)
+        else:
+            sizes = (len(lingauss.K_t), len(lingauss.k_t))
+            expected = (T * dU * dX, T * dU)
+        # Like the plugin, reject gains of the wrong size without a report.
+        if sizes != expected or T * dU * dX == 0:
+            LOGGER.error('Linear Gaussian gains do not match T=%d, dX=%d, '
+                         'dU=%d, rejecting trial command.', T, dX, dU)
+            return
+        if binary:
+            K = blob_to_array(lingauss.K_blob, '<f8', (T, dU, dX))
+            k = blob_to_array(lingauss.k_blob, '<f8', (T, dU))
+        else:
+            K = np.reshape(lingauss.K_t, (T, dU, dX))
+            k = np.reshape(lingauss.k_t, (T, dU))
+        X = np.empty((T, self._A.shape[0]))
+        U = np.empty((T, self._B.shape[1]))
+        for t in range(T):
+            X[t] = self._x
+            U[t] = K[t].dot(self._x) + k[t]
+            self._x = self._A.dot(self._x) + self._B.dot(U[t])
+        self._report_pub.publish(self._sample_result(msg.id, X, U))
+
+    def _run_tf_trial(self, msg):
+        T = msg.T
+        period = 1.0 / (self._rate or msg.frequency)
+        X = np.empty((T, self._A.shape[0]))
+        U = np.empty((T, self._B.shape[1]))
+        with self._lock:
+            self._action = (0, np.zeros(self._B.shape[1]))
+        last_id = 0
+        deadline = time.time()
+        for t in range(T):
+            X[t] = self._x
+            obs = self._msgs.TfObsData()
+            obs.data = self._x.tolist()
+            obs.shape = [self._x.size]
+            self._obs_pub.publish(obs)
+
+            # Act at the next controller tick.
+            deadline += period
+            time.sleep(max(deadline - time.time(), 0))
+            with self._lock:
+                action_id, U[t] = self._action
+            if action_id <= last_id:
+                self.stale_steps += 1
+            last_id = action_id
+            self._x = self._A.dot(self._x) + self._B.dot(U[t])
+        self._report_pub.publish(self._sample_result(msg.id, X, U))
+
+    def _sample_result(self, msg_id, X, U):
+        """
+        Build a SampleResult message.
+        Args:
+            msg_id: Id of the command answered.
+            X: T x dX states.
+            U: T x dU actions, or None to leave them out.
+        """
+        data = []
+        offset = 0
+        for data_type in self._hyperparams['state_include']:
+            dim = self._hyperparams['sensor_dims'][data_type]
+            data.append((data_type, X[:, offset:offset+dim]))
+            offset += dim
+        if U is not None:
+            data.append((ACTION, U))
+
+        result = self._msgs.SampleResult()
+        result.id = msg_id
+        result.sensor_data = []
+        for data_type, array in data:
+            sensor = self._msgs.DataType()
+            sensor.data_type = data_type
+            sensor.shape = list(array.shape)
+            if self._binary:
+                sensor.data, sensor.dtype = [], '<f8'
+                sensor.blob = array_to_blob(array)
+            else:
+                sensor.data = array.ravel().tolist()
+                sensor.dtype, sensor.blob = '', b''
+            result.sensor_data.append(sensor)
+        return result
@@ -0,0 +1,83 @@
+""" This file defines an in-process stand-in for ROS topics. """
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class LoopbackBus(object):
+    """
+    Delivers messages published on a topic to the callbacks subscribed
+    to it, within one process. Publisher and Subscriber have the
+    signatures of rospy.Publisher and rospy.Subscriber, so they can be
+    passed as factories to ServiceEmulator.
+    Args:
+        asynchronous: If True, callbacks run on a dispatch thread, as
+            they do in ROS. Otherwise they run inside publish.
+    """
+    def __init__(self, asynchronous=True):
+        self._lock = threading.Lock()
+        self._callbacks = {}
+        self._queue = None
+        if asynchronous:
+            self._queue = queue.Queue()
+            dispatcher = threading.Thread(target=self._dispatch_loop)
+            dispatcher.daemon = True
+            dispatcher.start()
+
+    def Publisher(self, topic, msg_type=None, **kwargs):
+        """ Returns a publisher for a topic. """
+        return _LoopbackPublisher(self, topic)
+
+    def Subscriber(self, topic, msg_type, callback, **kwargs):
+        """ Subscribes callback to a topic. """
+        with self._lock:
+            self._callbacks.setdefault(topic, []).append(callback)
+        return _LoopbackSubscriber(self, topic, callback)
+
+    def publish(self, topic, msg):
+        """ Delivers msg to the subscribers of topic. """
+        if self._queue is None:
+            self._deliver(topic, msg)
+        else:
+            self._queue.put((topic, msg))
+
+    def unsubscribe(self, topic, callback):
+        """ Removes a callback from a topic. """
+        with self._lock:
+            self._callbacks[topic].remove(callback)
+
+    def _deliver(self, topic, msg):
+        with self._lock:
+            callbacks = list(self._callbacks.get(topic, []))
+        for callback in callbacks:
+            callback(msg)
+
+    def _dispatch_loop(self):
+        while True:
+            topic, msg = self._queue.get()
+            self._deliver(topic, msg)
+
+
+class _LoopbackPublisher(object):
+    """ Publisher on a LoopbackBus topic. """
+    def __init__(self, bus, topic):
+        self._bus = bus
+        self._topic = topic
+
+    def publish(self, msg):
+        """ Publish a message. """
+        self._bus.publish(self._topic, msg)
+
+
+class _LoopbackSubscriber(object):
+    """ Subscription to a LoopbackBus topic. """
+    def __init__(self, bus, topic, callback):
+        self._bus = bus
+        self._topic = topic
+        self._callback = callback
+
+    def unregister(self):
+        """ Stop receiving messages. """
+        self._bus.unsubscribe(self._topic, self._callback)
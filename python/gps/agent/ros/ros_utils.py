@@ -3,6 +3,9 @@ import numpy as np
 
 import rospy
 
+from gps.agent.ros.binary_transport import array_to_blob, blob_to_array
+from gps.agent.ros.service_emulator import ServiceEmulator, \
+        TimeoutException
 from gps.algorithm.policy.lin_gauss_policy import LinearGaussianPolicy
 from gps_agent_pkg.msg import ControllerParams, LinGaussParams, TfParams, CaffeParams, TfActionCommand
 from gps.sample.sample import Sample
@@ -24,19 +27,29 @@ except ImportError:
 def msg_to_sample(ros_msg, agent):
     """
     Convert a SampleResult ROS message into a Sample Python object.
+    Sensors sent in the binary layout are not copied, and are therefore
+    read only.
     """
     sample = Sample(agent)
     for sensor in ros_msg.sensor_data:
         sensor_id = sensor.data_type
-        shape = np.array(sensor.shape)
-        data = np.array(sensor.data).reshape(shape)
+        if len(sensor.blob) > 0:
+            data = blob_to_array(sensor.blob, sensor.dtype, sensor.shape)
+        else:
+            shape = np.array(sensor.shape)
+            data = np.array(sensor.data).reshape(shape)
         sample.set(sensor_id, data)
     return sample
 
 
-def policy_to_msg(policy, noise):
+def policy_to_msg(policy, noise, binary=False):
     """
     Convert a policy object to a ROS ControllerParams message.
+    Args:
+        policy: Policy to convert.
+        noise: T x dU action noise, folded into linear Gaussian policies.
+        binary: Whether to send linear Gaussian gains as raw bytes
+            instead of float64 lists.
     """
     msg = ControllerParams()
     if isinstance(policy, LinearGaussianPolicy):
@@ -44,10 +57,14 @@ def policy_to_msg(policy, noise):
         msg.lingauss = LinGaussParams()
         msg.lingauss.dX = policy.dX
         msg.lingauss.dU = policy.dU
-        msg.lingauss.K_t = \
-                policy.K.reshape(policy.T * policy.dX * policy.dU).tolist()
-        msg.lingauss.k_t = \
-                policy.fold_k(noise).reshape(policy.T * policy.dU).tolist()
+        if binary:
+            msg.lingauss.K_blob = array_to_blob(policy.K)
+            msg.lingauss.k_blob = array_to_blob(policy.fold_k(noise))
+        else:
+            msg.lingauss.K_t = \
+                    policy.K.reshape(policy.T * policy.dX * policy.dU).tolist()
+            msg.lingauss.k_t = \
+                    policy.fold_k(noise).reshape(policy.T * policy.dU).tolist()
     elif NO_CAFFE is False and isinstance(policy, CaffePolicy):
         msg.controller_to_execute = CAFFE_CONTROLLER
         msg.caffe = CaffeParams()
@@ -79,64 +96,3 @@ def tf_policy_to_action_msg(deg_action, action, action_id):
 def tf_obs_msg_to_numpy(obs_message):
     # ToDo: Reshape this if needed.
     return np.array(obs_message.data)
-
-
-class TimeoutException(Exception):
-    """ Exception thrown on timeouts. """
-    def __init__(self, sec_waited):
-        Exception.__init__(self, "Timed out after %f seconds", sec_waited)
-
-
-class ServiceEmulator(object):
-    """
-    Emulates a ROS service (request-response) from a
-    publisher-subscriber pair.
-    Args:
-        pub_topic: Publisher topic.
-        pub_type: Publisher message type.
-        sub_topic: Subscriber topic.
-        sub_type: Subscriber message type.
-    """
-    def __init__(self, pub_topic, pub_type, sub_topic, sub_type):
-        self._pub = rospy.Publisher(pub_topic, pub_type)
-        self._sub = rospy.Subscriber(sub_topic, sub_type, self._callback)
-
-        self._waiting = False
-        self._subscriber_msg = None
-
-    def _callback(self, message):
-        if self._waiting:
-            self._subscriber_msg = message
-            self._waiting = False
-
-    def publish(self, pub_msg):
-        """ Publish a message without waiting for response. """
-        self._pub.publish(pub_msg)
-
-    def publish_and_wait(self, pub_msg, timeout=5.0, poll_delay=0.01,
-                         check_id=False):
-        """
-        Publish a message and wait for the response.
-        Args:
-            pub_msg: Message to publish.
-            timeout: Timeout in seconds.
-            poll_delay: Speed of polling for the subscriber message in
-                seconds.
-            check_id: If enabled, will only return messages with a
-                matching id field.
-        Returns:
-            sub_msg: Subscriber message.
-        """
-        if check_id:  # This is not yet implemented in C++.
-            raise NotImplementedError()
-
-        self._waiting = True
-        self.publish(pub_msg)
-
-        time_waited = 0
-        while self._waiting:
-            rospy.sleep(poll_delay)
-            time_waited += 0.01
-            if time_waited > timeout:
-                raise TimeoutException(time_waited)
-        return self._subscriber_msg
@@ -0,0 +1,117 @@
+""" This file defines a request-response primitive over topics. """
+import logging
+import threading
+import time
+
+
+LOGGER = logging.getLogger(__name__)
+
+# Clock for timeouts, unaffected by changes to the system time.
+_clock = getattr(time, 'monotonic', time.time)
+
+
+class TimeoutException(Exception):
+    """ Exception thrown on timeouts. """
+    def __init__(self, sec_waited):
+        Exception.__init__(self, "Timed out after %f seconds" % sec_waited)
+
+
+class ServiceEmulator(object):
+    """
+    Emulates a ROS service (request-response) from a
+    publisher-subscriber pair. Waiting for a response blocks on a
+    condition variable that the subscriber callback notifies, so the
+    response is returned as soon as it arrives.
+    Args:
+        pub_topic: Publisher topic.
+        pub_type: Publisher message type.
+        sub_topic: Subscriber topic.
+        sub_type: Subscriber message type.
+        publisher: Publisher factory, with the signature of
+            rospy.Publisher. Defaults to rospy.Publisher.
+        subscriber: Subscriber factory, with the signature of
+            rospy.Subscriber. Defaults to rospy.Subscriber.
+    """
+    def __init__(self, pub_topic, pub_type, sub_topic, sub_type,
+                 publisher=None, subscriber=None):
+        if publisher is None or subscriber is None:
+            import rospy
+            publisher = publisher or rospy.Publisher
+            subscriber = subscriber or rospy.Subscriber
+        self._cond = threading.Condition()
+        self._waiting = False
+        self._expected_id = None
+        self._discarded_id = None  # Id of the last mismatched response.
+        self._subscriber_msg = None
+
+        self._pub = publisher(pub_topic, pub_type)
+        self._sub = subscriber(sub_topic, sub_type, self._callback)
+
+    def _callback(self, message):
+        with self._cond:
+            if not self._waiting:
+                return
+            if (self._expected_id is not None and
+                    getattr(message, 'id', None) != self._expected_id):
+                self._discarded_id = getattr(message, 'id', None)
+                LOGGER.debug('Discarding response with id %s, expected %s.',
+                             self._discarded_id, self._expected_id)
+                return
+            self._subscriber_msg = message
+            self._waiting = False
+            self._cond.notify_all()
+
+    def publish(self, pub_msg):
+        """ Publish a message without waiting for response. """
+        self._pub.publish(pub_msg)
+
+    def publish_and_wait(self, pub_msg, timeout=5.0, poll_delay=None,
+                         check_id=False):
+        """
+        Publish a message and wait for the response.
+        Args:
+            pub_msg: Message to publish.
+            timeout: Timeout in seconds.
+            poll_delay: Unused, kept for compatibility.
+            check_id: If enabled, will only return messages with an id
+                field matching the id of pub_msg. Other messages are
+                discarded as stale.
+        Returns:
+            sub_msg: Subscriber message.
+        """
+        with self._cond:
+            self._subscriber_msg = None
+            self._expected_id = pub_msg.id if check_id else None
+            self._discarded_id = None
+            self._waiting = True
+        start = _clock()
+        self.publish(pub_msg)
+
+        # Condition.wait with a timeout polls on Python 2, so wait without
+        # one and let a timer wake us up at the deadline instead.
+        expired = []
+
+        def expire():
+            with self._cond:
+                expired.append(True)
+                self._cond.notify_all()
+
+        timer = threading.Timer(timeout, expire)
+        timer.daemon = True
+        timer.start()
+        try:
+            with self._cond:
+                while self._waiting and not expired:
+                    self._cond.wait()
+                if self._waiting:
+                    self._waiting = False
+                    if self._discarded_id is not None:
+                        LOGGER.error('Discarded responses with id %s while '
+                                     'waiting for id %s. The robot plugin '
+                                     'may not echo command ids, rebuild it '
+                                     'or disable check_id.',
+                                     self._discarded_id, self._expected_id)
+                    raise TimeoutException(_clock() - start)
+                return self._subscriber_msg
+        finally:
+            timer.cancel()
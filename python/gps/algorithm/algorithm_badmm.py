@@ -3,11 +3,12 @@ import copy
 import logging
 
 import numpy as np
-import scipy as sp
 
 from gps.algorithm.algorithm import Algorithm
-from gps.algorithm.algorithm_utils import PolicyInfo, gauss_fit_joint_prior
+from gps.algorithm.algorithm_utils import PolicyInfo, gauss_fit_joint_prior, \
+        lin_gauss_actions
 from gps.algorithm.config import ALG_BADMM
+from gps.algorithm.traj_opt.traj_opt_utils import laplace_cost
 from gps.sample.sample_list import SampleList
 
 
@@ -93,16 +94,23 @@ class AlgorithmBADMM(Algorithm):
             )
 
     def _update_policy_samples(self):
-        """ Update the list of samples to use with the policy. """
+        """
+        Update the samples to use with the policy. They are kept in one
+        SampleList per iteration, so that the policy predictions on them
+        can be reused (see PolicyOpt.prob_samples).
+        """
         #TODO: Handle synthetic samples.
         max_policy_samples = self._hyperparams['max_policy_samples']
         if self._hyperparams['policy_sample_mode'] == 'add':
             for m in range(self.M):
                 samples = self.cur[m].pol_info.policy_samples
-                samples.extend(self.cur[m].sample_list)
+                if isinstance(samples, SampleList):
+                    samples = samples.get_samples()
+                samples = samples + self.cur[m].sample_list.get_samples()
                 if len(samples) > max_policy_samples:
                     start = len(samples) - max_policy_samples
-                    self.cur[m].pol_info.policy_samples = samples[start:]
+                    samples = samples[start:]
+                self.cur[m].pol_info.policy_samples = SampleList(samples)
         else:
             for m in range(self.M):
                 self.cur[m].pol_info.policy_samples = self.cur[m].sample_list
@@ -121,34 +129,30 @@ class AlgorithmBADMM(Algorithm):
         """ Compute the new policy. """
         dU, dO, T = self.dU, self.dO, self.T
         # Compute target mean, cov, and weight for each sample.
-        obs_data, tgt_mu = np.zeros((0, T, dO)), np.zeros((0, T, dU))
-        tgt_prc, tgt_wt = np.zeros((0, T, dU, dU)), np.zeros((0, T))
+        N_total = sum(len(self.cur[m].sample_list) for m in range(self.M))
+        obs_data = np.zeros((N_total, T, dO))
+        tgt_mu = np.zeros((N_total, T, dU))
+        tgt_prc = np.zeros((N_total, T, dU, dU))
+        tgt_wt = np.zeros((N_total, T))
+        start = 0
         for m in range(self.M):
             samples = self.cur[m].sample_list
             X = samples.get_X()
             N = len(samples)
+            end = start + N
             traj, pol_info = self.cur[m].traj_distr, self.cur[m].pol_info
-            mu = np.zeros((N, T, dU))
-            prc = np.zeros((N, T, dU, dU))
-            wt = np.zeros((N, T))
-            # Get time-indexed actions.
-            for t in range(T):
-                # Compute actions along this trajectory.
-                prc[:, t, :, :] = np.tile(traj.inv_pol_covar[t, :, :],
-                                          [N, 1, 1])
-                for i in range(N):
-                    mu[i, t, :] = \
-                            (traj.K[t, :, :].dot(X[i, t, :]) + traj.k[t, :]) - \
-                            np.linalg.solve(
-                                prc[i, t, :, :],  #TODO: Divide by pol_wt[t].
-                                pol_info.lambda_K[t, :, :].dot(X[i, t, :]) + \
-                                        pol_info.lambda_k[t, :]
-                            )
-                wt[:, t].fill(pol_info.pol_wt[t])
-            tgt_mu = np.concatenate((tgt_mu, mu))
-            tgt_prc = np.concatenate((tgt_prc, prc))
-            tgt_wt = np.concatenate((tgt_wt, wt))
-            obs_data = np.concatenate((obs_data, samples.get_obs()))
+            # Compute actions along this trajectory, shifted by the
+            # Lagrange multipliers, for all samples and time steps at once.
+            traj_mu = lin_gauss_actions(traj.K, traj.k, X)
+            lg_mu = lin_gauss_actions(pol_info.lambda_K, pol_info.lambda_k, X)
+            #TODO: Divide by pol_wt[t].
+            lg_shift = np.linalg.solve(traj.inv_pol_covar,
+                                       np.transpose(lg_mu, [1, 2, 0]))
+            tgt_mu[start:end] = traj_mu - np.transpose(lg_shift, [2, 0, 1])
+            tgt_prc[start:end] = traj.inv_pol_covar
+            tgt_wt[start:end] = pol_info.pol_wt
+            obs_data[start:end] = samples.get_obs()
+            start = end
         self.policy_opt.update(obs_data, tgt_mu, tgt_prc, tgt_wt,
                                itr, inner_itr)
 
@@ -166,43 +170,39 @@ class AlgorithmBADMM(Algorithm):
         N = len(samples)
         pol_info = self.cur[m].pol_info
         X = samples.get_X()
-        pol_mu, pol_sig = self.policy_opt.prob(samples.get_obs().copy())[:2]
+        pol_mu, pol_sig = self.policy_opt.prob_samples(samples)[:2]
         pol_info.pol_mu, pol_info.pol_sig = pol_mu, pol_sig
         # Update policy prior.
         if init:
             self.cur[m].pol_info.policy_prior.update(
-                samples, self.policy_opt,
-                SampleList(self.cur[m].pol_info.policy_samples)
+                samples, self.policy_opt, pol_info.policy_samples
             )
         else:
             self.cur[m].pol_info.policy_prior.update(
-                SampleList([]), self.policy_opt,
-                SampleList(self.cur[m].pol_info.policy_samples)
+                SampleList([]), self.policy_opt, pol_info.policy_samples
             )
         # Collapse policy covariances. This is not really correct, but
         # it works fine so long as the policy covariance doesn't depend
         # on state.
         pol_sig = np.mean(pol_sig, axis=0)
-        # Estimate the policy linearization at each time step.
-        for t in range(T):
-            # Assemble diagonal weights matrix and data.
-            dwts = (1.0 / N) * np.ones(N)
-            Ts = X[:, t, :]
-            Ps = pol_mu[:, t, :]
-            Ys = np.concatenate((Ts, Ps), axis=1)
-            # Obtain Normal-inverse-Wishart prior.
-            mu0, Phi, mm, n0 = self.cur[m].pol_info.policy_prior.eval(Ts, Ps)
-            sig_reg = np.zeros((dX+dU, dX+dU))
-            # On the first time step, always slightly regularize covariance.
-            if t == 0:
-                sig_reg[:dX, :dX] = 1e-8 * np.eye(dX)
-            # Perform computation.
-            pol_K, pol_k, pol_S = gauss_fit_joint_prior(Ys, mu0, Phi, mm, n0,
-                                                        dwts, dX, dU, sig_reg)
-            pol_S += pol_sig[t, :, :]
-            pol_info.pol_K[t, :, :], pol_info.pol_k[t, :] = pol_K, pol_k
-            pol_info.pol_S[t, :, :], pol_info.chol_pol_S[t, :, :] = \
-                    pol_S, sp.linalg.cholesky(pol_S)
+        # Estimate the policy linearization at all time steps at once.
+        dwts = (1.0 / N) * np.ones(N)
+        Ts = np.transpose(X, [1, 0, 2])
+        Ps = np.transpose(pol_mu, [1, 0, 2])
+        Ys = np.concatenate((Ts, Ps), axis=2)
+        # Obtain Normal-inverse-Wishart prior.
+        mu0, Phi, mm, n0 = self.cur[m].pol_info.policy_prior.eval(Ts, Ps)
+        sig_reg = np.zeros((T, dX+dU, dX+dU))
+        # On the first time step, always slightly regularize covariance.
+        sig_reg[0, :dX, :dX] = 1e-8 * np.eye(dX)
+        # Perform computation.
+        pol_K, pol_k, pol_S = gauss_fit_joint_prior(Ys, mu0, Phi, mm, n0,
+                                                    dwts, dX, dU, sig_reg)
+        pol_S += pol_sig
+        pol_info.pol_K[:], pol_info.pol_k[:] = pol_K, pol_k
+        pol_info.pol_S[:] = pol_S
+        # Upper triangular factors, like scipy.linalg.cholesky returns.
+        pol_info.chol_pol_S[:] = np.swapaxes(np.linalg.cholesky(pol_S), 1, 2)
 
     def _policy_dual_step(self, m, step=False):
         """
@@ -211,32 +211,24 @@ class AlgorithmBADMM(Algorithm):
             m: Condition
             step: Whether or not to update pol_wt.
         """
-        dU, T = self.dU, self.T
         samples = self.cur[m].sample_list
-        N = len(samples)
         X = samples.get_X()
         traj, pol_info = self.cur[m].traj_distr, self.cur[m].pol_info
         # Compute trajectory action at each sampled state.
-        traj_mu = np.zeros((N, T, dU))
-        for i in range(N):
-            for t in range(T):
-                traj_mu[i, t, :] = traj.K[t, :, :].dot(X[i, t, :]) + \
-                        traj.k[t, :]
+        traj_mu = lin_gauss_actions(traj.K, traj.k, X)
         # Compute policy action at each sampled state.
         pol_mu = pol_info.pol_mu
         # Compute the difference and increment based on pol_wt.
-        for t in range(T):
-            tU, pU = traj_mu[:, t, :], pol_mu[:, t, :]
-            # Increment mean term.
-            pol_info.lambda_k[t, :] -= self._hyperparams['policy_dual_rate'] * \
-                    pol_info.pol_wt[t] * \
-                    traj.inv_pol_covar[t, :, :].dot(np.mean(tU - pU, axis=0))
-            # Increment covariance term.
-            t_covar, p_covar = traj.K[t, :, :], pol_info.pol_K[t, :, :]
-            pol_info.lambda_K[t, :, :] -= \
-                    self._hyperparams['policy_dual_rate_covar'] * \
-                    pol_info.pol_wt[t] * \
-                    traj.inv_pol_covar[t, :, :].dot(t_covar - p_covar)
+        # Increment mean term.
+        mean_diff = np.mean(traj_mu - pol_mu, axis=0)
+        pol_info.lambda_k -= self._hyperparams['policy_dual_rate'] * \
+                pol_info.pol_wt[:, np.newaxis] * \
+                np.einsum('tij,tj->ti', traj.inv_pol_covar, mean_diff)
+        # Increment covariance term.
+        pol_info.lambda_K -= self._hyperparams['policy_dual_rate_covar'] * \
+                pol_info.pol_wt[:, np.newaxis, np.newaxis] * \
+                np.einsum('tij,tjk->tik', traj.inv_pol_covar,
+                          traj.K - pol_info.pol_K)
         # Compute KL divergence.
         kl_m = self._policy_kl(m)[0]
         if step:
@@ -244,9 +236,7 @@ class AlgorithmBADMM(Algorithm):
             # Increment pol_wt based on change in KL divergence.
             if self._hyperparams['fixed_lg_step'] == 1:
                 # Take fixed size step.
-                pol_info.pol_wt = np.array([
-                    max(wt + lg_step, 0) for wt in pol_info.pol_wt
-                ])
+                pol_info.pol_wt = np.maximum(pol_info.pol_wt + lg_step, 0)
             elif self._hyperparams['fixed_lg_step'] == 2:
                 # (In/De)crease based on change in constraint
                 # satisfaction.
@@ -273,10 +263,8 @@ class AlgorithmBADMM(Algorithm):
                                     self._hyperparams['exp_step_increase']
             else:
                 # Standard DGD step.
-                pol_info.pol_wt = np.array([
-                    max(pol_info.pol_wt[t] + lg_step * kl_m[t], 0)
-                    for t in range(T)
-                ])
+                pol_info.pol_wt = np.maximum(pol_info.pol_wt + lg_step * kl_m,
+                                             0)
             pol_info.prev_kl = kl_m
 
     def _advance_iteration_variables(self):
@@ -386,60 +374,56 @@ class AlgorithmBADMM(Algorithm):
         Monte-Carlo estimate of KL divergence between policy and
         trajectory.
         """
-        dU, T = self.dU, self.T
+        dU = self.dU
         if prev:
             traj, pol_info = self.prev[m].traj_distr, self.cur[m].pol_info
             samples = self.prev[m].sample_list
         else:
             traj, pol_info = self.cur[m].traj_distr, self.cur[m].pol_info
             samples = self.cur[m].sample_list
-        N = len(samples)
-        X, obs = samples.get_X(), samples.get_obs()
-        kl, kl_m = np.zeros((N, T)), np.zeros(T)
-        kl_l, kl_lm = np.zeros((N, T)), np.zeros(T)
+        X = samples.get_X()
         # Compute policy mean and covariance at each sample.
-        pol_mu, _, pol_prec, pol_det_sigma = self.policy_opt.prob(obs.copy())
-        # Compute KL divergence.
-        for t in range(T):
-            # Compute trajectory action at sample.
-            traj_mu = np.zeros((N, dU))
-            for i in range(N):
-                traj_mu[i, :] = traj.K[t, :, :].dot(X[i, t, :]) + traj.k[t, :]
-            diff = pol_mu[:, t, :] - traj_mu
-            tr_pp_ct = pol_prec[:, t, :, :] * traj.pol_covar[t, :, :]
-            k_ln_det_ct = 0.5 * dU + np.sum(
-                np.log(np.diag(traj.chol_pol_covar[t, :, :]))
-            )
-            ln_det_cp = np.log(pol_det_sigma[:, t])
-            # IMPORTANT: Note that this assumes that pol_prec does not
-            #            depend on state!!!!
-            #            (Only the last term makes this assumption.)
-            d_pp_d = np.sum(diff * (diff.dot(pol_prec[1, t, :, :])), axis=1)
-            kl[:, t] = 0.5 * np.sum(np.sum(tr_pp_ct, axis=1), axis=1) - \
-                    k_ln_det_ct + 0.5 * ln_det_cp + 0.5 * d_pp_d
-            tr_pp_ct_m = np.mean(tr_pp_ct, axis=0)
-            kl_m[t] = 0.5 * np.sum(np.sum(tr_pp_ct_m, axis=0), axis=0) - \
-                    k_ln_det_ct + 0.5 * np.mean(ln_det_cp) + \
-                    0.5 * np.mean(d_pp_d)
-            # Compute trajectory action at sample with Lagrange
-            # multiplier.
-            traj_mu = np.zeros((N, dU))
-            for i in range(N):
-                traj_mu[i, :] = \
-                        (traj.K[t, :, :] - pol_info.lambda_K[t, :, :]).dot(
-                            X[i, t, :]
-                        ) + (traj.k[t, :] - pol_info.lambda_k[t, :])
-            # Compute KL divergence with Lagrange multiplier.
-            diff_l = pol_mu[:, t, :] - traj_mu
-            d_pp_d_l = np.sum(diff_l * (diff_l.dot(pol_prec[1, t, :, :])),
-                              axis=1)
-            kl_l[:, t] = 0.5 * np.sum(np.sum(tr_pp_ct, axis=1), axis=1) - \
-                    k_ln_det_ct + 0.5 * ln_det_cp + 0.5 * d_pp_d_l
-            kl_lm[t] = 0.5 * np.sum(np.sum(tr_pp_ct_m, axis=0), axis=0) - \
-                    k_ln_det_ct + 0.5 * np.mean(ln_det_cp) + \
-                    0.5 * np.mean(d_pp_d_l)
+        pol_mu, _, pol_prec, pol_det_sigma = \
+                self.policy_opt.prob_samples(samples)
+        # Compute trajectory action at each sample, and the shift by the
+        # Lagrange multipliers.
+        traj_mu = lin_gauss_actions(traj.K, traj.k, X)
+        lg_mu = lin_gauss_actions(pol_info.lambda_K, pol_info.lambda_k, X)
+        # Compute KL divergence for all time steps.
+        diff = pol_mu - traj_mu
+        tr_pp_ct = np.sum(pol_prec * traj.pol_covar, axis=(2, 3))
+        k_ln_det_ct = 0.5 * dU + np.sum(
+            np.log(np.diagonal(traj.chol_pol_covar, axis1=1, axis2=2)), axis=1
+        )
+        ln_det_cp = np.log(pol_det_sigma)
+        # IMPORTANT: Note that this assumes that pol_prec does not
+        #            depend on state!!!!
+        #            (Only the last term makes this assumption.)
+        d_pp_d = np.einsum('nti,tij,ntj->nt', diff, pol_prec[1], diff)
+        kl = 0.5 * tr_pp_ct - k_ln_det_ct + 0.5 * ln_det_cp + 0.5 * d_pp_d
+        kl_m = np.mean(kl, axis=0)
+        # Compute KL divergence with Lagrange multiplier, where the
+        # trajectory action is traj_mu - lg_mu.
+        diff_l = diff + lg_mu
+        d_pp_d_l = np.einsum('nti,tij,ntj->nt', diff_l, pol_prec[1], diff_l)
+        kl_l = 0.5 * tr_pp_ct - k_ln_det_ct + 0.5 * ln_det_cp + 0.5 * d_pp_d_l
+        kl_lm = np.mean(kl_l, axis=0)
         return kl_m, kl, kl_lm, kl_l
 
+    def _policy_precision(self, pol_info):
+        """
+        Compute the inverse of the policy linearization covariance for all
+        time steps from its Cholesky factors.
+        Args:
+            pol_info: A PolicyInfo object.
+        Returns:
+            T x dU x dU array of precision matrices.
+        """
+        chol_pol_S = pol_info.chol_pol_S
+        eye = np.tile(np.eye(chol_pol_S.shape[1]), [chol_pol_S.shape[0], 1, 1])
+        inv_chol_pol_S = np.linalg.solve(chol_pol_S, eye)
+        return np.einsum('tij,tkj->tik', inv_chol_pol_S, inv_chol_pol_S)
+
     def _estimate_cost(self, traj_distr, traj_info, m):
         """
         Compute Laplace approximation to expected cost.
@@ -451,7 +435,7 @@ class AlgorithmBADMM(Algorithm):
         pol_info = self.cur[m].pol_info
 
         # Constants.
-        T, dU, dX = self.T, self.dU, self.dX
+        dU, dX = self.dU, self.dX
 
         # Perform forward pass (note that we repeat this here, because
         # traj_info may have different dynamics from the ones that were
@@ -459,33 +443,24 @@ class AlgorithmBADMM(Algorithm):
         mu, sigma = self.traj_opt.forward(traj_distr, traj_info)
 
         # Compute cost.
-        predicted_cost = np.zeros(T)
-        for t in range(T):
-            predicted_cost[t] = traj_info.cc[t] + 0.5 * \
-                    (np.sum(sigma[t, :, :] * traj_info.Cm[t, :, :]) +
-                     mu[t, :].T.dot(traj_info.Cm[t, :, :]).dot(mu[t, :])) + \
-                    mu[t, :].T.dot(traj_info.cv[t, :])
+        predicted_cost = laplace_cost(mu, sigma, traj_info)
 
         # Compute KL divergence.
-        predicted_kl = np.zeros(T)
-        for t in range(T):
-            inv_pS = np.linalg.solve(
-                pol_info.chol_pol_S[t, :, :],
-                np.linalg.solve(pol_info.chol_pol_S[t, :, :].T, np.eye(dU))
-            )
-            Ufb = pol_info.pol_K[t, :, :].dot(mu[t, :dX].T) + \
-                    pol_info.pol_k[t, :]
-            diff = mu[t, dX:] - Ufb
-            Kbar = traj_distr.K[t, :, :] - pol_info.pol_K[t, :, :]
-            predicted_kl[t] = 0.5 * (diff).dot(inv_pS).dot(diff) + \
-                    0.5 * np.sum(traj_distr.pol_covar[t, :, :] * inv_pS) + \
-                    0.5 * np.sum(
-                        sigma[t, :dX, :dX] * Kbar.T.dot(inv_pS).dot(Kbar)
-                    ) + np.sum(
-                        np.log(np.diag(pol_info.chol_pol_S[t, :, :]))
-                    ) - np.sum(
-                        np.log(np.diag(traj_distr.chol_pol_covar[t, :, :]))
-                    ) + 0.5 * dU
+        inv_pS = self._policy_precision(pol_info)
+        Ufb = np.einsum('tij,tj->ti', pol_info.pol_K, mu[:, :dX]) + \
+                pol_info.pol_k
+        diff = mu[:, dX:] - Ufb
+        Kbar = traj_distr.K - pol_info.pol_K
+        Kbar_inv_pS_Kbar = np.einsum('tji,tjk->tik', Kbar,
+                                     np.einsum('tij,tjk->tik', inv_pS, Kbar))
+        predicted_kl = 0.5 * np.einsum('ti,tij,tj->t', diff, inv_pS, diff) + \
+                0.5 * np.sum(traj_distr.pol_covar * inv_pS, axis=(1, 2)) + \
+                0.5 * np.sum(sigma[:, :dX, :dX] * Kbar_inv_pS_Kbar,
+                             axis=(1, 2)) + \
+                np.sum(np.log(np.diagonal(pol_info.chol_pol_S, axis1=1,
+                                          axis2=2)), axis=1) - \
+                np.sum(np.log(np.diagonal(traj_distr.chol_pol_covar, axis1=1,
+                                          axis2=2)), axis=1) + 0.5 * dU
 
         return predicted_cost, predicted_kl
 
@@ -507,6 +482,7 @@ class AlgorithmBADMM(Algorithm):
         PKLm = np.zeros((T, dX+dU, dX+dU))
         PKLv = np.zeros((T, dX+dU))
         fCm, fcv = np.zeros(Cm.shape), np.zeros(cv.shape)
+        inv_pS = self._policy_precision(pol_info)
         for t in range(T):
             K, k = traj_distr.K[t, :, :], traj_distr.k[t, :]
             inv_pol_covar = traj_distr.inv_pol_covar[t, :, :]
@@ -521,10 +497,7 @@ class AlgorithmBADMM(Algorithm):
                 K.T.dot(inv_pol_covar).dot(k), -inv_pol_covar.dot(k)
             ])
             # Policy KL-divergence terms.
-            inv_pol_S = np.linalg.solve(
-                pol_info.chol_pol_S[t, :, :],
-                np.linalg.solve(pol_info.chol_pol_S[t, :, :].T, np.eye(dU))
-            )
+            inv_pol_S = inv_pS[t, :, :]
             KB, kB = pol_info.pol_K[t, :, :], pol_info.pol_k[t, :]
             PKLm[t, :, :] = np.vstack([
                 np.hstack([KB.T.dot(inv_pol_S).dot(KB), -KB.T.dot(inv_pol_S)]),
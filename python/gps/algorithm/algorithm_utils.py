@@ -49,12 +49,24 @@ class PolicyInfo(BundleType):
             'pol_S': np.zeros((T, dU, dU)),  # Policy linearization covariance.
             'chol_pol_S': np.zeros((T, dU, dU)),  # Cholesky decomp of covar.
             'prev_kl': None,  # Previous KL divergence.
-            'policy_samples': [],  # List of current policy samples.
+            'policy_samples': [],  # SampleList of current policy samples.
             'policy_prior': None,  # Current prior for policy linearization.
         }
         BundleType.__init__(self, variables)
 
 
+def lin_gauss_actions(K, k, X):
+    """
+    Return the N x T x dU mean actions K[t] * X[i, t] + k[t] of a time
+    varying linear controller at each sampled state.
+    Args:
+        K: T x dU x dX gains.
+        k: T x dU offsets.
+        X: N x T x dX states.
+    """
+    return np.einsum('tij,ntj->nti', K, X) + k
+
+
 def estimate_moments(X, mu, covar):
     """ Estimate the moments for a given linearized policy. """
     N, T, dX = X.shape
@@ -74,25 +86,47 @@ def estimate_moments(X, mu, covar):
 
 
 def gauss_fit_joint_prior(pts, mu0, Phi, m, n0, dwts, dX, dU, sig_reg):
-    """ Perform Gaussian fit to data with a prior. """
-    # Build weights matrix.
-    D = np.diag(dwts)
+    """
+    Perform Gaussian fit to data with a prior. The fit may be batched,
+    e.g. over time steps, by giving pts a leading T dimension. The other
+    arrays and m and n0 then either have the same leading dimension, or
+    are shared by all fits.
+    Args:
+        pts: N x D data points, or T x N x D.
+        mu0, Phi, m, n0: Normal-inverse-Wishart prior.
+        dwts: N data point weights.
+        dX, dU: Dimensionality of the conditioning and conditioned
+            variables, with D = dX + dU.
+        sig_reg: D x D covariance regularization.
+    Returns:
+        The gain fd, offset fc and covariance dynsig of the conditional
+        Gaussian, dU x dX, dU and dU x dU, with the leading T dimension
+        of a batched fit.
+    """
     # Compute empirical mean and covariance.
-    mun = np.sum((pts.T * dwts).T, axis=0)
-    diff = pts - mun
-    empsig = diff.T.dot(D).dot(diff)
-    empsig = 0.5 * (empsig + empsig.T)
+    mun = np.einsum('...n,...nd->...d', dwts, pts)
+    diff = pts - mun[..., np.newaxis, :]
+    empsig = np.einsum('...ni,...nj->...ij', diff * dwts[..., np.newaxis],
+                       diff)
+    empsig = 0.5 * (empsig + np.swapaxes(empsig, -1, -2))
     # MAP estimate of joint distribution.
-    N = dwts.shape[0]
+    N = dwts.shape[-1]
+    m = np.reshape(m, np.shape(m) + (1, 1))
+    n0 = np.reshape(n0, np.shape(n0) + (1, 1))
     mu = mun
+    mun_diff = mun - mu0
     sigma = (N * empsig + Phi + (N * m) / (N + m) *
-             np.outer(mun - mu0, mun - mu0)) / (N + n0)
-    sigma = 0.5 * (sigma + sigma.T)
+             np.einsum('...i,...j->...ij', mun_diff, mun_diff)) / (N + n0)
+    sigma = 0.5 * (sigma + np.swapaxes(sigma, -1, -2))
     # Add sigma regularization.
-    sigma += sig_reg
+    sigma = sigma + sig_reg
     # Conditioning to get dynamics.
-    fd = np.linalg.solve(sigma[:dX, :dX], sigma[:dX, dX:dX+dU]).T
-    fc = mu[dX:dX+dU] - fd.dot(mu[:dX])
-    dynsig = sigma[dX:dX+dU, dX:dX+dU] - fd.dot(sigma[:dX, :dX]).dot(fd.T)
-    dynsig = 0.5 * (dynsig + dynsig.T)
+    fd = np.swapaxes(np.linalg.solve(sigma[..., :dX, :dX],
+                                     sigma[..., :dX, dX:dX+dU]), -1, -2)
+    fc = mu[..., dX:dX+dU] - np.einsum('...ij,...j->...i', fd, mu[..., :dX])
+    dynsig = sigma[..., dX:dX+dU, dX:dX+dU] - np.einsum(
+        '...ij,...kj->...ik',
+        np.einsum('...ij,...jk->...ik', fd, sigma[..., :dX, :dX]), fd
+    )
+    dynsig = 0.5 * (dynsig + np.swapaxes(dynsig, -1, -2))
     return fd, fc, dynsig
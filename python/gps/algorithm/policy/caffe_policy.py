@@ -1,16 +1,23 @@
 """ This file defines a neural network policy implemented in Caffe. """
+import logging
 import tempfile
 
 import numpy as np
 
+from gps.algorithm.policy.numpy_mlp import NumpyMLP
 from gps.algorithm.policy.policy import Policy
 
 
+LOGGER = logging.getLogger(__name__)
+
+
 class CaffePolicy(Policy):
     """
     A neural network policy implemented in Caffe. The network output is
     taken to be the mean, and Gaussian noise is added on top of it.
     U = net.forward(obs) + noise, where noise ~ N(0, diag(var))
+    Fully connected ReLU networks can be exported with export_mlp, after
+    which act runs a NumPy copy of the network instead of the net.
     Args:
         test_net: Initialized caffe network that can run forward.
         var: Du-dimensional noise variance vector.
@@ -20,6 +27,7 @@ class CaffePolicy(Policy):
         self.net = test_net
         self.deploy_net = deploy_net
         self.chol_pol_covar = np.diag(np.sqrt(var))
+        self.mlp = None  # NumPy copy of the network, see export_mlp.
 
     def act(self, x, obs, t, noise):
         """
@@ -30,13 +38,62 @@ class CaffePolicy(Policy):
             t: Time step.
             noise: Action noise. This will be scaled by the variance.
         """
+        if self.mlp is not None:
+            action_mean = self.mlp.forward(obs)
+        else:
+            action_mean = self._run_net(obs)[0]
+        u = action_mean + self.chol_pol_covar.T.dot(noise)
+        return u
+
+    def _run_net(self, obs):
+        """
+        Run the network on an observation, or on a matrix of as many
+        observations as the batch size of the net.
+        """
         # Normalize obs.
         obs = obs.dot(self.scale) + self.bias
 
         self.net.blobs[self.net.blobs.keys()[0]].data[:] = obs
-        action_mean = self.net.forward().values()[0][0]
-        u = action_mean + self.chol_pol_covar.T.dot(noise)
-        return u
+        return self.net.forward().values()[0]
+
+    def export_mlp(self):
+        """
+        Copy the current network weights and normalization into a
+        NumPy network used by act. Must be called again whenever they
+        change. Networks that are not a chain of inner product layers
+        with ReLUs between them are left to Caffe.
+        Returns:
+            Whether the network was exported.
+        """
+        self.mlp = None
+        if getattr(self, 'scale', None) is None:
+            return False
+        weights, biases = [], []
+        relu = []
+        for name, layer in zip(self.net._layer_names, self.net.layers):
+            if layer.type == 'InnerProduct':
+                params = self.net.params[name]
+                weights.append(params[0].data.T.copy())
+                biases.append(params[1].data.copy())
+                relu.append(False)
+            elif layer.type == 'ReLU' and relu and not relu[-1]:
+                relu[-1] = True
+            elif layer.type not in ('Python', 'DummyData', 'Input') or relu:
+                # Only input layers may come before the first layer.
+                relu = None
+                break
+        if not relu or relu[-1] or not all(relu[:-1]):
+            LOGGER.debug('Policy network is not an MLP, not exporting it.')
+            return False
+        mlp = NumpyMLP(weights, biases, self.scale, self.bias)
+        input_blob = self.net.blobs[self.net.blobs.keys()[0]]
+        if not mlp.matches(self._run_net, weights[0].shape[0],
+                           batch_size=input_blob.data.shape[0]):
+            LOGGER.warning('Exported policy network does not match the '
+                           'original, not using it.')
+            return False
+        self.mlp = mlp
+        return True
 
     def get_weights_string(self):
         """ Return the weights of the neural network as a string. """
@@ -33,4 +33,7 @@ POLICY_PRIOR_GMM = {
     'max_samples': 20,
     'strength': 1.0,
     'keep_samples': True,
+    # Without new samples, the GMM is refit after this many policy
+    # updates since the last fit. 0 refits on every update.
+    'refit_policy_updates': 0,
 }
@@ -42,6 +42,21 @@ class LinearGaussianPolicy(Policy):
         u += self.chol_pol_covar[t].T.dot(noise)
         return u
 
+    def act_batch(self, X, obs, t, noise=None):
+        """
+        Return actions for a batch of states.
+        Args:
+            X: N x dX state matrix.
+            obs: N x dO observation matrix.
+            t: Time step.
+            noise: N x dU action noise. This will be scaled by the
+                variance.
+        """
+        U = X.dot(self.K[t].T) + self.k[t]
+        if noise is not None:
+            U += noise.dot(self.chol_pol_covar[t])
+        return U
+
     def fold_k(self, noise):
         """
         Fold noise into k.
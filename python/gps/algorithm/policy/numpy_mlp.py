@@ -0,0 +1,51 @@
+""" This file defines a NumPy copy of a fully connected policy network. """
+import numpy as np
+
+
+class NumpyMLP(object):
+    """
+    Inference only copy of a fully connected network with ReLUs after
+    every layer but the last, evaluated with NumPy. The observation
+    normalization obs.dot(scale) + bias is folded into the first layer.
+    Args:
+        weights: List of dIn x dOut weight matrices, one per layer.
+        biases: List of dOut bias vectors, one per layer.
+        scale: dO x dO observation scale, or None.
+        bias: dO observation bias, or None.
+    """
+    def __init__(self, weights, biases, scale=None, bias=None):
+        self.weights = [np.array(w, dtype=np.float64) for w in weights]
+        self.biases = [np.array(b, dtype=np.float64) for b in biases]
+        if scale is not None:
+            self.biases[0] = bias.dot(self.weights[0]) + self.biases[0]
+            self.weights[0] = scale.dot(self.weights[0])
+
+    def forward(self, obs):
+        """
+        Return the network output.
+        Args:
+            obs: Unnormalized observation vector, or N x dO matrix.
+        """
+        h = obs
+        for i in range(len(self.weights)):
+            h = h.dot(self.weights[i]) + self.biases[i]
+            if i < len(self.weights) - 1:
+                np.maximum(h, 0, out=h)
+        return h
+
+    def matches(self, forward, dO, batch_size=1, tol=1e-4):
+        """
+        Check that this copy agrees with the network on random
+        observations.
+        Args:
+            forward: Function running the network on a batch_size x dO
+                matrix of unnormalized observations.
+            dO: Dimensionality of observations.
+            batch_size: Number of observations to check.
+            tol: Absolute and relative tolerance.
+        """
+        obs = np.random.RandomState(0).randn(batch_size, dO)
+        expected = np.reshape(forward(obs), (batch_size, -1))
+        actual = self.forward(obs)
+        return (actual.shape == expected.shape and
+                np.allclose(actual, expected, rtol=tol, atol=tol))
@@ -0,0 +1,48 @@
+""" This file defines a neural network policy evaluated with NumPy. """
+import numpy as np
+
+from gps.algorithm.policy.policy import Policy
+
+
+class NumpyMLPPolicy(Policy):
+    """
+    A neural network policy running an exported NumpyMLP, with Gaussian
+    noise added on top of the network output. Unlike the TF and Caffe
+    policies it can be pickled, e.g. to sample it in a worker process.
+    U = mlp.forward(obs) + noise, where noise ~ N(0, diag(var))
+    Args:
+        mlp: NumpyMLP copy of the network.
+        chol_pol_covar: dU x dU Cholesky factor of the noise covariance.
+    """
+    def __init__(self, mlp, chol_pol_covar):
+        Policy.__init__(self)
+        self.mlp = mlp
+        self.chol_pol_covar = chol_pol_covar
+
+    def act(self, x, obs, t, noise):
+        """
+        Return an action for a state.
+        Args:
+            x: State vector.
+            obs: Observation vector.
+            t: Time step.
+            noise: Action noise. This will be scaled by the variance.
+        """
+        u = self.mlp.forward(obs)
+        if noise is not None:
+            u = u + self.chol_pol_covar.T.dot(noise)
+        return u
+
+    def act_batch(self, X, obs, t, noise=None):
+        """
+        Return actions for a batch of states with a single forward pass.
+        Args:
+            X: N x dX state matrix.
+            obs: N x dO observation matrix.
+            t: Time step.
+            noise: N x dU action noise, or None.
+        """
+        U = self.mlp.forward(obs)
+        if noise is not None:
+            U = U + noise.dot(self.chol_pol_covar)
+        return U
@@ -1,6 +1,8 @@
 """ This file defines the base class for the policy. """
 import abc
 
+import numpy as np
+
 
 class Policy(object):
     """ Computes actions from states/observations. """
@@ -18,3 +20,21 @@ class Policy(object):
             A dU dimensional action vector.
         """
         raise NotImplementedError("Must be implemented in subclass.")
+
+    def act_batch(self, X, obs, t, noise=None):
+        """
+        Compute actions for a batch of states at the same time step.
+        Defaults to calling act once per row; subclasses may override
+        this with a single vectorized evaluation.
+        Args:
+            X: N x dX state matrix.
+            obs: N x dO observation matrix.
+            t: Time step.
+            noise: N x dU noise matrix, or None.
+        Returns:
+            An N x dU action matrix.
+        """
+        return np.array([
+            self.act(X[i], obs[i], t, None if noise is None else noise[i])
+            for i in range(X.shape[0])
+        ])
@@ -32,60 +32,101 @@ class PolicyPriorGMM(object):
             max_samples: Maximum number of trajectories to use for
                 fitting the GMM at any given time.
             strength: Adjusts the strength of the prior.
+            keep_samples: Whether to fit the GMM to a history of the
+                samples passed to update, instead of all_samples.
+            refit_policy_updates: Without new samples, only refit the
+                GMM after this many policy updates since the last fit.
         """
         config = copy.deepcopy(POLICY_PRIOR_GMM)
         config.update(hyperparams)
         self._hyperparams = config
-        self.X = None
-        self.obs = None
         self.gmm = GMM()
         self._min_samp = self._hyperparams['min_samples_per_cluster']
         self._max_samples = self._hyperparams['max_samples']
         self._max_clusters = self._hyperparams['max_clusters']
         self._strength = self._hyperparams['strength']
+        # Ring buffers of the last max_samples - 1 trajectories, with the
+        # policy output at each, computed with policy version _U_version.
+        self._capacity = max(self._max_samples - 1, 1)
+        self._X, self._obs, self._U = None, None, None
+        self._size, self._next = 0, 0
+        self._U_version = None
+        self._fit_version = None  # Policy version of the last GMM fit.
 
     def update(self, samples, policy_opt, all_samples, retrain=True):
         """ Update prior with additional data. """
-        X, obs = samples.get_X(), samples.get_obs()
-        all_X, all_obs = all_samples.get_X(), all_samples.get_obs()
-        U = all_samples.get_U()
-        dO, T = all_X.shape[2] + U.shape[2], all_X.shape[1]
         if self._hyperparams['keep_samples']:
-            # Append data to dataset.
-            if self.X is None:
-                self.X = X
-            elif X.size > 0:
-                self.X = np.concatenate([self.X, X], axis=0)
-            if self.obs is None:
-                self.obs = obs
-            elif obs.size > 0:
-                self.obs = np.concatenate([self.obs, obs], axis=0)
-            # Remove excess samples from dataset.
-            start = max(0, self.X.shape[0] - self._max_samples + 1)
-            self.X = self.X[start:, :, :]
-            self.obs = self.obs[start:, :, :]
-            # Evaluate policy at samples to get mean policy action.
-            Upol = policy_opt.prob(self.obs.copy())[0]
+            # Append data to dataset, replacing the oldest samples.
+            new_idx = self._append(samples)
+            # Evaluate policy at samples to get mean policy action. Only
+            # the new samples need it unless the policy has changed.
+            if self._U_version != policy_opt.version:
+                self._set_U(self._order(), policy_opt)
+                self._U_version = policy_opt.version
+            elif new_idx.size > 0:
+                self._set_U(new_idx, policy_opt)
+            new_data = new_idx.size > 0
             # Create dataset.
-            N = self.X.shape[0]
-            XU = np.reshape(np.concatenate([self.X, Upol], axis=2), [T * N, dO])
+            order = self._order()
+            X, U = self._X[order], self._U[order]
         else:
             # Simply use the dataset that is already there.
-            all_U = policy_opt.prob(all_obs.copy())[0]
-            N = all_X.shape[0]
-            XU = np.reshape(np.concatenate([all_X, all_U], axis=2), [T * N, dO])
+            X = all_samples.get_X()
+            U = policy_opt.prob_samples(all_samples)[0]
+            new_data = True
+        N, T = X.shape[:2]
+        dO = X.shape[2] + U.shape[2]
+        XU = np.reshape(np.concatenate([X, U], axis=2), [T * N, dO])
         # Choose number of clusters.
         K = int(max(2, min(self._max_clusters,
                            np.floor(float(N * T) / self._min_samp))))
         LOGGER.debug('Generating %d clusters for policy prior GMM.', K)
         # Update GMM.
-        if retrain:
+        if retrain and (new_data or self._fit_version is None or
+                        policy_opt.version - self._fit_version >=
+                        self._hyperparams['refit_policy_updates']):
             self.gmm.update(XU, K)
+            self._fit_version = policy_opt.version
+
+    def _append(self, samples):
+        """
+        Write the states and observations of samples into the ring
+        buffers, and return the buffer indices written to.
+        """
+        if len(samples) == 0:
+            return np.zeros(0, dtype=int)
+        X, obs = samples.get_X(), samples.get_obs()
+        if self._X is None:
+            self._X = np.zeros((self._capacity,) + X.shape[1:])
+            self._obs = np.zeros((self._capacity,) + obs.shape[1:])
+        X, obs = X[-self._capacity:], obs[-self._capacity:]
+        idx = (self._next + np.arange(X.shape[0])) % self._capacity
+        self._X[idx], self._obs[idx] = X, obs
+        self._next = (self._next + X.shape[0]) % self._capacity
+        self._size = min(self._size + X.shape[0], self._capacity)
+        return idx
+
+    def _order(self):
+        """ Return the indices of the stored samples, oldest first. """
+        return (self._next - self._size + np.arange(self._size)) % \
+                self._capacity
+
+    def _set_U(self, idx, policy_opt):
+        """ Evaluate the policy at the stored samples with indices idx. """
+        U = policy_opt.prob(self._obs[idx])[0]
+        if self._U is None:
+            self._U = np.zeros((self._capacity,) + U.shape[1:])
+        self._U[idx] = U
 
     def eval(self, Ts, Ps):
-        """ Evaluate prior. """
+        """
+        Evaluate prior.
+        Args:
+            Ts: N x dX states, or T x N x dX to evaluate all time steps.
+            Ps: N x dU policy actions, or T x N x dU.
+        """
         # Construct query data point.
-        pts = np.concatenate((Ts, Ps), axis=1)
+        pts = np.concatenate((Ts, Ps), axis=-1)
         # Perform query.
         mu0, Phi, m, n0 = self.gmm.inference(pts)
         # Factor in multiplier.
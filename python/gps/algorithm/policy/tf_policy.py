@@ -1,16 +1,24 @@
+import logging
 import pickle
 
 import numpy as np
 import tensorflow as tf
 
+from gps.algorithm.policy.numpy_mlp import NumpyMLP
 from gps.algorithm.policy.policy import Policy
 
 
+LOGGER = logging.getLogger(__name__)
+
+
 class TfPolicy(Policy):
     """
     A neural network policy implemented in tensor flow. The network output is
     taken to be the mean, and Gaussian noise is added on top of it.
     U = net.forward(obs) + noise, where noise ~ N(0, diag(var))
+    Fully connected ReLU networks can be exported with export_mlp, after
+    which act and act_batch run a NumPy copy of the network instead of
+    the session.
     Args:
         obs_tensor: tensor representing tf observation. Used in feed dict for forward pass.
         act_op: tf op to execute the forward pass. Use sess.run on this op.
@@ -28,6 +36,7 @@ class TfPolicy(Policy):
         self.chol_pol_covar = np.diag(np.sqrt(var))
         self.scale = None  # must be set from elsewhere based on observations
         self.bias = None
+        self.mlp = None  # NumPy copy of the network, see export_mlp.
 
     def act(self, x, obs, t, noise):
         """
@@ -38,16 +47,66 @@ class TfPolicy(Policy):
             t: Time step.
             noise: Action noise. This will be scaled by the variance.
         """
-        # Normalize obs.
-        obs = obs.dot(self.scale) + self.bias
-        with tf.device(self.device_string):
-            action_mean = self.sess.run(self.act_op, feed_dict={self.obs_tensor: np.expand_dims(obs, 0)})
+        if self.mlp is not None:
+            action_mean = self.mlp.forward(np.expand_dims(obs, 0))
+        else:
+            action_mean = self._run_net(np.expand_dims(obs, 0))
         if noise is None:
             u = action_mean
         else:
             u = action_mean + self.chol_pol_covar.T.dot(noise)
         return u[0]  # this algorithm is batched by default. But here, we run with a batch size of one.
 
+    def act_batch(self, X, obs, t, noise=None):
+        """
+        Return actions for a batch of states with a single forward pass.
+        Args:
+            X: N x dX state matrix.
+            obs: N x dO observation matrix.
+            t: Time step.
+            noise: N x dU action noise, or None.
+        """
+        if self.mlp is not None:
+            U = self.mlp.forward(obs)
+        else:
+            U = self._run_net(obs)
+        if noise is not None:
+            U = U + noise.dot(self.chol_pol_covar)
+        return U
+
+    def _run_net(self, obs):
+        """ Run the network on an N x dO matrix of observations. """
+        # Normalize obs.
+        obs = obs.dot(self.scale) + self.bias
+        with tf.device(self.device_string):
+            return self.sess.run(self.act_op, feed_dict={self.obs_tensor: obs})
+
+    def export_mlp(self):
+        """
+        Copy the current network weights and normalization into a
+        NumPy network used by act and act_batch. Must be called again
+        whenever they change. Networks that are not a chain of matmul,
+        bias add and ReLU ops are left to the session.
+        Returns:
+            Whether the network was exported.
+        """
+        self.mlp = None
+        if self.scale is None:
+            return False
+        layers = _mlp_layers(self.act_op, self.obs_tensor)
+        if layers is None:
+            LOGGER.debug('Policy network is not an MLP, not exporting it.')
+            return False
+        values = self.sess.run([t for layer in layers for t in layer])
+        mlp = NumpyMLP(values[0::2], values[1::2], self.scale, self.bias)
+        dO = values[0].shape[0]
+        if not mlp.matches(self._run_net, dO, batch_size=4):
+            LOGGER.warning('Exported policy network does not match the '
+                           'original, not using it.')
+            return False
+        self.mlp = mlp
+        return True
+
     def pickle_policy(self, deg_obs, deg_action, checkpoint_path):
         """
         We can save just the policy if we are only interested in running forward at a later point
@@ -61,10 +120,15 @@ class TfPolicy(Policy):
         saver.save(self.sess, checkpoint_path + '_tf_data')
 
     @classmethod
-    def load_policy(cls, policy_dict_path, tf_generator):
+    def load_policy(cls, policy_dict_path, tf_generator, numpy_inference=True):
         """
         For when we only need to load a policy for the forward pass. For instance, to run on the robot from
         a checkpointed policy.
+        Args:
+            policy_dict_path: Path of the file written by pickle_policy.
+            tf_generator: Function building the network.
+            numpy_inference: Whether to run the policy with a NumPy copy
+                of the network, see export_mlp.
         """
         from tensorflow.python.framework import ops
         ops.reset_default_graph()  # we need to destroy the default graph before re_init or checkpoint won't restore.
@@ -83,5 +147,60 @@ class TfPolicy(Policy):
         cls_init = cls(pol_dict['deg_action'], tf_map.get_input_tensor(), tf_map.get_output_op(), np.zeros((1,)),
                        sess, device_string)
         cls_init.chol_pol_covar = pol_dict['chol_pol_covar']
+        cls_init.scale = pol_dict['scale']
+        cls_init.bias = pol_dict['bias']
+        if numpy_inference:
+            cls_init.export_mlp()
         return cls_init
 
+
+def _mlp_layers(output, input_tensor):
+    """
+    Return the (weight, bias) tensors of each layer of a network, from
+    input to output, if it is a chain of matmul and bias add ops with
+    ReLUs after all layers but the last. Otherwise return None.
+    """
+    layers = []
+    tensor = output
+    while tensor is not input_tensor:
+        relu = tensor.op.type == 'Relu'
+        if relu:
+            tensor = tensor.op.inputs[0]
+        # ReLUs must follow every layer but the last.
+        if relu != (len(layers) > 0):
+            return None
+        if tensor.op.type not in ('Add', 'BiasAdd'):
+            return None
+        matmul, bias = tensor.op.inputs
+        if matmul.op.type != 'MatMul':
+            matmul, bias = bias, matmul
+        if (matmul.op.type != 'MatMul' or
+                matmul.op.get_attr('transpose_a') or
+                matmul.op.get_attr('transpose_b')):
+            return None
+        tensor, weight = matmul.op.inputs
+        # Weights and biases are evaluated without feeding the input.
+        if (_needs_feed(weight, input_tensor) or
+                _needs_feed(bias, input_tensor)):
+            return None
+        layers.append((weight, bias))
+    if not layers:
+        return None
+    return layers[::-1]
+
+
+def _needs_feed(tensor, input_tensor):
+    """
+    Return whether evaluating tensor requires feeding input_tensor or
+    another placeholder.
+    """
+    stack, visited = [tensor.op], set()
+    while stack:
+        op = stack.pop()
+        if op in visited:
+            continue
+        visited.add(op)
+        if op is input_tensor.op or op.type == 'Placeholder':
+            return True
+        stack.extend(t.op for t in op.inputs)
+    return False
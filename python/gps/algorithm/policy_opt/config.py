@@ -27,6 +27,21 @@ GENERIC_CONFIG = {
     # set gpu usage.
     'use_gpu': 1,  # Whether or not to use the GPU for caffe training.
     'gpu_id': 0,
+    # Early stopping. If holdout is positive, that fraction of the
+    # training data is held out and its loss is evaluated every
+    # holdout_interval iterations. Training stops after patience
+    # evaluations without a relative improvement of min_improvement,
+    # but not before min_iterations. 'iterations' is the maximum.
+    'holdout': 0.0,
+    'holdout_interval': 500,
+    'patience': 3,
+    'min_improvement': 1e-3,
+    'min_iterations': 0,
+    # Maximum number of observations per network forward pass in prob.
+    'prob_batch_size': 1000,
+    # Run fully connected policies with a NumPy copy of the network
+    # in act, rebuilt after each update.
+    'numpy_inference': True,
 }
 
 
@@ -47,7 +62,10 @@ checkpoint_path = os.path.abspath(os.path.join(os.path.dirname(__file__),
 POLICY_OPT_TF = {
     # Other hyperparameters.
     'network_model': example_tf_network,  # should return TfMap object from tf_utils. See example.
-    'checkpoint_prefix': checkpoint_path
+    'checkpoint_prefix': checkpoint_path,
+    # Number of minibatches gathered ahead of the training step on a
+    # background thread. 0 gathers them on demand.
+    'prefetch': 2,
 }
 
 POLICY_OPT_TF.update(GENERIC_CONFIG)
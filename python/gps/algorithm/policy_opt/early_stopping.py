@@ -0,0 +1,76 @@
+""" This file defines convergence based early stopping for policy training. """
+import numpy as np
+
+
+def split_holdout(arrays, fraction):
+    """
+    Randomly split the rows of arrays into a training and a holdout set.
+    Args:
+        arrays: List of arrays with the same first dimension N.
+        fraction: Fraction of rows to hold out. At least one row is
+            held out if fraction is positive, and one is kept.
+    Returns:
+        A list of training arrays and a list of holdout arrays.
+    """
+    N = arrays[0].shape[0]
+    num_holdout = int(round(fraction * N))
+    if fraction > 0:
+        num_holdout = min(max(num_holdout, 1), N - 1)
+    idx = np.random.permutation(N)
+    train_idx, holdout_idx = idx[num_holdout:], idx[:num_holdout]
+    return ([a[train_idx] for a in arrays],
+            [a[holdout_idx] for a in arrays])
+
+
+def weighted_euclidean_loss(mu, tgt_mu, tgt_prc):
+    """
+    Return the mean of (mu - tgt_mu)' * tgt_prc * (mu - tgt_mu) / 2
+    over rows, the loss the policy networks are trained on.
+    Args:
+        mu: N x dU network outputs.
+        tgt_mu: N x dU targets.
+        tgt_prc: N x dU x dU weighted precisions.
+    """
+    diff = mu - tgt_mu
+    return 0.5 * np.mean(np.einsum('ni,nij,nj->n', diff, tgt_prc, diff))
+
+
+class EarlyStopping(object):
+    """
+    Stops training once the holdout loss stops improving. The loss is
+    evaluated every holdout_interval iterations, and training stops
+    after patience evaluations without a relative improvement of at
+    least min_improvement over the best loss, but not before
+    min_iterations iterations.
+    Args:
+        hyperparams: Policy optimization hyperparams, with holdout,
+            holdout_interval, patience, min_improvement and
+            min_iterations.
+    """
+    def __init__(self, hyperparams):
+        self.enabled = hyperparams['holdout'] > 0
+        self._interval = hyperparams['holdout_interval']
+        self._patience = hyperparams['patience']
+        self._min_improvement = hyperparams['min_improvement']
+        self._min_iterations = hyperparams['min_iterations']
+        self.best_loss = None
+        self._evals_since_best = 0
+
+    def should_evaluate(self, iterations):
+        """ Whether to evaluate the holdout loss after iterations. """
+        return self.enabled and iterations % self._interval == 0
+
+    def update(self, iterations, loss):
+        """
+        Record the holdout loss after iterations, and return whether to
+        stop training.
+        """
+        if (self.best_loss is None or
+                loss < self.best_loss - self._min_improvement *
+                abs(self.best_loss)):
+            self.best_loss = loss
+            self._evals_since_best = 0
+        else:
+            self._evals_since_best += 1
+        return (iterations >= self._min_iterations and
+                self._evals_since_best >= self._patience)
@@ -0,0 +1,86 @@
+""" This file defines a prefetching minibatch iterator for training. """
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import numpy as np
+
+
+class MinibatchIterator(object):
+    """
+    Endless iterator over shuffled minibatches of a training set. The
+    arrays are stored contiguously in dtype, reshuffled every epoch, and
+    each minibatch is gathered into new contiguous arrays. Each epoch
+    has floor(N / batch_size) minibatches; the remaining samples are
+    left out of that epoch.
+
+    With prefetch > 0, minibatches are gathered on a background thread,
+    up to prefetch minibatches ahead, so that gathering overlaps with
+    the training step. close() must then be called when done.
+    Args:
+        arrays: List of arrays with the same first dimension N.
+        batch_size: Minibatch size. Clamped to N.
+        prefetch: Number of minibatches to gather ahead.
+        dtype: Data type to store the arrays in.
+    """
+    def __init__(self, arrays, batch_size, prefetch=2, dtype=np.float32):
+        self.arrays = [np.ascontiguousarray(a, dtype=dtype) for a in arrays]
+        self.size = self.arrays[0].shape[0]
+        self.batch_size = min(batch_size, self.size)
+        self._batches_per_epoch = self.size // self.batch_size
+        # Seeded from the global random state, so that shuffling is
+        # reproducible but independent of the thread it runs on.
+        self._rng = np.random.RandomState(np.random.randint(2 ** 31 - 1))
+        self._order = None
+        self._batch = self._batches_per_epoch
+
+        self._queue = None
+        if prefetch > 0:
+            self._queue = queue.Queue(maxsize=prefetch)
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._prefetch_loop)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        """ Return the next minibatch, as a list of arrays. """
+        if self._queue is None:
+            return self._gather()
+        batch = self._queue.get()
+        if isinstance(batch, Exception):
+            raise batch
+        return batch
+
+    __next__ = next
+
+    def close(self):
+        """ Stop the prefetching thread. """
+        if self._queue is None or not self._thread.is_alive():
+            return
+        self._stop.set()
+        # Free a slot, so that a pending put returns and the thread exits.
+        self._queue.get()
+        self._thread.join()
+
+    def _gather(self):
+        if self._batch == self._batches_per_epoch:
+            self._order = self._rng.permutation(self.size)
+            self._batch = 0
+        start = self._batch * self.batch_size
+        idx = self._order[start:start+self.batch_size]
+        self._batch += 1
+        return [a.take(idx, axis=0) for a in self.arrays]
+
+    def _prefetch_loop(self):
+        while not self._stop.is_set():
+            try:
+                batch = self._gather()
+            except Exception as e:
+                self._queue.put(e)
+                return
+            self._queue.put(batch)
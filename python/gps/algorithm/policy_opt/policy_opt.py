@@ -10,8 +10,38 @@ class PolicyOpt(object):
         self._hyperparams = hyperparams
         self._dO = dO
         self._dU = dU
+        self.version = 0  # Incremented by every update of the policy.
+        self._prob_cache = {}
+        self._prob_cache_version = 0
 
     @abc.abstractmethod
     def update(self):
         """ Update policy. """
         raise NotImplementedError("Must be implemented in subclass.")
+
+    def prob_samples(self, samples):
+        """
+        Run policy forward on the observations of samples. The result is
+        reused for later calls with the same object, until the policy is
+        updated, so the returned arrays must not be modified, and
+        neither may samples.
+        Args:
+            samples: SampleList, or numpy array of observations that is
+                N x T x dO.
+        Returns:
+            The result of prob, i.e. the policy mean, covariance,
+            precision and covariance determinant.
+        """
+        if self._prob_cache_version != self.version:
+            self._prob_cache = {}
+            self._prob_cache_version = self.version
+        # The cache holds a reference to samples, so its id is not reused.
+        entry = self._prob_cache.get(id(samples))
+        if entry is not None and entry[0] is samples:
+            return entry[1]
+        if hasattr(samples, 'get_obs'):
+            result = self.prob(samples.get_obs())
+        else:
+            result = self.prob(samples)
+        self._prob_cache[id(samples)] = (samples, result)
+        return result
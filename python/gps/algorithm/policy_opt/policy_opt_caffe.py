@@ -12,6 +12,8 @@ from google.protobuf.text_format import MessageToString
 from gps.algorithm.policy.caffe_policy import CaffePolicy
 from gps.algorithm.policy_opt.policy_opt import PolicyOpt
 from gps.algorithm.policy_opt.config import POLICY_OPT_CAFFE
+from gps.algorithm.policy_opt.early_stopping import EarlyStopping, \
+        split_holdout, weighted_euclidean_loss
 
 
 LOGGER = logging.getLogger(__name__)
@@ -35,12 +37,24 @@ class PolicyOptCaffe(PolicyOpt):
 
         self.init_solver()
         self.caffe_iter = 0
+        self.update_iterations = 0  # Iterations taken by the last update.
         self.var = self._hyperparams['init_var'] * np.ones(dU)
 
         self.policy = CaffePolicy(self.solver.test_nets[0],
                                   self.solver.test_nets[1],
                                   np.zeros(dU))
 
+        # Net for batched forward passes in prob. Solvers loaded from a
+        # file may not have one, in which case the policy net is used.
+        self._prob_net_is_policy_net = len(self.solver.test_nets) < 3
+        self._prob_net = self.solver.test_nets[
+            0 if self._prob_net_is_policy_net else 2
+        ]
+        # Incremented whenever the weights of the solver net change, so
+        # they are only shared with the prob net when needed.
+        self._weights_version = 0
+        self._prob_net_version = -1
+
     def init_solver(self):
         """ Helper method to initialize the solver. """
         solver_param = SolverParameter()
@@ -80,9 +94,18 @@ class PolicyOptCaffe(PolicyOpt):
                 self._hyperparams['network_model'](**network_arch_params)
             )
 
+            # For running forward on batches in python.
+            network_arch_params['batch_size'] = \
+                    self._hyperparams['prob_batch_size']
+            network_arch_params['phase'] = TEST
+            solver_param.test_net_param.add().CopyFrom(
+                self._hyperparams['network_model'](**network_arch_params)
+            )
+
             # These are required by Caffe to be set, but not used.
             solver_param.test_iter.append(1)
             solver_param.test_iter.append(1)
+            solver_param.test_iter.append(1)
             solver_param.test_interval = 1000000
 
             f = tempfile.NamedTemporaryFile(mode='w+', delete=False)
@@ -105,6 +128,7 @@ class PolicyOptCaffe(PolicyOpt):
         Returns:
             A CaffePolicy object with updated weights.
         """
+        self.version += 1
         N, T = obs.shape[:2]
         dU, dO = self._dU, self._dO
 
@@ -140,13 +164,20 @@ class PolicyOptCaffe(PolicyOpt):
             self.policy.bias = -np.mean(obs.dot(self.policy.scale), axis=0)
         obs = obs.dot(self.policy.scale) + self.policy.bias
 
+        stopping = EarlyStopping(self._hyperparams)
+        if stopping.enabled:
+            (obs, tgt_mu, tgt_prc), holdout_data = split_holdout(
+                [obs, tgt_mu, tgt_prc], self._hyperparams['holdout']
+            )
+
         blob_names = self.solver.net.blobs.keys()
 
-        # Assuming that N*T >= self.batch_size.
-        batches_per_epoch = np.floor(N*T / self.batch_size)
-        idx = range(N*T)
+        # Assuming that the training set is at least self.batch_size.
+        batches_per_epoch = np.floor(obs.shape[0] / self.batch_size)
+        idx = range(obs.shape[0])
         average_loss = 0
         np.random.shuffle(idx)
+        iterations = 0
         for i in range(self._hyperparams['iterations']):
             # Load in data for this batch.
             start_idx = int(i * self.batch_size %
@@ -157,6 +188,7 @@ class PolicyOptCaffe(PolicyOpt):
             self.solver.net.blobs[blob_names[2]].data[:] = tgt_prc[idx_i]
 
             self.solver.step(1)
+            iterations = i + 1
 
             # To get the training loss:
             train_loss = self.solver.net.blobs[blob_names[-1]].data
@@ -166,13 +198,23 @@ class PolicyOptCaffe(PolicyOpt):
                              i, average_loss / 500)
                 average_loss = 0
 
-            # To run a test:
-            # if i % test_interval:
-            #     print 'Iteration', i, 'testing...'
-            #     solver.test_nets[0].forward()
+            if stopping.should_evaluate(iterations):
+                self._weights_version += 1
+                holdout_loss = weighted_euclidean_loss(
+                    self._forward(holdout_data[0]), holdout_data[1],
+                    holdout_data[2]
+                )
+                LOGGER.debug('Caffe iteration %d, holdout loss %f',
+                             iterations, holdout_loss)
+                if stopping.update(iterations, holdout_loss):
+                    break
 
         # Keep track of Caffe iterations for loading solver states.
-        self.caffe_iter += self._hyperparams['iterations']
+        self.caffe_iter += iterations
+        self.update_iterations = iterations
+        self._weights_version += 1
+        LOGGER.info('Policy update took %d of %d iterations.', iterations,
+                    self._hyperparams['iterations'])
 
         # Optimize variance.
         A = np.sum(tgt_prc_orig, 0) + 2 * N * T * \
@@ -183,6 +225,8 @@ class PolicyOptCaffe(PolicyOpt):
         self.var = 1 / np.diag(A)
 
         self.policy.net.share_with(self.solver.net)
+        if self._hyperparams['numpy_inference']:
+            self.policy.export_mlp()
         return self.policy
 
     def prob(self, obs):
@@ -193,29 +237,14 @@ class PolicyOptCaffe(PolicyOpt):
         """
         dU = self._dU
         N, T = obs.shape[:2]
+        obs = np.reshape(obs, (N*T, -1))
 
-        # Normalize obs.
-        try:
-            for n in range(N):
-                obs[n, :, :] = obs[n, :, :].dot(self.policy.scale) + \
-                        self.policy.bias
-        except AttributeError:
-            pass  #TODO: Should prob be called before update?
+        # Normalize obs. This makes a copy, so the input is left as is.
+        # TODO: Should prob be called before update?
+        if getattr(self.policy, 'scale', None) is not None:
+            obs = obs.dot(self.policy.scale) + self.policy.bias
 
-        output = np.zeros((N, T, dU))
-        blob_names = self.solver.test_nets[0].blobs.keys()
-
-        self.solver.test_nets[0].share_with(self.solver.net)
-
-        for i in range(N):
-            for t in range(T):
-                # Feed in data.
-                self.solver.test_nets[0].blobs[blob_names[0]].data[:] = \
-                        obs[i, t]
-
-                # Assume that the first output blob is what we want.
-                output[i, t, :] = \
-                        self.solver.test_nets[0].forward().values()[0][0]
+        output = np.reshape(self._forward(obs), (N, T, dU))
 
         pol_sigma = np.tile(np.diag(self.var), [N, T, 1, 1])
         pol_prec = np.tile(np.diag(1.0 / self.var), [N, T, 1, 1])
@@ -223,6 +252,42 @@ class PolicyOptCaffe(PolicyOpt):
 
         return output, pol_sigma, pol_prec, pol_det_sigma
 
+    def _forward(self, obs):
+        """
+        Run the network on normalized observations, in chunks of at
+        most prob_batch_size.
+        Args:
+            obs: Numpy array of normalized observations that is M x dO.
+        Returns:
+            Numpy array of network outputs that is M x dU.
+        """
+        net = self._prob_net
+        if self._prob_net_version != self._weights_version:
+            net.share_with(self.solver.net)
+            self._prob_net_version = self._weights_version
+        input_blob = net.blobs[net.blobs.keys()[0]]
+        net_batch_size = input_blob.data.shape[0]
+
+        # Run the network on all observations, in chunks, reshaping the
+        # net to the size of each chunk.
+        output = np.empty((obs.shape[0], self._dU))
+        batch_size = self._hyperparams['prob_batch_size']
+        for start in range(0, obs.shape[0], batch_size):
+            chunk = obs[start:start+batch_size]
+            if input_blob.data.shape[0] != chunk.shape[0]:
+                input_blob.reshape(*chunk.shape)
+                net.reshape()
+            input_blob.data[:] = chunk
+            # Assume that the first output blob is what we want.
+            output[start:start+chunk.shape[0]] = net.forward().values()[0]
+
+        # The policy net must keep its batch size for act.
+        if self._prob_net_is_policy_net and \
+                input_blob.data.shape[0] != net_batch_size:
+            input_blob.reshape(net_batch_size, obs.shape[1])
+            net.reshape()
+        return output
+
     def set_ent_reg(self, ent_reg):
         """ Set the entropy regularization. """
         self._hyperparams['ent_reg'] = ent_reg
@@ -245,6 +310,7 @@ class PolicyOptCaffe(PolicyOpt):
         self.policy.scale = state['scale']
         self.policy.bias = state['bias']
         self.caffe_iter = state['caffe_iter']
+        self._weights_version += 1
         self.solver.restore(
             self._hyperparams['weights_file_prefix'] + '_iter_' +
             str(self.caffe_iter) + '.solverstate'
@@ -253,3 +319,5 @@ class PolicyOptCaffe(PolicyOpt):
             self._hyperparams['weights_file_prefix'] + '_iter_' +
             str(self.caffe_iter) + '.caffemodel'
         )
+        if self._hyperparams['numpy_inference']:
+            self.policy.export_mlp()
@@ -9,6 +9,9 @@ import tensorflow as tf
 from gps.algorithm.policy.tf_policy import TfPolicy
 from gps.algorithm.policy_opt.policy_opt import PolicyOpt
 from gps.algorithm.policy_opt.config import POLICY_OPT_TF
+from gps.algorithm.policy_opt.early_stopping import EarlyStopping, \
+        split_holdout, weighted_euclidean_loss
+from gps.algorithm.policy_opt.minibatch import MinibatchIterator
 from gps.algorithm.policy_opt.tf_utils import TfSolver
 
 LOGGER = logging.getLogger(__name__)
@@ -23,6 +26,7 @@ class PolicyOptTf(PolicyOpt):
         PolicyOpt.__init__(self, config, dO, dU)
 
         self.tf_iter = 0
+        self.update_iterations = 0  # Iterations taken by the last update.
         self.checkpoint_file = self._hyperparams['checkpoint_prefix']
         self.batch_size = self._hyperparams['batch_size']
         self.device_string = "/cpu:0"
@@ -76,6 +80,7 @@ class PolicyOptTf(PolicyOpt):
         Returns:
             A tensorflow object with updated weights.
         """
+        self.version += 1
         N, T = obs.shape[:2]
         dU, dO = self._dU, self._dO
 
@@ -111,31 +116,52 @@ class PolicyOptTf(PolicyOpt):
             self.policy.bias = -np.mean(obs.dot(self.policy.scale), axis=0)
         obs = obs.dot(self.policy.scale) + self.policy.bias
 
-        # Assuming that N*T >= self.batch_size.
-        batches_per_epoch = np.floor(N*T / self.batch_size)
-        idx = range(N*T)
+        train_data = [obs, tgt_mu, tgt_prc]
+        stopping = EarlyStopping(self._hyperparams)
+        if stopping.enabled:
+            train_data, holdout_data = \
+                    split_holdout(train_data, self._hyperparams['holdout'])
+
+        # Minibatches are reshuffled every epoch and gathered ahead of
+        # time on a background thread.
+        batches = MinibatchIterator(train_data, self.batch_size,
+                                    prefetch=self._hyperparams['prefetch'])
         average_loss = 0
-        np.random.shuffle(idx)
 
         # actual training.
-        for i in range(self._hyperparams['iterations']):
-            # Load in data for this batch.
-            start_idx = int(i * self.batch_size %
-                            (batches_per_epoch * self.batch_size))
-            idx_i = idx[start_idx:start_idx+self.batch_size]
-            feed_dict = {self.obs_tensor: obs[idx_i],
-                         self.action_tensor: tgt_mu[idx_i],
-                         self.precision_tensor: tgt_prc[idx_i]}
-            train_loss = self.solver(feed_dict, self.sess)
-
-            average_loss += train_loss
-            if i % 500 == 0 and i != 0:
-                LOGGER.debug('tensorflow iteration %d, average loss %f',
-                             i, average_loss / 500)
-                average_loss = 0
+        iterations = 0
+        try:
+            for i in range(self._hyperparams['iterations']):
+                obs_i, tgt_mu_i, tgt_prc_i = next(batches)
+                feed_dict = {self.obs_tensor: obs_i,
+                             self.action_tensor: tgt_mu_i,
+                             self.precision_tensor: tgt_prc_i}
+                train_loss = self.solver(feed_dict, self.sess)
+                iterations = i + 1
+
+                average_loss += train_loss
+                if i % 500 == 0 and i != 0:
+                    LOGGER.debug('tensorflow iteration %d, average loss %f',
+                                 i, average_loss / 500)
+                    average_loss = 0
+
+                if stopping.should_evaluate(iterations):
+                    holdout_loss = weighted_euclidean_loss(
+                        self._forward(holdout_data[0]), holdout_data[1],
+                        holdout_data[2]
+                    )
+                    LOGGER.debug('tensorflow iteration %d, holdout loss %f',
+                                 iterations, holdout_loss)
+                    if stopping.update(iterations, holdout_loss):
+                        break
+        finally:
+            batches.close()
 
         # Keep track of tensorflow iterations for loading solver states.
-        self.tf_iter += self._hyperparams['iterations']
+        self.tf_iter += iterations
+        self.update_iterations = iterations
+        LOGGER.info('Policy update took %d of %d iterations.', iterations,
+                    self._hyperparams['iterations'])
 
         # Optimize variance.
         A = np.sum(tgt_prc_orig, 0) + 2 * N * T * \
@@ -145,6 +171,8 @@ class PolicyOptTf(PolicyOpt):
         # TODO - Use dense covariance?
         self.var = 1 / np.diag(A)
 
+        if self._hyperparams['numpy_inference']:
+            self.policy.export_mlp()
         return self.policy
 
     def prob(self, obs):
@@ -155,23 +183,13 @@ class PolicyOptTf(PolicyOpt):
         """
         dU = self._dU
         N, T = obs.shape[:2]
+        obs = np.reshape(obs, (N*T, -1))
 
-        # Normalize obs.
-        try:
-            for n in range(N):
-                if self.policy.scale is not None and self.policy.bias is not None:
-                    obs[n, :, :] = obs[n, :, :].dot(self.policy.scale) + self.policy.bias
-        except AttributeError:
-            pass  # TODO: Should prob be called before update?
+        # Normalize obs. This makes a copy, so the input is left as is.
+        if self.policy.scale is not None and self.policy.bias is not None:
+            obs = obs.dot(self.policy.scale) + self.policy.bias
 
-        output = np.zeros((N, T, dU))
-
-        for i in range(N):
-            for t in range(T):
-                # Feed in data.
-                feed_dict = {self.obs_tensor: np.expand_dims(obs[i, t], axis=0)}
-                with tf.device(self.device_string):
-                    output[i, t, :] = self.sess.run(self.act_op, feed_dict=feed_dict)
+        output = np.reshape(self._forward(obs), (N, T, dU))
 
         pol_sigma = np.tile(np.diag(self.var), [N, T, 1, 1])
         pol_prec = np.tile(np.diag(1.0 / self.var), [N, T, 1, 1])
@@ -179,6 +197,24 @@ class PolicyOptTf(PolicyOpt):
 
         return output, pol_sigma, pol_prec, pol_det_sigma
 
+    def _forward(self, obs):
+        """
+        Run the network on normalized observations, in chunks of at
+        most prob_batch_size.
+        Args:
+            obs: Numpy array of normalized observations that is M x dO.
+        Returns:
+            Numpy array of network outputs that is M x dU.
+        """
+        output = np.empty((obs.shape[0], self._dU))
+        batch_size = self._hyperparams['prob_batch_size']
+        with tf.device(self.device_string):
+            for start in range(0, obs.shape[0], batch_size):
+                feed_dict = {self.obs_tensor: obs[start:start+batch_size]}
+                output[start:start+batch_size] = \
+                        self.sess.run(self.act_op, feed_dict=feed_dict)
+        return output
+
     def set_ent_reg(self, ent_reg):
         """ Set the entropy regularization. """
         self._hyperparams['ent_reg'] = ent_reg
@@ -225,3 +261,5 @@ class PolicyOptTf(PolicyOpt):
         saver = tf.train.Saver()
         check_file = self.checkpoint_file
         saver.restore(self.sess, check_file)
+        if self._hyperparams['numpy_inference']:
+            self.policy.export_mlp()
@@ -8,8 +8,8 @@ import scipy as sp
 
 from gps.algorithm.traj_opt.config import TRAJ_OPT_LQR
 from gps.algorithm.traj_opt.traj_opt import TrajOpt
-from gps.algorithm.traj_opt.traj_opt_utils import LineSearch, traj_distr_kl, \
-        DGD_MAX_ITER, THRESHA, THRESHB
+from gps.algorithm.traj_opt.traj_opt_utils import LineSearch, laplace_cost, \
+        traj_distr_kl, DGD_MAX_ITER, THRESHA, THRESHB
 
 
 LOGGER = logging.getLogger(__name__)
@@ -94,22 +94,13 @@ class TrajOptLQRPython(TrajOpt):
 
     def estimate_cost(self, traj_distr, traj_info):
         """ Compute Laplace approximation to expected cost. """
-        # Constants.
-        T = traj_distr.T
-
         # Perform forward pass (note that we repeat this here, because
         # traj_info may have different dynamics from the ones that were
         # used to compute the distribution already saved in traj).
         mu, sigma = self.forward(traj_distr, traj_info)
 
         # Compute cost.
-        predicted_cost = np.zeros(T)
-        for t in range(T):
-            predicted_cost[t] = traj_info.cc[t] + 0.5 * \
-                    np.sum(sigma[t, :, :] * traj_info.Cm[t, :, :]) + 0.5 * \
-                    mu[t, :].T.dot(traj_info.Cm[t, :, :]).dot(mu[t, :]) + \
-                    mu[t, :].T.dot(traj_info.cv[t, :])
-        return predicted_cost
+        return laplace_cost(mu, sigma, traj_info)
 
     def forward(self, traj_distr, traj_info):
         """
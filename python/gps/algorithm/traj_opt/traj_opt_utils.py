@@ -14,6 +14,22 @@ THRESHA = 1e-4  # First convergence threshold.
 THRESHB = 1e-3  # Second convergence threshold.
 
 
+def laplace_cost(mu, sigma, traj_info):
+    """
+    Compute the expected cost at each time step under the quadratic
+    cost approximation in traj_info.
+    Args:
+        mu: T x dX+dU, mean of the state-action marginals.
+        sigma: T x dX+dU x dX+dU, covariance of the marginals.
+        traj_info: A TrajectoryInfo object.
+    Returns:
+        A T vector of expected costs.
+    """
+    return traj_info.cc + 0.5 * np.sum(sigma * traj_info.Cm, axis=(1, 2)) + \
+            0.5 * np.einsum('ti,tij,tj->t', mu, traj_info.Cm, mu) + \
+            np.einsum('ti,ti->t', mu, traj_info.cv)
+
+
 def traj_distr_kl(new_mu, new_sigma, new_traj_distr, prev_traj_distr):
     """
     Compute KL divergence between new and previous trajectory
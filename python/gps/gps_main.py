@@ -13,13 +13,18 @@ import argparse
 import threading
 import time
 
+import numpy as np
+
 # Add gps/python to path so that imports work.
 sys.path.append('/'.join(str.split(__file__, '/')[:-2]))
+from gps.agent.parallel_sampler import ParallelSampler
+from gps.algorithm.policy.numpy_mlp_policy import NumpyMLPPolicy
 from gps.gui.gps_training_gui import GPSTrainingGUI
 from gps.utility.data_logger import DataLogger
 from gps.sample.sample_list import SampleList
 
 logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.INFO)
+LOGGER = logging.getLogger(__name__)
 
 
 class GPSMain(object):
@@ -30,12 +35,28 @@ class GPSMain(object):
         self._data_files_dir = config['common']['data_files_dir']
 
         self.agent = config['agent']['type'](config['agent'])
-        self.data_logger = DataLogger()
+        self.data_logger = DataLogger(**config.get('data_logger', {}))
         self.gui = GPSTrainingGUI(config['common']) if config['gui_on'] else None
 
         config['algorithm']['agent'] = self.agent
         self.algorithm = config['algorithm']['type'](config['algorithm'])
 
+        # With pipelining, the policy samples of an iteration are taken
+        # in a worker process with its own agent while the next iteration
+        # samples.
+        self._pipeline = config.get('pipeline_policy_samples', False)
+        self._eval_sampler = None
+        if self._pipeline:
+            self._check_pipeline()
+            # The policy samples draw their seeds from their own random
+            # state, so that they do not change the samples of the next
+            # iteration.
+            seed = self.agent._hyperparams['noise_seed']
+            if seed is None:
+                seed = np.random.randint(2 ** 31)
+            self._eval_rng = np.random.RandomState(seed)
+        self._pending_log = None
+
     def run(self, itr_load=None):
         """
         Run training by iteratively sampling and taking an iteration.
@@ -47,18 +68,39 @@ class GPSMain(object):
         itr_start = self._initialize(itr_load)
 
         for itr in range(itr_start, self._hyperparams['iterations']):
-            for cond in range(self._conditions):
-                for i in range(self._hyperparams['num_samples']):
-                    self._take_sample(itr, cond, i)
+            noise = None
+            if self.agent.noise_bank is not None:
+                noise = [
+                    self.agent.noise_bank.noise(
+                        itr, cond, self._hyperparams['num_samples'])
+                    for cond in range(self._conditions)
+                ]
+            if self.gui and not self.agent.batch_sampling:
+                for cond in range(self._conditions):
+                    for i in range(self._hyperparams['num_samples']):
+                        self._take_sample(
+                            itr, cond, i,
+                            None if noise is None else noise[cond][i]
+                        )
+            else:
+                # The agent may collect samples for all conditions at
+                # once (possibly in parallel).
+                self._take_samples(itr, noise)
 
             traj_sample_lists = [
                 self.agent.get_samples(cond, -self._hyperparams['num_samples'])
                 for cond in range(self._conditions)
             ]
+            # The policy must not change while it is being sampled.
+            self._finish_policy_samples()
             self._take_iteration(itr, traj_sample_lists)
-            pol_sample_lists = self._take_policy_samples()
-            self._log_data(itr, traj_sample_lists, pol_sample_lists)
+            if self._pipeline:
+                self._start_policy_samples(itr, traj_sample_lists)
+            else:
+                pol_sample_lists = self._take_policy_samples()
+                self._log_data(itr, traj_sample_lists, pol_sample_lists)
 
+        self._finish_policy_samples()
         self._end()
 
     def test_policy(self, itr, N):
@@ -124,13 +166,14 @@ class GPSMain(object):
                     'Press \'go\' to begin.') % itr_load)
             return itr_load + 1
 
-    def _take_sample(self, itr, cond, i):
+    def _take_sample(self, itr, cond, i, noise=None):
         """
         Collect a sample from the agent.
         Args:
             itr: Iteration number.
             cond: Condition number.
             i: Sample number.
+            noise: T x dU action noise. Generated by the agent if None.
         Returns: None
         """
         pol = self.algorithm.cur[cond].traj_distr
@@ -138,27 +181,15 @@ class GPSMain(object):
             self.gui.set_image_overlays(cond)   # Must call for each new cond.
             redo = True
             while redo:
-                while self.gui.mode in ('wait', 'request', 'process'):
-                    if self.gui.mode in ('wait', 'process'):
-                        time.sleep(0.01)
-                        continue
-                    # 'request' mode.
-                    if self.gui.request == 'reset':
-                        try:
-                            self.agent.reset(cond)
-                        except NotImplementedError:
-                            self.gui.err_msg = 'Agent reset unimplemented.'
-                    elif self.gui.request == 'fail':
-                        self.gui.err_msg = 'Cannot fail before sampling.'
-                    self.gui.process_mode()  # Complete request.
-
+                self._wait_for_gui(cond)
                 self.gui.set_status_text(
                     'Sampling: iteration %d, condition %d, sample %d.' %
                     (itr, cond, i)
                 )
                 self.agent.sample(
                     pol, cond,
-                    verbose=(i < self._hyperparams['verbose_trials'])
+                    verbose=(i < self._hyperparams['verbose_trials']),
+                    noise=noise
                 )
 
                 if self.gui.mode == 'request' and self.gui.request == 'fail':
@@ -170,8 +201,57 @@ class GPSMain(object):
         else:
             self.agent.sample(
                 pol, cond,
-                verbose=(i < self._hyperparams['verbose_trials'])
+                verbose=(i < self._hyperparams['verbose_trials']),
+                noise=noise
+            )
+
+    def _take_samples(self, itr, noise=None):
+        """
+        Collect num_samples samples of every condition from the agent
+        with sample_conditions. Which samples are plotted is up to the
+        agent (none, for parallel MuJoCo sampling), and with the GUI on
+        individual samples cannot be failed and redone.
+        Args:
+            itr: Iteration number.
+            noise: A list with the N x T x dU action noise of each
+                condition. Generated by the agent if None.
+        Returns: None
+        """
+        if self.gui:
+            self._wait_for_gui(0)
+            self.gui.set_status_text(
+                'Sampling: iteration %d, %d samples of each condition.' %
+                (itr, self._hyperparams['num_samples'])
             )
+        self.agent.sample_conditions(
+            [self.algorithm.cur[cond].traj_distr
+             for cond in range(self._conditions)],
+            self._hyperparams['num_samples'],
+            verbose_trials=self._hyperparams['verbose_trials'],
+            noise=noise
+        )
+
+    def _wait_for_gui(self, cond):
+        """
+        Wait until the GUI is ready for sampling, and complete its
+        requests in the meantime.
+        Args:
+            cond: Condition to reset to on a reset request.
+        Returns: None
+        """
+        while self.gui.mode in ('wait', 'request', 'process'):
+            if self.gui.mode in ('wait', 'process'):
+                time.sleep(0.01)
+                continue
+            # 'request' mode.
+            if self.gui.request == 'reset':
+                try:
+                    self.agent.reset(cond)
+                except NotImplementedError:
+                    self.gui.err_msg = 'Agent reset unimplemented.'
+            elif self.gui.request == 'fail':
+                self.gui.err_msg = 'Cannot fail before sampling.'
+            self.gui.process_mode()  # Complete request.
 
     def _take_iteration(self, itr, sample_lists):
         """
@@ -200,14 +280,84 @@ class GPSMain(object):
             N = self._hyperparams['verbose_policy_trials']
         if self.gui:
             self.gui.set_status_text('Taking policy samples.')
-        pol_samples = [[None for _ in range(N)] for _ in range(self._conditions)]
-        for cond in range(self._conditions):
-            for i in range(N):
-                pol_samples[cond][i] = self.agent.sample(
-                    self.algorithm.policy_opt.policy, cond,
-                    verbose=True, save=False)
+        pol_samples = [
+            self.agent.sample_batch(self.algorithm.policy_opt.policy, cond, N,
+                                    verbose=True, save=False)
+            for cond in range(self._conditions)
+        ]
         return [SampleList(samples) for samples in pol_samples]
 
+    def _check_pipeline(self):
+        """
+        Raise a ValueError if policy samples cannot be taken in a worker
+        process. The agent must be duplicable, and the policy must be
+        exported to NumPy.
+        Returns: None
+        """
+        if not self.agent.duplicable:
+            raise ValueError('pipeline_policy_samples requires an agent that '
+                             'can be duplicated in a worker process, which '
+                             '%s cannot.' % type(self.agent).__name__)
+        if 'verbose_policy_trials' not in self._hyperparams:
+            return
+        policy_opt = getattr(self.algorithm, 'policy_opt', None)
+        if (policy_opt is None or
+                not hasattr(policy_opt.policy, 'export_mlp') or
+                not policy_opt._hyperparams.get('numpy_inference', False)):
+            raise ValueError('pipeline_policy_samples requires a neural '
+                             'network policy with numpy_inference enabled.')
+
+    def _start_policy_samples(self, itr, traj_sample_lists):
+        """
+        Start taking the policy samples of an iteration in a worker
+        process, which samples a NumPy copy of the policy on its own copy
+        of the agent. Policies whose network could not be exported are
+        sampled here instead. The iteration is logged by
+        _finish_policy_samples.
+        Args:
+            itr: Iteration number.
+            traj_sample_lists: trajectory samples as SampleList object
+        Returns: None
+        """
+        if 'verbose_policy_trials' not in self._hyperparams:
+            self._pending_log = (itr, traj_sample_lists, None, False)
+            return
+        policy = self.algorithm.policy_opt.policy
+        if policy.mlp is None:
+            LOGGER.warning('Policy network is not exported to NumPy, taking '
+                           'policy samples without pipelining.')
+            self._pending_log = (itr, traj_sample_lists,
+                                 self._take_policy_samples(), False)
+            return
+        N = self._hyperparams['verbose_policy_trials']
+        if self._eval_sampler is None:
+            self._eval_sampler = ParallelSampler(self.agent, 1,
+                                                 self._conditions * N)
+        eval_policy = NumpyMLPPolicy(policy.mlp, policy.chol_pol_covar)
+        tasks = [(cond, None, self._eval_rng.randint(2 ** 31))
+                 for cond in range(self._conditions) for _ in range(N)]
+        self._eval_sampler.start(
+            {cond: eval_policy for cond in range(self._conditions)}, tasks
+        )
+        self._pending_log = (itr, traj_sample_lists, None, True)
+
+    def _finish_policy_samples(self):
+        """
+        Wait for the policy samples started by _start_policy_samples, if
+        any, and log their iteration.
+        Returns: None
+        """
+        if self._pending_log is None:
+            return
+        itr, traj_sample_lists, pol_sample_lists, started = self._pending_log
+        self._pending_log = None
+        if started:
+            N = self._hyperparams['verbose_policy_trials']
+            samples = self._eval_sampler.finish()
+            pol_sample_lists = [SampleList(samples[cond*N:(cond+1)*N])
+                                for cond in range(self._conditions)]
+        self._log_data(itr, traj_sample_lists, pol_sample_lists)
+
     def _log_data(self, itr, traj_sample_lists, pol_sample_lists=None):
         """
         Log data and algorithm, and update the GUI.
@@ -240,6 +390,9 @@ class GPSMain(object):
 
     def _end(self):
         """ Finish running and exit. """
+        self.agent.close()
+        if self._eval_sampler is not None:
+            self._eval_sampler.close()
         if self.gui:
             self.gui.set_status_text('Training complete.')
             self.gui.end_mode()
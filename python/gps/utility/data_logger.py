@@ -1,13 +1,37 @@
 """ This file defines the data logger. """
+import bz2
 import logging
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import struct
+import zlib
 try:
    import cPickle as pickle
 except:
    import pickle
+try:
+    import lzma
+except ImportError:
+    lzma = None
 
 
 LOGGER = logging.getLogger(__name__)
 
+# Compressed files start with this string, followed by the codec name
+# and the number of compressed chunks. Files without it are read back
+# as plain pickles.
+MAGIC = b'GPSLOG01'
+
+CODECS = {
+    'zlib': (lambda data, level: zlib.compress(data, level), zlib.decompress),
+    'bz2': (lambda data, level: bz2.compress(data, level), bz2.decompress),
+}
+if lzma is not None:
+    CODECS['lzma'] = (lambda data, level: lzma.compress(data, preset=level),
+                      lzma.decompress)
+
+DEFAULT_LEVELS = {'zlib': 6, 'bz2': 9, 'lzma': 6}
+
 
 class DataLogger(object):
     """
@@ -16,18 +40,167 @@ class DataLogger(object):
         DEBUG, INFO, WARN, ERROR, FATAL levels.
     TODO: Handle logging data to terminal, GUI text/plots, and/or data
           files.
+    Args:
+        codec: Compression codec, one of 'zlib', 'bz2', 'lzma', or None
+            to write uncompressed pickles.
+        compresslevel: Codec compression level. Defaults to a codec
+            specific value.
+        chunk_size: Size in bytes of the chunks that the pickled data is
+            split into. Chunks are compressed independently.
+        num_threads: Number of threads used to (de)compress chunks.
+            Defaults to the number of CPUs.
     """
-    def __init__(self):
-        pass
+    def __init__(self, codec=None, compresslevel=None, chunk_size=1 << 22,
+                 num_threads=None):
+        if codec is not None and codec not in CODECS:
+            raise ValueError('Unknown or unavailable codec: %s' % codec)
+        self._codec = codec
+        self._compresslevel = compresslevel
+        if compresslevel is None and codec is not None:
+            self._compresslevel = DEFAULT_LEVELS[codec]
+        self._chunk_size = chunk_size
+        self._num_threads = num_threads or multiprocessing.cpu_count()
 
     def pickle(self, filename, data):
         """ Pickle data into file specified by filename. """
-        pickle.dump(data, open(filename, 'wb'))
+        with open(filename, 'wb') as f:
+            if self._codec is None:
+                pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+                return
+            codec = self._codec.encode('ascii')
+            f.write(MAGIC)
+            f.write(struct.pack('<B', len(codec)))
+            f.write(codec)
+            # The chunk count is filled in once all chunks are written.
+            count_pos = f.tell()
+            f.write(struct.pack('<I', 0))
+            writer = _ChunkWriter(f, self._chunk_size, self._compress,
+                                  self._num_threads)
+            try:
+                pickle.dump(data, writer, pickle.HIGHEST_PROTOCOL)
+                num_chunks = writer.flush()
+            finally:
+                writer.close()
+            f.seek(count_pos)
+            f.write(struct.pack('<I', num_chunks))
 
     def unpickle(self, filename):
-        """ Unpickle data from file specified by filename. """
+        """
+        Unpickle data from file specified by filename. Returns None if
+        the file cannot be opened, and raises a ValueError naming the
+        file if it is truncated or corrupt.
+        """
         try:
-            return pickle.load(open(filename, 'rb'))
+            f = open(filename, 'rb')
         except IOError:
             LOGGER.debug('Unpickle error. Cannot find file: %s', filename)
             return None
+        with f:
+            if f.read(len(MAGIC)) != MAGIC:
+                f.seek(0)
+                return pickle.load(f)
+            codec_len = struct.unpack('<B', _read(f, 1, filename))[0]
+            codec = _read(f, codec_len, filename).decode('ascii')
+            if codec not in CODECS:
+                raise ValueError('File %s uses unavailable codec %s' %
+                                 (filename, codec))
+            num_chunks = struct.unpack('<I', _read(f, 4, filename))[0]
+            chunks = []
+            for _ in range(num_chunks):
+                chunk_len = struct.unpack('<Q', _read(f, 8, filename))[0]
+                chunks.append(_read(f, chunk_len, filename))
+        decompress = CODECS[codec][1]
+
+        def decompress_chunk(chunk):
+            try:
+                return decompress(chunk)
+            except Exception as e:
+                raise ValueError('File %s is corrupt: %s' % (filename, e))
+        chunks = self._map(decompress_chunk, chunks)
+        return pickle.loads(b''.join(chunks))
+
+    def _compress(self, chunk):
+        return CODECS[self._codec][0](chunk, self._compresslevel)
+
+    def _map(self, func, chunks):
+        """ Apply func to each chunk, in order, on a pool of threads. """
+        if len(chunks) <= 1 or self._num_threads <= 1:
+            return [func(chunk) for chunk in chunks]
+        pool = ThreadPool(min(self._num_threads, len(chunks)))
+        try:
+            return pool.map(func, chunks)
+        finally:
+            pool.close()
+            pool.join()
+
+
+def _read(f, size, filename):
+    """ Read exactly size bytes from f, which was opened from filename. """
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError('File %s is truncated' % filename)
+    return data
+
+
+class _ChunkWriter(object):
+    """
+    File-like object that splits everything written to it into chunks
+    of chunk_size bytes, compresses them on num_threads threads, and
+    writes each compressed chunk to f, prefixed by its length. At most
+    a few chunks are held in memory at a time.
+    """
+    def __init__(self, f, chunk_size, compress, num_threads):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._compress = compress
+        self._buffer = bytearray()
+        self._pending = []
+        self._max_pending = 2 * num_threads
+        self._pool = ThreadPool(num_threads) if num_threads > 1 else None
+        self.num_chunks = 0
+
+    def write(self, data):
+        """ Append data, compressing every chunk that is filled. """
+        data = memoryview(data)
+        if data.itemsize != 1 or data.ndim != 1:
+            # Array buffers, as written by pickle protocol 5. Slice by
+            # bytes rather than items.
+            data = data.cast('B')
+        while len(data) > 0:
+            size = min(self._chunk_size - len(self._buffer), len(data))
+            self._buffer.extend(data[:size])
+            data = data[size:]
+            if len(self._buffer) == self._chunk_size:
+                self._submit()
+
+    def flush(self):
+        """ Write out all remaining data, and return the chunk count. """
+        if len(self._buffer) > 0:
+            self._submit()
+        while self._pending:
+            self._write_oldest()
+        return self.num_chunks
+
+    def close(self):
+        """ Stop the compression threads. """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+
+    def _submit(self):
+        chunk, self._buffer = bytes(self._buffer), bytearray()
+        if self._pool is None:
+            self._pending.append(self._compress(chunk))
+        else:
+            self._pending.append(self._pool.apply_async(self._compress,
+                                                        (chunk,)))
+        if len(self._pending) > self._max_pending:
+            self._write_oldest()
+
+    def _write_oldest(self):
+        chunk = self._pending.pop(0)
+        if self._pool is not None:
+            chunk = chunk.get()
+        self._f.write(struct.pack('<Q', len(chunk)))
+        self._f.write(chunk)
+        self.num_chunks += 1
@@ -27,7 +27,8 @@ class GMM(object):
         """
         Evaluate dynamics prior.
         Args:
-            pts: A N x D array of points.
+            pts: A N x D array of points, or a T x N x D array to
+                evaluate the prior for T sets of points at once.
         """
         # Compute posterior cluster weights.
         logwts = self.clusterwts(pts)
@@ -37,7 +38,7 @@ class GMM(object):
 
         # Set hyperparameters.
         m = self.N
-        n0 = m - 2 - mu0.shape[0]
+        n0 = m - 2 - mu0.shape[-1]
 
         # Normalize.
         m = float(m) / self.N
@@ -90,44 +91,47 @@ class GMM(object):
         """
         Compute the moments of the cluster mixture with logwts.
         Args:
-            logwts: A K x 1 array of log cluster probabilities.
+            logwts: A K x 1 array of log cluster probabilities, or a
+                T x K x 1 array.
         Returns:
-            mu: A (D,) mean vector.
-            sigma: A D x D covariance matrix.
+            mu: A (D,) mean vector, or T x D.
+            sigma: A D x D covariance matrix, or T x D x D.
         """
         # Exponentiate.
         wts = np.exp(logwts)
 
         # Compute overall mean.
-        mu = np.sum(self.mu * wts, axis=0)
+        mu = np.sum(self.mu * wts, axis=-2)
 
         # Compute overall covariance.
         # For some reason this version works way better than the "right"
         # one... could we be computing xxt wrong?
-        diff = self.mu - np.expand_dims(mu, axis=0)
-        diff_expand = np.expand_dims(diff, axis=1) * \
-                np.expand_dims(diff, axis=2)
-        wts_expand = np.expand_dims(wts, axis=2)
-        sigma = np.sum((self.sigma + diff_expand) * wts_expand, axis=0)
+        diff = self.mu - np.expand_dims(mu, axis=-2)
+        diff_expand = np.expand_dims(diff, axis=-2) * \
+                np.expand_dims(diff, axis=-1)
+        wts_expand = np.expand_dims(wts, axis=-1)
+        sigma = np.sum((self.sigma + diff_expand) * wts_expand, axis=-3)
         return mu, sigma
 
     def clusterwts(self, data):
         """
         Compute cluster weights for specified points under GMM.
         Args:
-            data: An N x D array of points
+            data: An N x D array of points, or a T x N x D array.
         Returns:
-            A K x 1 array of average cluster log probabilities.
+            A K x 1 array of average cluster log probabilities, or a
+            T x K x 1 array.
         """
         # Compute probability of each point under each cluster.
-        logobs = self.estep(data)
+        logobs = self.estep(np.reshape(data, (-1, data.shape[-1])))
+        logobs = np.reshape(logobs, data.shape[:-1] + (-1,))
 
         # Renormalize to get cluster weights.
-        logwts = logobs - logsum(logobs, axis=1)
+        logwts = logobs - logsum(logobs, axis=-1)
 
         # Average the cluster probabilities.
-        logwts = logsum(logwts, axis=0) - np.log(data.shape[0])
-        return logwts.T
+        logwts = logsum(logwts, axis=-2) - np.log(data.shape[-2])
+        return np.swapaxes(logwts, -1, -2)
 
     def update(self, data, K, max_iterations=100):
         """
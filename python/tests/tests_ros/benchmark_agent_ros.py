@@ -0,0 +1,136 @@
+"""
+Benchmark of AgentROS sampling against an in-process fake robot.
+
+Runs linear Gaussian trials through AgentROS, with every command
+answered by a FakeRobot over a LoopbackBus, and reports the number of
+trials per second and the latency of each phase of a sample:
+    reset: Position commands to both arms.
+    trial: Trial command until its SampleResult comes back, including
+        the rollout on the fake robot.
+    decode: Conversion of the SampleResult into a Sample.
+    other: Everything else, e.g. building the trial command.
+Needs rospy and the gps_agent_pkg messages, but no ROS master.
+"""
+import argparse
+import os
+import os.path
+import sys
+import time
+
+import numpy as np
+
+# Add gps/python to path so that imports work.
+gps_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..', ''))
+sys.path.append(gps_path)
+
+import gps.agent.ros.agent_ros as agent_ros
+from gps.agent.ros.agent_ros import AgentROS
+from gps.agent.ros.fake_robot import FakeRobot
+from gps.agent.ros.loopback import LoopbackBus
+from gps.algorithm.policy.lin_gauss_policy import LinearGaussianPolicy
+from gps.proto.gps_pb2 import ACTION, AUXILIARY_ARM, JOINT_ANGLES, \
+        JOINT_SPACE, JOINT_VELOCITIES, TRIAL_ARM
+
+
+def timed(func, times):
+    """ Wrap func to append the duration of each call to times. """
+    def wrapper(*args, **kwargs):
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            times.append(time.time() - start)
+    return wrapper
+
+
+def make_agent(bus, T, dq, binary):
+    """ Create an AgentROS and a FakeRobot with dq joints on bus. """
+    reset_condition = {
+        TRIAL_ARM: {'mode': JOINT_SPACE, 'data': np.zeros(dq)},
+        AUXILIARY_ARM: {'mode': JOINT_SPACE, 'data': np.zeros(dq)},
+    }
+    hyperparams = {
+        'conditions': 1,
+        'T': T,
+        'dt': 0.05,
+        'x0': np.zeros(2 * dq),
+        'ee_points_tgt': np.zeros(3),
+        'end_effector_points': np.zeros((1, 3)),
+        'reset_conditions': reset_condition,
+        'sensor_dims': {JOINT_ANGLES: dq, JOINT_VELOCITIES: dq, ACTION: dq},
+        'state_include': [JOINT_ANGLES, JOINT_VELOCITIES],
+        'obs_include': [],
+        'binary_transport': binary,
+    }
+    agent = AgentROS(hyperparams, bus=bus)
+
+    # Double integrator for each joint.
+    dt = hyperparams['dt']
+    A = np.eye(2 * dq)
+    A[:dq, dq:] = dt * np.eye(dq)
+    B = np.vstack([0.5 * dt ** 2 * np.eye(dq), dt * np.eye(dq)])
+    robot = FakeRobot(bus, agent._hyperparams, A, B)
+    return agent, robot
+
+
+def make_policy(T, dU, dX):
+    """ Create a random stabilizing linear Gaussian policy. """
+    K = np.tile(-np.hstack([np.eye(dU), np.eye(dU)]), (T, 1, 1))
+    K += 0.01 * np.random.randn(T, dU, dX)
+    k = 0.1 * np.random.randn(T, dU)
+    covar = np.tile(0.01 * np.eye(dU), (T, 1, 1))
+    chol = np.tile(0.1 * np.eye(dU), (T, 1, 1))
+    inv = np.tile(100.0 * np.eye(dU), (T, 1, 1))
+    return LinearGaussianPolicy(K, k, covar, chol, inv)
+
+
+def run(trials, T, dq, binary):
+    """ Run the benchmark and print the results. """
+    bus = LoopbackBus()
+    agent, _ = make_agent(bus, T, dq, binary)
+    policy = make_policy(T, agent.dU, agent.dX)
+
+    phases = {'reset': [], 'trial': [], 'decode': []}
+    agent.reset = timed(agent.reset, phases['reset'])
+    agent._trial_service.publish_and_wait = timed(
+        agent._trial_service.publish_and_wait, phases['trial']
+    )
+    agent_ros.msg_to_sample = timed(agent_ros.msg_to_sample,
+                                    phases['decode'])
+
+    agent.sample(policy, 0, save=False)  # Warm up.
+    for times in phases.values():
+        del times[:]
+    totals = []
+    for _ in range(trials):
+        start = time.time()
+        agent.sample(policy, 0, save=False)
+        totals.append(time.time() - start)
+    totals = np.array(totals)
+    phases = dict((name, np.array(times)) for name, times in phases.items())
+    phases['other'] = totals - sum(phases.values())
+
+    print('%d trials, T=%d, dX=%d, dU=%d, %s transport' %
+          (trials, T, agent.dX, agent.dU, 'binary' if binary else 'list'))
+    print('%.1f trials/s' % (trials / totals.sum()))
+    print('%-8s %10s %10s %10s' % ('phase', 'mean ms', 'p50 ms', 'p95 ms'))
+    for name in ('reset', 'trial', 'decode', 'other'):
+        times = 1000 * phases[name]
+        print('%-8s %10.3f %10.3f %10.3f' %
+              (name, times.mean(), np.percentile(times, 50),
+               np.percentile(times, 95)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--trials', type=int, default=100)
+    parser.add_argument('-T', type=int, default=100)
+    parser.add_argument('--joints', type=int, default=7)
+    parser.add_argument('--binary', action='store_true',
+                        help='use the binary message layout')
+    args = parser.parse_args()
+    run(args.trials, args.T, args.joints, args.binary)
+
+
+if __name__ == '__main__':
+    main()
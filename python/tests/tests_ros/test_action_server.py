@@ -0,0 +1,136 @@
+""" This file defines tests for the asynchronous action loop. """
+import os
+import os.path
+import sys
+import threading
+import time
+
+import numpy as np
+
+# Add gps/python to path so that imports work.
+gps_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..', ''))
+sys.path.append(gps_path)
+
+from gps.agent.ros.action_server import ActionServer, LATENCY_BINS
+from gps.agent.ros.fake_robot import FakeRobot
+from gps.agent.ros.loopback import LoopbackBus
+from gps.proto.gps_pb2 import ACTION, JOINT_ANGLES, TF_CONTROLLER
+
+
+HYPERPARAMS = {
+    'trial_command_topic': 'trial_command',
+    'sample_result_topic': 'sample_result',
+    'tf_obs_topic': 'obs',
+    'reset_command_topic': 'position_command',
+    'relax_command_topic': 'relax_command',
+    'data_request_topic': 'data_request',
+    'tf_action_topic': 'action',
+    'sensor_dims': {JOINT_ANGLES: 2, ACTION: 1},
+    'state_include': [JOINT_ANGLES],
+}
+
+
+class Message(object):
+    """ Stand-in for ROS messages. """
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class Messages(object):
+    """ Stand-in for the gps_agent_pkg.msg module. """
+    SampleResult = DataType = TfObsData = TfActionCommand = TrialCommand = \
+            PositionCommand = RelaxCommand = DataRequest = Message
+
+
+def run_trial(act, T=20, rate=200.0):
+    """
+    Run a TF trial on a fake robot, serving actions with an action
+    server. Returns the sample data, the timing statistics and the
+    number of stale steps of the robot.
+    """
+    bus = LoopbackBus()
+    A = np.array([[1.0, 0.1], [0.0, 1.0]])
+    B = np.array([[0.0], [0.1]])
+    robot = FakeRobot(bus, HYPERPARAMS, A, B, x0=[1.0, 0.0], msgs=Messages,
+                      rate=rate)
+
+    action_pub = bus.Publisher(HYPERPARAMS['tf_action_topic'])
+    server = ActionServer(
+        lambda u, i: action_pub.publish(Message(action=u.tolist(), id=i)),
+        deadline=1.0 / rate, obs_to_numpy=lambda msg: np.array(msg.data)
+    )
+    bus.Subscriber(HYPERPARAMS['tf_obs_topic'], None, server.observe)
+    results = []
+    done = threading.Event()
+
+    def on_result(msg):
+        results.append(msg)
+        done.set()
+
+    bus.Subscriber(HYPERPARAMS['sample_result_topic'], None, on_result)
+
+    server.start(act, warmup_obs=np.zeros(2))
+    command = Message(
+        id=1, T=T, frequency=rate, binary_reports=False,
+        controller=Message(controller_to_execute=TF_CONTROLLER),
+    )
+    bus.Publisher(HYPERPARAMS['trial_command_topic']).publish(command)
+    assert done.wait(10.0)
+    timing = server.stop()
+
+    data = {}
+    for sensor in results[0].sensor_data:
+        data[sensor.data_type] = np.array(sensor.data).reshape(sensor.shape)
+    return data, timing, robot.stale_steps
+
+
+def test_actions():
+    K = np.array([[-0.5, -1.0]])
+    data, timing, stale_steps = run_trial(lambda obs: K.dot(obs))
+    X, U = data[JOINT_ANGLES], data[ACTION]
+    assert X.shape == (20, 2) and U.shape == (20, 1)
+    assert stale_steps == 0
+    assert np.allclose(U, X.dot(K.T))
+    assert len(timing['latencies']) == 20
+    assert timing['dropped'] == 0
+    assert timing['errors'] == 0
+
+
+def test_timing():
+    _, timing, _ = run_trial(lambda obs: np.zeros(1))
+    assert timing['histogram'].sum() == len(timing['latencies'])
+    assert len(timing['histogram']) == len(LATENCY_BINS)
+    assert timing['deadline_misses'] == \
+            np.sum(timing['latencies'] > timing['deadline'])
+
+
+def test_slow_policy():
+    def act(obs):
+        time.sleep(0.03)
+        return np.zeros(1)
+    _, timing, stale_steps = run_trial(act, T=10, rate=100.0)
+    assert timing['deadline_misses'] > 0
+    assert timing['dropped'] > 0
+    assert stale_steps > 0
+
+
+def test_warmup():
+    calls = []
+    server = ActionServer(lambda u, i: None, deadline=0.01)
+    server.start(lambda obs: calls.append(obs), warmup_obs=np.zeros(3))
+    timing = server.stop()
+    assert len(calls) == 1
+    assert len(timing['latencies']) == 0
+
+
+def main():
+    print('running action server tests')
+    test_actions()
+    test_timing()
+    test_slow_policy()
+    test_warmup()
+    print('action server tests passed')
+
+
+if __name__ == '__main__':
+    main()
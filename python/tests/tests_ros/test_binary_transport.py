@@ -0,0 +1,54 @@
+""" This file defines tests for the binary ROS message layout. """
+import os
+import os.path
+import sys
+
+import numpy as np
+
+# Add gps/python to path so that imports work.
+gps_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..', ''))
+sys.path.append(gps_path)
+
+from gps.agent.ros.binary_transport import array_to_blob, blob_to_array
+
+
+def test_round_trip():
+    array = np.random.randn(5, 3, 4)
+    blob = array_to_blob(array)
+    assert len(blob) == array.size * 8
+    decoded = blob_to_array(blob, '<f8', [5, 3, 4])
+    assert decoded.shape == (5, 3, 4)
+    assert np.array_equal(decoded, array)
+
+
+def test_non_contiguous():
+    array = np.random.randn(4, 6)[:, ::2].T
+    decoded = blob_to_array(array_to_blob(array), '<f8', array.shape)
+    assert np.array_equal(decoded, array)
+
+
+def test_dtype():
+    array = np.arange(24, dtype=np.uint8).reshape(2, 3, 4)
+    blob = array_to_blob(array, dtype='|u1')
+    assert len(blob) == 24
+    decoded = blob_to_array(blob, '|u1', (2, 3, 4))
+    assert decoded.dtype == np.uint8
+    assert np.array_equal(decoded, array)
+
+
+def test_flat():
+    array = np.random.randn(7)
+    assert np.array_equal(blob_to_array(array_to_blob(array), '<f8'), array)
+
+
+def main():
+    print('running binary transport tests')
+    test_round_trip()
+    test_non_contiguous()
+    test_dtype()
+    test_flat()
+    print('binary transport tests passed')
+
+
+if __name__ == '__main__':
+    main()
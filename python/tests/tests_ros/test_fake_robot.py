@@ -0,0 +1,162 @@
+""" This file defines tests for the fake robot. """
+import os
+import os.path
+import sys
+
+import numpy as np
+
+# Add gps/python to path so that imports work.
+gps_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..', ''))
+sys.path.append(gps_path)
+
+from gps.agent.ros.binary_transport import array_to_blob, blob_to_array
+from gps.agent.ros.fake_robot import FakeRobot
+from gps.agent.ros.loopback import LoopbackBus
+from gps.agent.ros.service_emulator import ServiceEmulator, TimeoutException
+from gps.proto.gps_pb2 import ACTION, AUXILIARY_ARM, JOINT_ANGLES, \
+        JOINT_VELOCITIES, LIN_GAUSS_CONTROLLER, TRIAL_ARM
+
+
+HYPERPARAMS = {
+    'trial_command_topic': 'trial_command',
+    'reset_command_topic': 'position_command',
+    'relax_command_topic': 'relax_command',
+    'data_request_topic': 'data_request',
+    'sample_result_topic': 'sample_result',
+    'tf_obs_topic': 'obs',
+    'tf_action_topic': 'action',
+    'sensor_dims': {JOINT_ANGLES: 2, JOINT_VELOCITIES: 2, ACTION: 2},
+    'state_include': [JOINT_ANGLES, JOINT_VELOCITIES],
+}
+
+
+class Message(object):
+    """ Stand-in for ROS messages. """
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class Messages(object):
+    """ Stand-in for the gps_agent_pkg.msg module. """
+    SampleResult = DataType = TfObsData = TfActionCommand = TrialCommand = \
+            PositionCommand = RelaxCommand = DataRequest = Message
+
+
+def setup_robot():
+    bus = LoopbackBus()
+    A = np.eye(4)
+    A[:2, 2:] = 0.1 * np.eye(2)
+    B = np.vstack([np.zeros((2, 2)), 0.1 * np.eye(2)])
+    robot = FakeRobot(bus, HYPERPARAMS, A, B, msgs=Messages)
+
+    def service(topic):
+        return ServiceEmulator(HYPERPARAMS[topic], None,
+                               HYPERPARAMS['sample_result_topic'], None,
+                               publisher=bus.Publisher,
+                               subscriber=bus.Subscriber)
+    return robot, A, B, service
+
+
+def to_arrays(msg):
+    data = {}
+    for sensor in msg.sensor_data:
+        if len(sensor.blob) > 0:
+            data[sensor.data_type] = blob_to_array(sensor.blob, sensor.dtype,
+                                                   sensor.shape)
+        else:
+            data[sensor.data_type] = \
+                    np.array(sensor.data).reshape(sensor.shape)
+    return data
+
+
+def trial_command(msg_id, K, k, binary):
+    T, dU, dX = K.shape
+    lingauss = Message(dX=dX, dU=dU, K_t=[], k_t=[], K_blob=b'', k_blob=b'')
+    if binary:
+        lingauss.K_blob, lingauss.k_blob = array_to_blob(K), array_to_blob(k)
+    else:
+        lingauss.K_t, lingauss.k_t = K.ravel().tolist(), k.ravel().tolist()
+    controller = Message(controller_to_execute=LIN_GAUSS_CONTROLLER,
+                         lingauss=lingauss)
+    return Message(id=msg_id, T=T, frequency=20.0, controller=controller,
+                   binary_reports=binary)
+
+
+def check_lin_gauss_trial(binary):
+    _, A, B, service = setup_robot()
+    reset_service = service('reset_command_topic')
+    trial_service = service('trial_command_topic')
+
+    x0 = np.array([0.5, -0.5, 0.0, 0.0])
+    reset = Message(id=1, arm=TRIAL_ARM, mode=0, data=x0[:2].tolist())
+    data = to_arrays(reset_service.publish_and_wait(reset, check_id=True))
+    assert np.allclose(data[JOINT_ANGLES], [x0[:2]])
+    assert np.allclose(data[JOINT_VELOCITIES], [x0[2:]])
+
+    T = 10
+    K = np.tile(-np.hstack([np.eye(2), np.eye(2)]), (T, 1, 1))
+    k = np.random.randn(T, 2)
+    result = trial_service.publish_and_wait(trial_command(2, K, k, binary),
+                                            check_id=True)
+    assert result.id == 2
+    data = to_arrays(result)
+    X = np.hstack([data[JOINT_ANGLES], data[JOINT_VELOCITIES]])
+    U = data[ACTION]
+    assert X.shape == (T, 4) and U.shape == (T, 2)
+    x = x0
+    for t in range(T):
+        assert np.allclose(X[t], x)
+        assert np.allclose(U[t], K[t].dot(x) + k[t])
+        x = A.dot(x) + B.dot(U[t])
+
+
+def test_lin_gauss_trial():
+    check_lin_gauss_trial(binary=False)
+
+
+def test_lin_gauss_trial_binary():
+    check_lin_gauss_trial(binary=True)
+
+
+def test_lin_gauss_trial_bad_gains():
+    _, _, _, service = setup_robot()
+    trial_service = service('trial_command_topic')
+    T = 10
+    K, k = np.zeros((T, 2, 4)), np.zeros((T, 2))
+    msg = trial_command(5, K, k, binary=True)
+    msg.controller.lingauss.K_blob = msg.controller.lingauss.K_blob[:-3]
+    try:
+        trial_service.publish_and_wait(msg, timeout=0.2, check_id=True)
+    except TimeoutException:
+        pass
+    else:
+        assert False, 'Expected gains of the wrong size to be rejected.'
+
+
+def test_reports():
+    _, _, _, service = setup_robot()
+    reset = Message(id=3, arm=AUXILIARY_ARM, mode=0, data=[1.0, 1.0])
+    data = to_arrays(service('reset_command_topic').publish_and_wait(
+        reset, check_id=True))
+    assert np.allclose(data[JOINT_ANGLES], 0.0)
+
+    for topic in ('relax_command_topic', 'data_request_topic'):
+        result = service(topic).publish_and_wait(Message(id=4, arm=TRIAL_ARM),
+                                                 check_id=True)
+        assert result.id == 4
+        data = to_arrays(result)
+        assert data[JOINT_ANGLES].shape == (1, 2)
+        assert ACTION not in data
+
+
+def main():
+    print('running fake robot tests')
+    test_lin_gauss_trial()
+    test_lin_gauss_trial_binary()
+    test_lin_gauss_trial_bad_gains()
+    test_reports()
+    print('fake robot tests passed')
+
+
+if __name__ == '__main__':
+    main()
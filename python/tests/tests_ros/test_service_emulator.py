@@ -0,0 +1,118 @@
+""" This file defines tests for the ROS service emulator. """
+import os
+import os.path
+import sys
+import time
+
+# Add gps/python to path so that imports work.
+gps_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..', ''))
+sys.path.append(gps_path)
+
+from gps.agent.ros.loopback import LoopbackBus
+from gps.agent.ros.service_emulator import ServiceEmulator, TimeoutException
+
+
+class Message(object):
+    """ Stand-in for a ROS message with an id field. """
+    def __init__(self, id):
+        self.id = id
+
+
+def make_service(bus):
+    return ServiceEmulator('request', Message, 'response', Message,
+                           publisher=bus.Publisher,
+                           subscriber=bus.Subscriber)
+
+
+def add_responder(bus, responses):
+    """ Answer each request with the messages responses(request). """
+    publisher = bus.Publisher('response', Message)
+
+    def callback(request):
+        for response in responses(request):
+            publisher.publish(response)
+
+    bus.Subscriber('request', Message, callback)
+
+
+def test_response():
+    bus = LoopbackBus()
+    service = make_service(bus)
+    add_responder(bus, lambda request: [Message(request.id)])
+    start = time.time()
+    response = service.publish_and_wait(Message(3), timeout=5.0)
+    assert response.id == 3
+    # Should return as soon as the response arrives.
+    assert time.time() - start < 1.0
+
+
+def test_synchronous_response():
+    bus = LoopbackBus(asynchronous=False)
+    service = make_service(bus)
+    add_responder(bus, lambda request: [Message(request.id)])
+    assert service.publish_and_wait(Message(4), timeout=1.0).id == 4
+
+
+def test_timeout():
+    bus = LoopbackBus()
+    service = make_service(bus)
+    start = time.time()
+    try:
+        service.publish_and_wait(Message(1), timeout=0.2)
+    except TimeoutException:
+        waited = time.time() - start
+        assert 0.15 < waited < 1.0
+    else:
+        assert False, 'Expected a timeout.'
+
+
+def test_check_id():
+    bus = LoopbackBus()
+    service = make_service(bus)
+    add_responder(bus, lambda request: [Message(request.id - 1),
+                                        Message(request.id)])
+    assert service.publish_and_wait(Message(7), check_id=True).id == 7
+
+
+def test_check_id_timeout():
+    bus = LoopbackBus()
+    service = make_service(bus)
+    add_responder(bus, lambda request: [Message(request.id - 1)])
+    try:
+        service.publish_and_wait(Message(7), timeout=0.2, check_id=True)
+    except TimeoutException:
+        pass
+    else:
+        assert False, 'Expected stale responses to be discarded.'
+
+
+def test_response_without_id():
+    # Robot plugins that do not echo ids leave them at zero.
+    bus = LoopbackBus()
+    service = make_service(bus)
+    add_responder(bus, lambda request: [Message(0)])
+    assert service.publish_and_wait(Message(8), timeout=1.0).id == 0
+
+
+def test_unrequested_response_ignored():
+    bus = LoopbackBus(asynchronous=False)
+    service = make_service(bus)
+    bus.Publisher('response', Message).publish(Message(5))
+    add_responder(bus, lambda request: [Message(request.id)])
+    assert service.publish_and_wait(Message(6), timeout=1.0).id == 6
+
+
+def main():
+    print('running service emulator tests')
+    test_response()
+    test_synchronous_response()
+    test_timeout()
+    test_check_id()
+    test_check_id_timeout()
+    test_response_without_id()
+    test_unrequested_response_ignored()
+    print('service emulator tests passed')
+
+
+if __name__ == '__main__':
+    main()
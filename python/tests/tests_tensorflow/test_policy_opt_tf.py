@@ -1,4 +1,5 @@
 """ This file defines tests for tensorflow policy optimization. """
+import copy
 import os
 import os.path
 import sys
@@ -9,7 +10,7 @@ import tensorflow as tf
 gps_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..', ''))
 sys.path.append(gps_path)
 
-from gps.algorithm.policy.tf_policy import TfPolicy
+from gps.algorithm.policy.tf_policy import TfPolicy, _mlp_layers
 from gps.algorithm.policy_opt.policy_opt_tf import PolicyOptTf
 from gps.algorithm.policy_opt.config import POLICY_OPT_TF
 from gps.algorithm.policy_opt.tf_model_example import euclidean_loss_layer, \
@@ -37,6 +38,50 @@ def test_policy_opt_tf_forward():
     policy_opt.prob(obs=obs)
 
 
+def test_policy_opt_tf_prob_batched():
+    hyper_params = copy.deepcopy(POLICY_OPT_TF)
+    hyper_params['prob_batch_size'] = 7
+    deg_obs = 100
+    deg_action = 7
+    policy_opt = PolicyOptTf(hyper_params, deg_obs, deg_action)
+    N = 4
+    T = 5
+    obs = np.random.randn(N, T, deg_obs)
+    obs_reshaped = np.reshape(obs, (N*T, deg_obs))
+    policy_opt.policy.scale = np.diag(1.0 / np.std(obs_reshaped, axis=0))
+    policy_opt.policy.bias = -np.mean(obs_reshaped.dot(policy_opt.policy.scale), axis=0)
+    obs_orig = obs.copy()
+    output = policy_opt.prob(obs=obs)[0]
+    assert np.array_equal(obs, obs_orig)
+    for n in range(N):
+        for t in range(T):
+            obs_t = obs[n, t].dot(policy_opt.policy.scale) + policy_opt.policy.bias
+            u = policy_opt.sess.run(policy_opt.act_op,
+                                    feed_dict={policy_opt.obs_tensor: np.expand_dims(obs_t, 0)})
+            assert np.allclose(output[n, t], u[0], atol=1e-5)
+
+
+def test_policy_opt_tf_prob_cache():
+    hyper_params = copy.deepcopy(POLICY_OPT_TF)
+    hyper_params['iterations'] = 10
+    deg_obs = 20
+    deg_action = 7
+    policy_opt = PolicyOptTf(hyper_params, deg_obs, deg_action)
+    N = 10
+    T = 10
+    obs = np.random.randn(N, T, deg_obs)
+    output = policy_opt.prob_samples(obs)
+    assert policy_opt.prob_samples(obs) is output
+    assert np.allclose(output[0], policy_opt.prob(obs)[0])
+    tgt_mu = np.random.randn(N, T, deg_action)
+    tgt_prc = np.tile(np.eye(deg_action), (N, T, 1, 1))
+    tgt_wt = np.ones((N, T))
+    policy_opt.update(obs, tgt_mu, tgt_prc, tgt_wt, itr=0, inner_itr=1)
+    new_output = policy_opt.prob_samples(obs)
+    assert new_output is not output
+    assert np.allclose(new_output[0], policy_opt.prob(obs)[0])
+
+
 def test_policy_opt_tf_backwards():
     hyper_params = POLICY_OPT_TF
     deg_obs = 100
@@ -66,6 +111,39 @@ def test_policy_forward():
     policy_opt.policy.act(None, obs[0, 0], None, noise)
 
 
+def test_policy_export_mlp():
+    hyper_params = POLICY_OPT_TF
+    deg_obs = 100
+    deg_action = 7
+    policy_opt = PolicyOptTf(hyper_params, deg_obs, deg_action)
+    N = 20
+    T = 30
+    obs = np.random.randn(N, T, deg_obs)
+    obs_reshaped = np.reshape(obs, (N*T, deg_obs))
+    policy_opt.policy.scale = np.diag(1.0 / np.std(obs_reshaped, axis=0))
+    policy_opt.policy.bias = -np.mean(obs_reshaped.dot(policy_opt.policy.scale), axis=0)
+    noise = np.random.randn(deg_action)
+    u_tf = policy_opt.policy.act(None, obs[0, 0], None, noise)
+    U_tf = policy_opt.policy.act_batch(None, obs[0], None, None)
+    assert policy_opt.policy.export_mlp()
+    u_np = policy_opt.policy.act(None, obs[0, 0], None, noise)
+    U_np = policy_opt.policy.act_batch(None, obs[0], None, None)
+    assert np.allclose(u_tf, u_np, atol=1e-5)
+    assert np.allclose(U_tf, U_np, atol=1e-5)
+
+
+def test_mlp_layers_residual():
+    with tf.Graph().as_default():
+        obs = tf.placeholder(tf.float32, [None, 4])
+        weight = tf.Variable(tf.zeros([4, 4]))
+        bias = tf.Variable(tf.zeros([4]))
+        hidden = tf.matmul(obs, weight) + bias
+        assert len(_mlp_layers(hidden, obs)) == 1
+        # The "bias" of the residual add depends on the input.
+        residual = tf.matmul(tf.nn.relu(hidden), weight) + obs
+        assert _mlp_layers(residual, obs) is None
+
+
 def test_policy_opt_backwards():
     hyper_params = POLICY_OPT_TF
     deg_obs = 20
@@ -82,6 +160,26 @@ def test_policy_opt_backwards():
     new_policy = policy_opt.update(obs, tgt_mu, tgt_prc, tgt_wt, itr=0, inner_itr=1)
 
 
+def test_policy_opt_early_stopping():
+    hyper_params = copy.deepcopy(POLICY_OPT_TF)
+    hyper_params.update({'iterations': 5000, 'holdout': 0.2,
+                         'holdout_interval': 50, 'patience': 1,
+                         'min_improvement': 0.5, 'min_iterations': 100})
+    deg_obs = 20
+    deg_action = 7
+    policy_opt = PolicyOptTf(hyper_params, deg_obs, deg_action)
+    N = 10
+    T = 10
+    obs = np.random.randn(N, T, deg_obs)
+    tgt_mu = np.random.randn(N, T, deg_action)
+    tgt_prc = np.tile(np.eye(deg_action), (N, T, 1, 1))
+    tgt_wt = np.ones((N, T))
+    policy_opt.update(obs, tgt_mu, tgt_prc, tgt_wt, itr=0, inner_itr=1)
+    assert 100 <= policy_opt.update_iterations < 5000
+    assert policy_opt.update_iterations % 50 == 0
+    assert policy_opt.tf_iter == policy_opt.update_iterations
+
+
 def test_pickle():
     hyper_params = POLICY_OPT_TF
     deg_obs = 100
@@ -221,8 +319,13 @@ def main():
     print 'running tf policy opt tests'
     test_policy_opt_tf_init()
     test_policy_opt_tf_forward()
+    test_policy_opt_tf_prob_batched()
+    test_policy_opt_tf_prob_cache()
     test_policy_forward()
+    test_policy_export_mlp()
+    test_mlp_layers_residual()
     test_policy_opt_backwards()
+    test_policy_opt_early_stopping()
     test_auto_save_state()
     test_load_from_auto_save()
     test_policy_save()
@@ -0,0 +1,121 @@
+""" This file defines tests for the data logger. """
+import os
+import os.path
+import pickle
+import shutil
+import struct
+import sys
+import tempfile
+
+import numpy as np
+
+# Add gps/python to path so that imports work.
+gps_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..', ''))
+sys.path.append(gps_path)
+
+from gps.utility.data_logger import CODECS, MAGIC, DataLogger
+
+
+def make_data():
+    return {'X': np.random.randn(50, 20, 7), 'itr': 3, 'name': 'test'}
+
+
+def check_equal(data, loaded):
+    assert sorted(loaded.keys()) == sorted(data.keys())
+    assert np.array_equal(loaded['X'], data['X'])
+    assert loaded['itr'] == data['itr'] and loaded['name'] == data['name']
+
+
+def run_in_tmpdir(test):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        test(tmpdir)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_round_trip():
+    def test(tmpdir):
+        data = make_data()
+        for codec in [None] + sorted(CODECS.keys()):
+            for num_threads in (1, 4):
+                # Small chunks, so that the data spans many of them.
+                logger = DataLogger(codec=codec, chunk_size=1000,
+                                    num_threads=num_threads)
+                filename = os.path.join(tmpdir, 'data_%s.pkl' % codec)
+                logger.pickle(filename, data)
+                if codec is not None:
+                    # The array alone is split into at least 7 chunks.
+                    with open(filename, 'rb') as f:
+                        f.seek(len(MAGIC) + 1 + len(codec))
+                        assert struct.unpack('<I', f.read(4))[0] >= 7
+                check_equal(data, logger.unpickle(filename))
+                # Any logger reads files of any codec.
+                check_equal(data, DataLogger().unpickle(filename))
+    run_in_tmpdir(test)
+
+
+def test_legacy_pickle():
+    def test(tmpdir):
+        data = make_data()
+        filename = os.path.join(tmpdir, 'legacy.pkl')
+        with open(filename, 'wb') as f:
+            pickle.dump(data, f)
+        check_equal(data, DataLogger(codec='zlib').unpickle(filename))
+    run_in_tmpdir(test)
+
+
+def test_missing_file():
+    def test(tmpdir):
+        assert DataLogger().unpickle(os.path.join(tmpdir, 'missing')) is None
+    run_in_tmpdir(test)
+
+
+def test_truncated_file():
+    def test(tmpdir):
+        filename = os.path.join(tmpdir, 'data.pkl')
+        DataLogger(codec='zlib', chunk_size=1000).pickle(filename, make_data())
+        with open(filename, 'rb') as f:
+            contents = f.read()
+        # Cut inside the header, a chunk length, and a chunk.
+        for size in (10, 18, len(contents) - 10):
+            with open(filename, 'wb') as f:
+                f.write(contents[:size])
+            try:
+                DataLogger().unpickle(filename)
+            except ValueError as e:
+                assert filename in str(e)
+            else:
+                assert False, 'truncated file was read'
+    run_in_tmpdir(test)
+
+
+def test_corrupt_file():
+    def test(tmpdir):
+        filename = os.path.join(tmpdir, 'data.pkl')
+        DataLogger(codec='zlib', chunk_size=1000).pickle(filename, make_data())
+        with open(filename, 'rb') as f:
+            contents = f.read()
+        with open(filename, 'wb') as f:
+            f.write(contents[:-20] + b'\x00' * 20)
+        try:
+            DataLogger().unpickle(filename)
+        except ValueError as e:
+            assert filename in str(e)
+        else:
+            assert False, 'corrupt file was read'
+    run_in_tmpdir(test)
+
+
+def main():
+    print('running data logger tests')
+    test_round_trip()
+    test_legacy_pickle()
+    test_missing_file()
+    test_truncated_file()
+    test_corrupt_file()
+    print('data logger tests passed')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,7 @@
 #include <cmath>
 #include "macros.h"
 #include <iostream>
+#include <vector>
 #include <boost/python/slice.hpp>
 #include "mujoco_osg_viewer.hpp"
 
@@ -54,10 +55,12 @@ public:
 
     PyMJCWorld2(const std::string& loadfile);
     bp::object Step(const bn::ndarray& x, const bn::ndarray& u);
+    bp::object RolloutLinGauss(const bn::ndarray& x0, const bn::ndarray& K, const bn::ndarray& k, int substeps, double dt);
     void Plot(const bn::ndarray& x);    
     void Idle(const bn::ndarray& x);
     bn::ndarray GetCOMMulti(const bn::ndarray& x);
     bn::ndarray GetJacSite(int site);
+    void GetJacSites(const bn::ndarray& out);
     void Kinematics();
     bp::dict GetModel();
     void SetModel(bp::dict d);
@@ -159,6 +162,63 @@ bp::object PyMJCWorld2::Step(const bn::ndarray& x, const bn::ndarray& u) {
 	return bp::make_tuple(xout, oout);
 }
 
+// Runs a whole trial of the time-varying linear controller u = K[t]*f + k[t],
+// where the features f = [qpos, qvel, site_xpos, site_xvel] are built the
+// same way AgentMuJoCo builds them: site positions are read after each
+// time step's substeps, and site velocities are finite differences over dt.
+// Returns (T x nx states, T x nu actions, T x 3*nsite site positions,
+// T x 3*nsite x nv site Jacobians).
+bp::object PyMJCWorld2::RolloutLinGauss(const bn::ndarray& x0, const bn::ndarray& K, const bn::ndarray& k, int substeps, double dt) {
+    int nx = StateSize(m_model), nu = m_model->nu, nv = m_model->nv;
+    int ns = 3*m_model->nsite, nf = nx + 2*ns;
+    FAIL_IF_FALSE(x0.get_dtype() == MJTNUM_DTYPE && x0.get_nd() == 1 && x0.get_flags() & bn::ndarray::C_CONTIGUOUS && x0.shape(0) == nx);
+    FAIL_IF_FALSE(K.get_dtype() == MJTNUM_DTYPE && K.get_nd() == 3 && K.get_flags() & bn::ndarray::C_CONTIGUOUS && K.shape(1) == nu && K.shape(2) == nf);
+    int T = K.shape(0);
+    FAIL_IF_FALSE(k.get_dtype() == MJTNUM_DTYPE && k.get_nd() == 2 && k.get_flags() & bn::ndarray::C_CONTIGUOUS && k.shape(0) == T && k.shape(1) == nu);
+    const mjtNum* Kptr = reinterpret_cast<const mjtNum*>(K.get_data());
+    const mjtNum* kptr = reinterpret_cast<const mjtNum*>(k.get_data());
+
+    bn::ndarray xout = bn::zeros(bp::make_tuple(T,nx), MJTNUM_DTYPE);
+    bn::ndarray uout = bn::zeros(bp::make_tuple(T,nu), MJTNUM_DTYPE);
+    bn::ndarray siteout = bn::zeros(bp::make_tuple(T,ns), MJTNUM_DTYPE);
+    bn::ndarray jacout = bn::zeros(bp::make_tuple(T,ns,nv), MJTNUM_DTYPE);
+    mjtNum* xptr = (mjtNum*)xout.get_data();
+    mjtNum* uptr = (mjtNum*)uout.get_data();
+    mjtNum* siteptr = (mjtNum*)siteout.get_data();
+    mjtNum* jacptr = (mjtNum*)jacout.get_data();
+
+    std::vector<mjtNum> f(nf);
+    mju_copy(&f[0], reinterpret_cast<const mjtNum*>(x0.get_data()), nx);
+    SetState(&f[0], m_model, m_data);
+    Kinematics();
+    mju_copy(&f[nx], m_data->site_xpos, ns);
+    mju_zero(&f[nx+ns], ns);
+
+    for (int t=0; t < T; ++t) {
+        mjtNum* u = uptr + t*nu;
+        mju_copy(xptr + t*nx, &f[0], nx);
+        mju_copy(siteptr + t*ns, &f[nx], ns);
+        for (int site=0; site < m_model->nsite; ++site) {
+            mj_jacSite(m_model, m_data, jacptr + (t*ns + 3*site)*nv, 0, site);
+        }
+        mju_mulMatVec(u, Kptr + t*nu*nf, &f[0], nu, nf);
+        mju_addTo(u, kptr + t*nu, nu);
+        if (t+1 < T) {
+            for (int i=0; i < substeps; ++i) {
+                SetState(&f[0], m_model, m_data);
+                mj_step1(m_model,m_data);
+                SetCtrl(u, m_model, m_data);
+                mj_step2(m_model,m_data);
+                GetState(&f[0], m_model, m_data);
+            }
+            for (int j=0; j < ns; ++j) {
+                f[nx+ns+j] = (m_data->site_xpos[j] - f[nx+j]) / dt;
+                f[nx+j] = m_data->site_xpos[j];
+            }
+        }
+    }
+    return bp::make_tuple(xout, uout, siteout, jacout);
+}
 
 void GetCOM(const mjModel* m, const mjData* d, mjtNum* com) {
     // see mj_com in engine_core.c
@@ -199,6 +259,16 @@ bn::ndarray PyMJCWorld2::GetJacSite(int site) {
     return out;
 }
 
+// Writes the Jacobians of all sites into a caller-provided
+// (3*nsite x nv) array.
+void PyMJCWorld2::GetJacSites(const bn::ndarray& out) {
+    FAIL_IF_FALSE(out.get_dtype() == MJTNUM_DTYPE && out.get_nd() == 2 && out.get_flags() & bn::ndarray::C_CONTIGUOUS && out.shape(0) == 3*m_model->nsite && out.shape(1) == m_model->nv);
+    mjtNum* ptr = (mjtNum*)out.get_data();
+    for (int site=0; site < m_model->nsite; ++site) {
+        mj_jacSite(m_model, m_data, ptr + 3*site*m_model->nv, 0, site);
+    }
+}
+
 void PyMJCWorld2::Kinematics() {
     mj_kinematics(m_model, m_data);
     mj_comPos(m_model, m_data);
@@ -288,6 +358,7 @@ BOOST_PYTHON_MODULE(mjcpy) {
     bp::class_<PyMJCWorld2,boost::noncopyable>("MJCWorld","docstring here", bp::init<const std::string&>())
 
         .def("step",&PyMJCWorld2::Step)
+        .def("rollout_lingauss",&PyMJCWorld2::RolloutLinGauss)
         // .def("StepMulti2",&PyMJCWorld::StepMulti2)
         // .def("StepJacobian", &PyMJCWorld::StepJacobian)
         // .def("Plot",&PyMJCWorld::Plot)
@@ -303,6 +374,7 @@ BOOST_PYTHON_MODULE(mjcpy) {
         .def("idle",&PyMJCWorld2::Idle)
         .def("get_COM_multi",&PyMJCWorld2::GetCOMMulti)
         .def("get_jac_site",&PyMJCWorld2::GetJacSite)
+        .def("get_jac_sites",&PyMJCWorld2::GetJacSites)
         .def("kinematics",&PyMJCWorld2::Kinematics)
         // .def("SetModel",&PyMJCWorld::SetModel)
         // .def("GetImage",&PyMJCWorld::GetImage)
@@ -92,6 +92,10 @@ protected:
     // Publishers.
     // Publish result of a trial, completion of position command, or just a report.
     ros_publisher_ptr(gps_agent_pkg::SampleResult) report_publisher_;
+    // Id of the last command received, echoed back in reports.
+    int last_command_id_;
+    // Should reports use the binary sensor data layout?
+    bool binary_reports_;
     // Is a trial arm data request pending?
     bool trial_data_request_waiting_;
     // Is a auxiliary data request pending?
@@ -11,6 +11,7 @@
 #include "gps_agent_pkg/util.h"
 #include "gps/proto/gps.pb.h"
 #include <vector>
+#include <cstring>
 
 #ifdef USE_CAFFE
 #include "gps_agent_pkg/caffenncontroller.h"
@@ -35,6 +36,8 @@ RobotPlugin::~RobotPlugin()
 void RobotPlugin::initialize(ros::NodeHandle& n)
 {
     ROS_INFO_STREAM("Initializing RobotPlugin");
+    last_command_id_ = 0;
+    binary_reports_ = false;
     trial_data_request_waiting_ = false;
     aux_data_request_waiting_ = false;
     sensors_initialized_ = false;
@@ -264,12 +267,12 @@ void RobotPlugin::publish_sample_report(boost::scoped_ptr<Sample>& sample, int T
     std::vector<gps::SampleType> dtypes;
     sample->get_available_dtypes(dtypes);
 
+    report_publisher_->msg_.id = last_command_id_;
     report_publisher_->msg_.sensor_data.resize(dtypes.size());
     for(int d=0; d<dtypes.size(); d++){ //Fill in each sample type
         report_publisher_->msg_.sensor_data[d].data_type = dtypes[d];
         Eigen::VectorXd tmp_data;
         sample->get_data(T, tmp_data, (gps::SampleType)dtypes[d]);
-        report_publisher_->msg_.sensor_data[d].data.resize(tmp_data.size());
 
 
         std::vector<int> shape;
@@ -285,8 +288,25 @@ void RobotPlugin::publish_sample_report(boost::scoped_ptr<Sample>& sample, int T
             ROS_ERROR("Data stored in sample has different length than expected (%d vs %d)",
                     tmp_data.size(), total_expected_shape);
         }
-        for(int i=0; i<tmp_data.size(); i++){
-            report_publisher_->msg_.sensor_data[d].data[i] = tmp_data[i];
+        if(binary_reports_){
+            // Raw bytes of the data, decoded with numpy on the Python side.
+            // Sample::get_data returns all sensor data as doubles, so image
+            // sensors are sent as float64 as well until it can return uint8.
+            report_publisher_->msg_.sensor_data[d].dtype = "<f8";
+            report_publisher_->msg_.sensor_data[d].blob.resize(tmp_data.size() * sizeof(double));
+            if(tmp_data.size() > 0){
+                std::memcpy(&report_publisher_->msg_.sensor_data[d].blob[0],
+                            tmp_data.data(), tmp_data.size() * sizeof(double));
+            }
+            report_publisher_->msg_.sensor_data[d].data.clear();
+        }
+        else{
+            report_publisher_->msg_.sensor_data[d].dtype = "";
+            report_publisher_->msg_.sensor_data[d].blob.clear();
+            report_publisher_->msg_.sensor_data[d].data.resize(tmp_data.size());
+            for(int i=0; i<tmp_data.size(); i++){
+                report_publisher_->msg_.sensor_data[d].data[i] = tmp_data[i];
+            }
         }
     }
     report_publisher_->unlockAndPublish();
@@ -295,6 +315,7 @@ void RobotPlugin::publish_sample_report(boost::scoped_ptr<Sample>& sample, int T
 void RobotPlugin::position_subscriber_callback(const gps_agent_pkg::PositionCommand::ConstPtr& msg){
 
     ROS_INFO_STREAM("received position command");
+    last_command_id_ = msg->id;
     OptionsMap params;
     int8_t arm = msg->arm;
     params["mode"] = msg->mode;
@@ -327,6 +348,8 @@ void RobotPlugin::trial_subscriber_callback(const gps_agent_pkg::TrialCommand::C
 
     OptionsMap controller_params;
     ROS_INFO_STREAM("received trial command");
+    last_command_id_ = msg->id;
+    binary_reports_ = msg->binary_reports;
 
     controller_initialized_ = false;
 
@@ -362,25 +385,53 @@ void RobotPlugin::trial_subscriber_callback(const gps_agent_pkg::TrialCommand::C
     if(msg->controller.controller_to_execute == gps::LIN_GAUSS_CONTROLLER){
         //
         gps_agent_pkg::LinGaussParams lingauss = msg->controller.lingauss;
-        trial_controller_.reset(new LinearGaussianController());
         int dX = (int) lingauss.dX;
         int dU = (int) lingauss.dU;
+        // Gains are either sent as float64 arrays or as their raw bytes.
+        size_t K_size = (size_t)msg->T * dU * dX;
+        size_t k_size = (size_t)msg->T * dU;
+        bool binary_gains = !lingauss.K_blob.empty() || !lingauss.k_blob.empty();
+        bool gains_valid;
+        if(binary_gains){
+            gains_valid = lingauss.K_blob.size() == K_size * sizeof(double) &&
+                          lingauss.k_blob.size() == k_size * sizeof(double);
+        }
+        else{
+            gains_valid = lingauss.K_t.size() == K_size &&
+                          lingauss.k_t.size() == k_size;
+        }
+        if(!gains_valid || K_size == 0){
+            ROS_ERROR("Linear Gaussian gains do not match T=%d, dX=%d, dU=%d, rejecting trial command",
+                    (int)msg->T, dX, dU);
+            trial_controller_.reset(NULL);
+            return;
+        }
+        trial_controller_.reset(new LinearGaussianController());
         //Prepare options map
         controller_params["T"] = (int)msg->T;
         controller_params["dX"] = dX;
         controller_params["dU"] = dU;
+        const double *K_t, *k_t;
+        if(binary_gains){
+            K_t = reinterpret_cast<const double*>(&lingauss.K_blob[0]);
+            k_t = reinterpret_cast<const double*>(&lingauss.k_blob[0]);
+        }
+        else{
+            K_t = &lingauss.K_t[0];
+            k_t = &lingauss.k_t[0];
+        }
         for(int t=0; t<(int)msg->T; t++){
             Eigen::MatrixXd K;
             K.resize(dU, dX);
             for(int u=0; u<dU; u++){
                 for(int x=0; x<dX; x++){
-                    K(u,x) = lingauss.K_t[x+u*dX+t*dU*dX];
+                    K(u,x) = K_t[x+u*dX+t*dU*dX];
                 }
             }
             Eigen::VectorXd k;
             k.resize(dU);
             for(int u=0; u<dU; u++){
-                k(u) = lingauss.k_t[u+t*dU];
+                k(u) = k_t[u+t*dU];
             }
             controller_params["K_"+to_string(t)] = K;
             controller_params["k_"+to_string(t)] = k;
@@ -480,6 +531,7 @@ void RobotPlugin::test_callback(const std_msgs::Empty::ConstPtr& msg){
 void RobotPlugin::relax_subscriber_callback(const gps_agent_pkg::RelaxCommand::ConstPtr& msg){
 
     ROS_INFO_STREAM("received relax command");
+    last_command_id_ = msg->id;
     OptionsMap params;
     int8_t arm = msg->arm;
     params["mode"] = gps::NO_CONTROL;
@@ -495,6 +547,7 @@ void RobotPlugin::relax_subscriber_callback(const gps_agent_pkg::RelaxCommand::C
 
 void RobotPlugin::data_request_subscriber_callback(const gps_agent_pkg::DataRequest::ConstPtr& msg) {
     ROS_INFO_STREAM("received data request");
+    last_command_id_ = msg->id;
     OptionsMap params;
     int arm = msg->arm;
     if (arm < 2 && arm >= 0)